@@ -1,3 +1,5 @@
 from django.contrib import admin
-from .models import UploadedDataset
+from .models import Job, Schema, UploadedDataset
+admin.site.register(Schema)
 admin.site.register(UploadedDataset)
+admin.site.register(Job)
@@ -0,0 +1,142 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .models import Anomaly, UploadedDataset
+from . import metrics
+
+# Per-Type anomaly scoring over the memory-mapped sidecar. For every numeric column the valid values are
+# sorted once by (Type, value); exact per-type quartiles and medians are then index arithmetic on that
+# order, and means/stds/MADs are np.bincount reductions, so a column costs two sorts and a few linear
+# passes whatever the number of types. A value is flagged when at least ANOMALY_MIN_METHODS of the
+# three tests fire:
+#   z    |x - mean| / std > ANOMALY_Z
+#   iqr  x outside [q1 - k * IQR, q3 + k * IQR] with k = ANOMALY_IQR_K
+#   mad  |x - median| / (1.4826 * MAD) > ANOMALY_MAD   (modified z-score; mean absolute deviation
+#        * 1.2533 stands in when more than half the values are identical and the MAD is 0)
+# Types with fewer than ANOMALY_MIN_GROUP values are not scored.
+
+METHOD_Z, METHOD_IQR, METHOD_MAD = 1, 2, 4
+
+
+def _group_quantiles(sorted_values, starts, counts, q):
+    '''Linearly interpolated q-quantile of each group of a (group, value)-sorted array.'''
+    pos = starts + q * np.maximum(counts - 1, 0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + np.maximum(counts - 1, 0))
+    lo_v, hi_v = sorted_values[np.minimum(lo, len(sorted_values) - 1)], sorted_values[np.minimum(hi, len(sorted_values) - 1)]
+    return lo_v + (hi_v - lo_v) * (pos - lo)
+
+
+def _group_medians(values, groups, n_groups):
+    order = np.lexsort((values, groups))
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    return order, counts, starts
+
+
+def score_column(values, groups, n_groups, z_limit=3.0, iqr_k=1.5, mad_limit=3.5, min_group=5):
+    '''Score one column; groups holds a group id in [0, n_groups) per value, values has no NaNs.
+
+    Returns (z-scores, modified z-scores, method bitmask) per value.'''
+    order, counts, starts = _group_medians(values, groups, n_groups)
+    ordered = values[order]
+    q1, median, q3 = (_group_quantiles(ordered, starts, counts, q) for q in (0.25, 0.5, 0.75))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(groups, weights=values, minlength=n_groups) / counts
+        centred = values - mean[groups]
+        std = np.sqrt(np.bincount(groups, weights=centred * centred, minlength=n_groups) / (counts - 1))
+        dev = np.abs(values - median[groups])
+        dev_order, _, _ = _group_medians(dev, groups, n_groups)
+        mad = _group_quantiles(dev[dev_order], starts, counts, 0.5)
+        mean_ad = np.bincount(groups, weights=dev, minlength=n_groups) / counts
+        scale = np.where(mad > 0, 1.4826 * mad, 1.2533 * mean_ad)
+        z = np.where(std[groups] > 0, centred / std[groups], 0.0)
+        robust = np.where(scale[groups] > 0, (values - median[groups]) / scale[groups], 0.0)
+    iqr = (q3 - q1)[groups]
+    methods = ((np.abs(z) > z_limit) * METHOD_Z
+               | ((values < q1[groups] - iqr_k * iqr) | (values > q3[groups] + iqr_k * iqr)) * METHOD_IQR
+               | (np.abs(robust) > mad_limit) * METHOD_MAD).astype(np.int8)
+    methods[(counts < min_group)[groups]] = 0
+    return z, robust, methods
+
+
+def detect_anomalies(ds, columns=None, max_rows=None):
+    '''Flagged values of a ColumnarDataset as a dict of arrays (row, column, value, z, robust, methods),
+    highest |modified z| first, at most max_rows of them (ANOMALY_MAX_ROWS by default).'''
+    columns = [c for c in (columns or ds.columns) if c in ds.specs and ds.kind(c) == 'float']
+    max_rows = max_rows if max_rows is not None else getattr(settings, 'ANOMALY_MAX_ROWS', 10000)
+    min_methods = getattr(settings, 'ANOMALY_MIN_METHODS', 2)
+    limits = dict(z_limit=getattr(settings, 'ANOMALY_Z', 3.0), iqr_k=getattr(settings, 'ANOMALY_IQR_K', 1.5),
+                  mad_limit=getattr(settings, 'ANOMALY_MAD', 3.5), min_group=getattr(settings, 'ANOMALY_MIN_GROUP', 5))
+    if 'Type' in ds.specs and ds.kind('Type') == 'category':
+        codes, cats = ds.codes('Type')
+        # Rows without a Type form their own group.
+        groups, n_groups = np.where(np.asarray(codes) < 0, len(cats), codes).astype(np.int64), len(cats) + 1
+    else:
+        groups, n_groups = np.zeros(ds.rows, dtype=np.int64), 1
+    parts = []
+    for j, col in enumerate(columns):
+        values = np.asarray(ds.values(col))
+        rows = np.flatnonzero(~np.isnan(values))
+        z, robust, methods = score_column(values[rows], groups[rows], n_groups, **limits)
+        flagged = np.flatnonzero(_popcount(methods) >= min_methods)
+        parts.append((rows[flagged], np.full(len(flagged), j), values[rows[flagged]], z[flagged], robust[flagged],
+                      methods[flagged]))
+    fields = ('row', 'column', 'value', 'z', 'robust', 'methods')
+    out = {f: np.concatenate([p[i] for p in parts]) if parts else np.empty(0) for i, f in enumerate(fields)}
+    score = np.abs(out['robust'])
+    keep = np.argsort(-score, kind='stable')
+    if len(keep) > max_rows:
+        keep = keep[:max_rows]
+    out = {f: v[keep] for f, v in out.items()}
+    out['columns'] = columns
+    return out
+
+
+def _popcount(methods):
+    return (methods & METHOD_Z > 0).astype(np.int8) + (methods & METHOD_IQR > 0) + (methods & METHOD_MAD > 0)
+
+
+def record_anomalies(instance, ds):
+    '''Score a dataset from its sidecar, store its flagged values and mark it scored; returns the number stored.
+
+    The rows and the flag are written in one transaction, so a failure leaves the dataset unscored. The
+    dataset row is locked and its flag re-read first, so when two requests score a dataset at once only
+    the first one stores rows; the other returns the number already stored.'''
+    with metrics.span('anomalies'):
+        found = detect_anomalies(ds)
+    rows = found['row']
+    if len(rows):
+        names = ds.column('Equipment Name', rows) if 'Equipment Name' in ds.specs else [''] * len(rows)
+        if 'Type' in ds.specs and ds.kind('Type') == 'category':
+            codes, cats = ds.codes('Type')
+            types = [cats[c] if c >= 0 else '' for c in np.asarray(codes[rows]).tolist()]
+        else:
+            types = [''] * len(rows)
+    with transaction.atomic():
+        scored = UploadedDataset.objects.select_for_update().filter(id=instance.id).values_list('anomalies_scored', flat=True)
+        if scored.first():
+            instance.anomalies_scored = True
+            return Anomaly.objects.filter(dataset_id=instance.id).count()
+        if len(rows):
+            Anomaly.objects.bulk_create([
+                Anomaly(dataset_id=instance.id, row=r, equipment=str(n)[:200], type=str(t)[:200],
+                        metric=found['columns'][c], value=v, zscore=z, robust_z=rz, methods=m, score=abs(rz))
+                for r, n, t, c, v, z, rz, m in zip(rows.tolist(), names, types, found['column'].tolist(),
+                                                   found['value'].tolist(), found['z'].tolist(), found['robust'].tolist(),
+                                                   found['methods'].tolist())], batch_size=1000)
+        UploadedDataset.objects.filter(id=instance.id).update(anomalies_scored=True)
+    instance.anomalies_scored = True
+    return len(rows)
+
+
+def copy_anomalies(source, instance):
+    '''A duplicate upload has the same rows, so it gets the source's anomalies without rescoring.'''
+    if not source.anomalies_scored:
+        return
+    fields = ['row', 'equipment', 'type', 'metric', 'value', 'zscore', 'robust_z', 'methods', 'score']
+    with transaction.atomic():
+        Anomaly.objects.bulk_create([Anomaly(dataset_id=instance.id, **row)
+                                     for row in Anomaly.objects.filter(dataset_id=source.id).values(*fields)], batch_size=1000)
+        UploadedDataset.objects.filter(id=instance.id).update(anomalies_scored=True)
+    instance.anomalies_scored = True
@@ -0,0 +1,127 @@
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+from .columnar import remove_sidecar
+from .compare import remove_comparisons
+from .models import Job, UploadedDataset, UploadSession
+from .reports import remove_reports
+
+# The dataset catalog: cursor-paginated history over the (owner, uploaded_at, id) index, and retention.
+# Retention applies to each owner's datasets separately and is never applied inline on upload; sweep()
+# runs as a background 'sweep' job (see jobs.schedule_sweep) and deletes expired datasets in batches of
+# RETENTION_BATCH_SIZE rows. Datasets uploaded before datasets had owners belong to LEGACY_DATASET_OWNER
+# (migration 0012); any still unowned, because no such user existed yet, are adopted by the next sweep and
+# are never swept as one shared pool.
+
+
+def encode_cursor(inst):
+    raw = json.dumps([inst.uploaded_at.isoformat(), inst.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''(uploaded_at, id) from a cursor returned by history_page; ValueError if it is malformed.'''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        uploaded_at, pk = json.loads(raw)
+        return datetime.fromisoformat(uploaded_at), int(pk)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def history_page(qs, cursor=None, limit=5):
+    '''One page of qs, newest first, plus the cursor of the next page (None on the last page).
+
+    Pages are keyset ranges on (uploaded_at, id), so each one is an index range scan whatever its depth.'''
+    qs = qs.order_by('-uploaded_at', '-id')
+    if cursor:
+        uploaded_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk))
+    items = list(qs[:limit + 1])
+    return items[:limit], (encode_cursor(items[limit - 1]) if len(items) > limit else None)
+
+
+def retention_policy():
+    '''Active limits from settings; 0 disables a limit.'''
+    return {'max_datasets': getattr(settings, 'RETENTION_MAX_DATASETS', 5),
+            'max_age_days': getattr(settings, 'RETENTION_MAX_AGE_DAYS', 0),
+            'max_bytes': getattr(settings, 'RETENTION_MAX_BYTES', 0)}
+
+
+def expired_ids(qs, policy=None):
+    '''Ids of datasets in qs that fall outside the retention policy.'''
+    policy = policy or retention_policy()
+    qs = qs.order_by('-uploaded_at', '-id')
+    expired = set()
+    if policy['max_datasets']:
+        expired.update(qs.values_list('id', flat=True)[policy['max_datasets']:])
+    if policy['max_age_days']:
+        cutoff = timezone.now() - timedelta(days=policy['max_age_days'])
+        expired.update(qs.filter(uploaded_at__lt=cutoff).values_list('id', flat=True))
+    if policy['max_bytes']:
+        used = 0
+        for pk, size in qs.exclude(id__in=expired).values_list('id', 'size').iterator():
+            used += size
+            if used > policy['max_bytes']:
+                expired.add(pk)
+    return sorted(expired)
+
+
+def delete_datasets(ids, batch_size=None):
+    '''Delete datasets in batches: one DELETE per batch, then the files no remaining dataset references.'''
+    batch_size = batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', 500)
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        batch = list(UploadedDataset.objects.filter(id__in=ids[start:start + batch_size]).only('id', 'csv_file'))
+        if not batch:
+            continue
+        names = {inst.csv_file.name for inst in batch if inst.csv_file}
+        deleted += UploadedDataset.objects.filter(id__in=[inst.id for inst in batch]).delete()[1].get('api.UploadedDataset', 0)
+        shared = set(UploadedDataset.objects.filter(csv_file__in=names).values_list('csv_file', flat=True))
+        remove_reports(batch)
+        remove_comparisons(batch)
+        for name in names - shared:
+            try:
+                path = default_storage.path(name)
+                if os.path.exists(path):
+                    os.remove(path)
+                remove_sidecar(path)
+            except OSError:
+                pass
+    return deleted
+
+
+def legacy_owner():
+    '''The user unowned datasets are given to: the LEGACY_DATASET_OWNER user, else the first superuser.'''
+    username = getattr(settings, 'LEGACY_DATASET_OWNER', '')
+    users = get_user_model().objects.filter(**({'username': username} if username else {'is_superuser': True}))
+    return users.order_by('id').first()
+
+
+def adopt_unowned():
+    '''Give datasets, jobs and upload sessions without an owner to legacy_owner(); returns the datasets moved.'''
+    owner = legacy_owner()
+    if owner is None:
+        return 0
+    for model in (Job, UploadSession):
+        model.objects.filter(owner__isnull=True).update(owner=owner)
+    return UploadedDataset.objects.filter(owner__isnull=True).update(owner=owner)
+
+
+def sweep(policy=None, owners=None):
+    '''Apply retention to each owner's datasets separately (every owner by default); returns the number deleted.
+
+    Unowned datasets are adopted first when there is a legacy owner, and are otherwise left alone.'''
+    if owners is None:
+        adopt_unowned()
+        owners = UploadedDataset.objects.filter(owner__isnull=False).order_by().values_list('owner', flat=True).distinct()
+    ids = []
+    for owner in owners:
+        ids += expired_ids(UploadedDataset.objects.filter(owner=owner), policy)
+    return delete_datasets(ids)
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from .columnar import remove_sidecar
+from .ingest import CSV_NAME_ERROR, IngestError, _new_upload_path, ingest_stored, is_csv_name, register_or_reuse, split_compression
+from .models import UploadSession
+
+# Resumable uploads: create_session() reserves a file under uploads/, write_chunk() appends each
+# checksummed chunk at the acknowledged offset, claim_session() moves a complete upload from 'open' to
+# 'committing' with a single conditional UPDATE, so only one request or job goes on to commit_session(),
+# which ingests the assembled file in place.
+
+
+class OffsetMismatch(IngestError):
+    '''The chunk does not start at the acknowledged offset; the client should resume from `received`.'''
+
+    def __init__(self, received):
+        super().__init__(f'Chunk must start at offset {received}.')
+        self.received = received
+
+
+def expire_sessions():
+    '''Drop open (or stuck committing) sessions idle for longer than UPLOAD_SESSION_TTL seconds, with their partial files.'''
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600))
+    for session in UploadSession.objects.filter(status__in=['open', 'committing'], updated_at__lt=cutoff):
+        default_storage.delete(session.storage_name)
+        session.delete()
+
+
+def create_session(name, size, sha256='', owner=None, schema=None):
+    max_size = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 20 * 1024 ** 3)
+    if not is_csv_name(name):
+        raise IngestError(CSV_NAME_ERROR)
+    if size <= 0 or size > max_size:
+        raise IngestError(f'Size must be between 1 and {max_size} bytes.')
+    expire_sessions()
+    storage_name, path = _new_upload_path(name)
+    open(path, 'wb').close()
+    return UploadSession.objects.create(upload_id=uuid.uuid4().hex, owner=owner, name=name, storage_name=storage_name,
+                                        size=size, sha256=(sha256 or '').lower(), schema_id=schema.id if schema else None)
+
+
+def write_chunk(session, offset, stream, length, checksum):
+    '''Append length bytes from stream at offset after verifying their SHA-256; returns the new offset.
+
+    stream may be None (a request without a body), which counts as an incomplete chunk.'''
+    if session.status != 'open':
+        raise IngestError(f'Upload is {session.status}.')
+    if offset != session.received:
+        raise OffsetMismatch(session.received)
+    max_chunk = getattr(settings, 'UPLOAD_CHUNK_MAX', 64 * 1024 * 1024)
+    if length <= 0 or length > max_chunk or offset + length > session.size:
+        raise IngestError(f'Chunk length must be between 1 and {min(max_chunk, session.size - offset)} bytes.')
+    stream = stream if stream is not None else io.BytesIO()
+    sha = hashlib.sha256()
+    written = 0
+    with open(default_storage.path(session.storage_name), 'r+b') as fh:
+        fh.seek(offset)
+        fh.truncate()
+        while written < length:
+            block = stream.read(min(1024 * 1024, length - written))
+            if not block:
+                break
+            sha.update(block)
+            fh.write(block)
+            written += len(block)
+        if written != length or sha.hexdigest() != checksum.lower():
+            fh.truncate(offset)
+            raise IngestError('Chunk is incomplete.' if written != length else 'Chunk checksum mismatch.')
+    if not UploadSession.objects.filter(pk=session.pk, received=offset, status='open').update(received=offset + length):
+        session.refresh_from_db()
+        raise OffsetMismatch(session.received)
+    session.received = offset + length
+    return session.received
+
+
+def _file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def claim_session(session):
+    '''Mark a fully received open upload as committing; False if it is incomplete or another commit got it.'''
+    if not UploadSession.objects.filter(pk=session.pk, status='open', received=F('size')).update(status='committing'):
+        session.refresh_from_db()
+        return False
+    session.status = 'committing'
+    return True
+
+
+def commit_session(session, progress=None):
+    '''Ingest an upload claimed with claim_session() in a single pass that also verifies its SHA-256.
+
+    Compressed uploads are checked against their SHA-256 first, then decompressed while parsing.
+    Returns (dataset, source dataset if the bytes duplicate an existing one, else None). An unexpected
+    error reopens the session so the client can commit again.'''
+    if session.status != 'committing':
+        raise IngestError(f'Upload is {session.status}.')
+    path = default_storage.path(session.storage_name)
+    compressed = split_compression(session.storage_name)[1] is not None
+    sha = hashlib.sha256()
+    try:
+        if compressed and session.sha256 and _file_sha256(path) != session.sha256:
+            os.remove(path)
+            raise IngestError('File checksum mismatch.')
+        storage_name, acc = ingest_stored(session.storage_name, progress=progress, hasher=sha, schema=session.schema_id)
+        digest = sha.hexdigest()
+        if not compressed and session.sha256 and digest != session.sha256:
+            os.remove(path)
+            remove_sidecar(path)
+            raise IngestError('File checksum mismatch.')
+    except IngestError as e:
+        session.status, session.error = 'failed', str(e)
+        session.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+    except Exception:
+        UploadSession.objects.filter(pk=session.pk).update(status='open')
+        session.status = 'open'
+        raise
+    instance, source = register_or_reuse(split_compression(session.name)[0], storage_name, acc, digest, session.owner,
+                                         session.schema_id)
+    session.status, session.dataset = 'committed', instance
+    session.save(update_fields=['status', 'dataset', 'updated_at'])
+    return instance, source
@@ -0,0 +1,293 @@
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Typed columnar copy of a dataset, stored as a directory next to the CSV:
+#   meta.json        row count and per-column kind/file/categories
+#   c<i>.f8          float64 values (numeric columns)
+#   c<i>.codes       int32 category codes, -1 for missing (category columns)
+#   c<i>.offsets     int64 byte offsets, rows + 1 entries (string columns)
+#   c<i>.data        concatenated UTF-8 bytes (string columns)
+#   c<i>.order       int64 ascending sort permutation, built on first use (missing values last)
+# Every file is raw little-endian data so readers can np.memmap it without parsing.
+
+SIDECAR_SUFFIX = '.cols'
+SIDECAR_VERSION = 1
+
+
+def sidecar_dir(csv_path):
+    return csv_path + SIDECAR_SUFFIX
+
+
+def default_kinds(columns, numeric_columns):
+    return {c: ('float' if c in numeric_columns else 'category' if c == 'Type' else 'string') for c in columns}
+
+
+class ColumnarWriter:
+    '''Appends DataFrame chunks to per-column binary files; close() publishes the sidecar atomically.'''
+
+    def __init__(self, directory, kinds=None, numeric_columns=()):
+        self.directory = directory
+        self.tmp = directory + '.tmp'
+        self.kinds = kinds
+        self.numeric_columns = numeric_columns
+        self.rows = 0
+        self.columns = None
+        self.files = {}
+        self.offsets_end = {}
+        self.categories = {}
+
+    def _open(self, df):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        kinds = self.kinds or default_kinds(df.columns, self.numeric_columns)
+        self.columns = []
+        for i, col in enumerate(df.columns):
+            kind = kinds.get(col, 'string')
+            stem = os.path.join(self.tmp, f'c{i}')
+            if kind == 'float':
+                self.files[col] = {'values': open(stem + '.f8', 'wb')}
+            elif kind == 'category':
+                self.files[col] = {'codes': open(stem + '.codes', 'wb')}
+                self.categories[col] = {}
+            else:
+                offsets = open(stem + '.offsets', 'wb')
+                offsets.write(np.zeros(1, dtype='<i8').tobytes())
+                self.files[col] = {'offsets': offsets, 'data': open(stem + '.data', 'wb')}
+                self.offsets_end[col] = 0
+            self.columns.append({'name': col, 'kind': kind, 'file': f'c{i}'})
+
+    def append(self, df):
+        if self.columns is None:
+            self._open(df)
+        for spec in self.columns:
+            col, kind, fh = spec['name'], spec['kind'], self.files[spec['name']]
+            series = df[col] if col in df.columns else pd.Series([None] * len(df), index=df.index)
+            if kind == 'float':
+                values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='<f8')
+                fh['values'].write(values.tobytes())
+            elif kind == 'category' and isinstance(series.dtype, pd.CategoricalDtype):
+                # Map the chunk's categories once instead of every row.
+                cats = self.categories[col]
+                lookup = np.array([cats.setdefault(str(v), len(cats)) for v in series.cat.categories] + [-1], dtype='<i4')
+                fh['codes'].write(lookup[series.cat.codes.to_numpy()].tobytes())
+            elif kind == 'category':
+                cats = self.categories[col]
+                present = series.dropna().astype(str)
+                for v in pd.unique(present):
+                    cats.setdefault(v, len(cats))
+                codes = series.astype(str).map(cats).where(series.notna(), -1).to_numpy(dtype='<i4')
+                fh['codes'].write(codes.tobytes())
+            else:
+                encoded = [s.encode('utf-8') for s in series.where(series.notna(), '').astype(str)]
+                lengths = np.fromiter(map(len, encoded), dtype='<i8', count=len(encoded))
+                ends = self.offsets_end[col] + np.cumsum(lengths)
+                fh['offsets'].write(ends.astype('<i8').tobytes())
+                fh['data'].write(b''.join(encoded))
+                if len(ends):
+                    self.offsets_end[col] = int(ends[-1])
+        self.rows += len(df)
+
+    def _close_files(self):
+        for fh in self.files.values():
+            for f in fh.values():
+                f.close()
+        self.files = {}
+
+    def close(self):
+        if self.columns is None:
+            raise ValueError('No rows were written')
+        self._close_files()
+        for spec in self.columns:
+            if spec['kind'] == 'category':
+                spec['categories'] = list(self.categories[spec['name']])
+        with open(os.path.join(self.tmp, 'meta.json'), 'w') as fh:
+            json.dump({'version': SIDECAR_VERSION, 'rows': self.rows, 'columns': self.columns}, fh)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(self.tmp, self.directory)
+
+    def abort(self):
+        self._close_files()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def _memmap(path, dtype, count):
+    if count == 0 or os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class ColumnarDataset:
+    '''Read-only, memory-mapped view over a sidecar directory.'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as fh:
+            meta = json.load(fh)
+        self.rows = meta['rows']
+        self.specs = {c['name']: c for c in meta['columns']}
+        self.columns = [c['name'] for c in meta['columns']]
+        self._cache = {}
+
+    def kind(self, name):
+        return self.specs[name]['kind']
+
+    def _stem(self, name):
+        return os.path.join(self.directory, self.specs[name]['file'])
+
+    def values(self, name):
+        '''float64 memmap for a numeric column.'''
+        key = (name, 'values')
+        if key not in self._cache:
+            self._cache[key] = _memmap(self._stem(name) + '.f8', '<f8', self.rows)
+        return self._cache[key]
+
+    def codes(self, name):
+        '''(int32 codes memmap, categories list) for a category column.'''
+        key = (name, 'codes')
+        if key not in self._cache:
+            self._cache[key] = _memmap(self._stem(name) + '.codes', '<i4', self.rows)
+        return self._cache[key], self.specs[name]['categories']
+
+    def _strings(self, name):
+        key = (name, 'strings')
+        if key not in self._cache:
+            stem = self._stem(name)
+            offsets = _memmap(stem + '.offsets', '<i8', self.rows + 1)
+            self._cache[key] = (offsets, _memmap(stem + '.data', 'u1', int(offsets[-1]) if len(offsets) else 0))
+        return self._cache[key]
+
+    def strings(self, name, index=None):
+        '''Decode a string column, optionally only at the given row positions.'''
+        offsets, data = self._strings(name)
+        index = np.arange(self.rows) if index is None else np.asarray(index)
+        starts, ends = offsets[index], offsets[index + 1]
+        # Slicing a memoryview costs far less per row than slicing the memmap, which builds an array each time.
+        view = memoryview(data) if len(data) else b''
+        return np.array([str(view[s:e], 'utf-8') for s, e in zip(starts.tolist(), ends.tolist())], dtype=object)
+
+    def order(self, name):
+        '''Ascending sort permutation for a column, persisted in the sidecar after the first request.'''
+        key = (name, 'order')
+        if key in self._cache:
+            return self._cache[key]
+        path = self._stem(name) + '.order'
+        if not os.path.exists(path):
+            kind = self.kind(name)
+            if kind == 'float':
+                perm = np.argsort(self.values(name), kind='stable')
+            elif kind == 'category':
+                codes, cats = self.codes(name)
+                rank = np.empty(len(cats) + 1, dtype=np.int64)
+                rank[np.argsort(np.array(cats, dtype=object), kind='stable')] = np.arange(len(cats))
+                rank[-1] = len(cats)
+                perm = np.argsort(rank[np.asarray(codes)], kind='stable')
+            else:
+                perm = np.argsort(self.strings(name), kind='stable')
+            # A private temp file per writer: concurrent first sorts of a column each publish a whole permutation.
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as fh:
+                    perm.astype('<i8').tofile(fh)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        self._cache[key] = _memmap(path, '<i8', self.rows)
+        return self._cache[key]
+
+    def column(self, name, index=None):
+        kind = self.kind(name)
+        if kind == 'float':
+            values = self.values(name)
+            return values if index is None else values[index]
+        if kind == 'category':
+            codes, cats = self.codes(name)
+            codes = codes if index is None else codes[index]
+            return pd.Categorical.from_codes(np.asarray(codes), categories=cats)
+        return self.strings(name, index)
+
+    def take(self, index=None, columns=None):
+        '''DataFrame for the given row positions (all rows when index is None).'''
+        columns = columns or self.columns
+        return pd.DataFrame({c: self.column(c, index) for c in columns}, columns=columns)
+
+    def to_frame(self, columns=None):
+        return self.take(None, columns)
+
+
+def build_sidecar(csv_path, chunks, numeric_columns=()):
+    '''Write a sidecar for csv_path from an iterable of DataFrame chunks.'''
+    writer = ColumnarWriter(sidecar_dir(csv_path), numeric_columns=numeric_columns)
+    try:
+        for df in chunks:
+            writer.append(df)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    return ColumnarDataset(sidecar_dir(csv_path))
+
+
+def remove_sidecar(csv_path):
+    shutil.rmtree(sidecar_dir(csv_path), ignore_errors=True)
+
+
+def _missing_from(ds, name, matched):
+    '''Index in an ascending permutation of a column where its trailing missing values start.
+
+    Blank floats (NaN) and categories (code -1) sort last, so a binary search over the permutation finds
+    the boundary without reading the whole column. Blank strings sort first and need no special case.'''
+    kind = ds.kind(name)
+    if kind == 'float':
+        values = ds.values(name)
+        missing = lambda i: bool(np.isnan(values[matched[i]]))
+    elif kind == 'category':
+        codes, _ = ds.codes(name)
+        missing = lambda i: bool(codes[matched[i]] < 0)
+    else:
+        return len(matched)
+    return bisect.bisect_left(range(len(matched)), True, key=missing)
+
+
+def select_rows(ds, types=None, ranges=None, sort=None, descending=False, offset=0, limit=100):
+    '''Row positions for one page plus the number of matching rows.
+
+    Without filters a page is a slice of the persisted sort permutation (or of the row range), so its
+    cost is O(limit). Filters are evaluated as vectorized masks over the memory-mapped columns.'''
+    mask = None
+    if types:
+        codes, cats = ds.codes('Type')
+        lookup = {c: i for i, c in enumerate(cats)}
+        mask = np.isin(codes, [lookup[t] for t in types if t in lookup])
+    for col, (lo, hi) in (ranges or {}).items():
+        values = ds.values(col)
+        m = np.ones(ds.rows, dtype=bool)
+        if lo is not None:
+            m &= values >= lo
+        if hi is not None:
+            m &= values <= hi
+        mask = m if mask is None else mask & m
+    if sort:
+        order = ds.order(sort)
+        matched = order if mask is None else order[mask[order]]
+    else:
+        matched = None if mask is None else np.flatnonzero(mask)
+    if matched is None:
+        total = ds.rows
+        page = np.arange(min(offset, total), min(offset + limit, total))
+    elif descending:
+        # Reverse only the present values; missing ones stay at the end as they do in ascending order.
+        total = len(matched)
+        present = _missing_from(ds, sort, matched)
+        pos = np.arange(min(offset, total), min(offset + limit, total))
+        page = matched[np.where(pos < present, present - 1 - pos, pos)]
+    else:
+        total = len(matched)
+        page = matched[offset:offset + limit]
+    return np.asarray(page, dtype=np.int64), total
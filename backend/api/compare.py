@@ -0,0 +1,143 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .ingest import open_dataset
+from .reports import get_report_cache
+from . import metrics
+
+# Dataset comparison keyed on Equipment Name. Both name columns are factorized together, so the join is
+# a single hash pass over a + b rows; first-occurrence positions per name then come from reversed scatter
+# writes, and every per-parameter comparison is an elementwise operation on the matched positions.
+# Results are cached per (a, b) pair in the REPORT_CACHE backend, under compare/ on disk.
+
+COMPARE_VERSION = 1
+KEY = 'Equipment Name'
+_PAIR = re.compile(r'^compare_(\d+)-(\d+)-')
+
+
+def comparison_datasets(key):
+    '''Ids (as strings) of the two datasets a comparison cache key or file name belongs to.'''
+    m = _PAIR.match(key)
+    return m.groups() if m else ()
+
+
+def _names(ds):
+    return np.asarray(ds.column(KEY), dtype=object)
+
+
+def _types(ds, index):
+    if 'Type' not in ds.specs:
+        return np.full(len(index), None, dtype=object)
+    if ds.kind('Type') != 'category':
+        return ds.column('Type', index)
+    codes, cats = ds.codes('Type')
+    return np.array(list(cats) + [None], dtype=object)[np.asarray(codes)[index]]
+
+
+def _first_positions(ids, n_ids):
+    '''Row of the first occurrence of each id (-1 where absent), and how many rows repeat an earlier name.'''
+    first = np.full(n_ids, -1, dtype=np.int64)
+    rows = np.arange(len(ids), dtype=np.int64)
+    valid = ids >= 0
+    # With repeated indices the last write wins, so writing in reverse keeps the first occurrence.
+    first[ids[valid][::-1]] = rows[valid][::-1]
+    return first, int(valid.sum() - (first >= 0).sum())
+
+
+def _value(v):
+    return None if v != v else float(v)
+
+
+def _record(name, type_name, ds, columns, row):
+    out = {'equipment': name, 'type': type_name}
+    for col in columns:
+        out[col] = _value(ds.values(col)[row])
+    return out
+
+
+def compare_datasets(ds_a, ds_b, max_items=1000):
+    '''Added, removed and changed equipment going from ds_a to ds_b, with per-parameter deltas.
+
+    Counts are exact; the added/removed/changed lists keep the first max_items entries in row order of the
+    dataset they come from. Rows without a name are ignored and a repeated name counts as its first row.'''
+    names_a, names_b = _names(ds_a), _names(ds_b)
+    ids, uniques = pd.factorize(np.concatenate([names_a, names_b]), use_na_sentinel=True)
+    ids[np.isin(ids, np.flatnonzero(uniques == ''))] = -1
+    first_a, dup_a = _first_positions(ids[:len(names_a)], len(uniques))
+    first_b, dup_b = _first_positions(ids[len(names_a):], len(uniques))
+
+    added = np.sort(first_b[(first_b >= 0) & (first_a < 0)])
+    removed = np.sort(first_a[(first_a >= 0) & (first_b < 0)])
+    both = np.flatnonzero((first_a >= 0) & (first_b >= 0))
+    order = np.argsort(first_b[both], kind='stable')
+    pos_a, pos_b = first_a[both][order], first_b[both][order]
+
+    columns = [c for c in ds_b.columns if ds_b.kind(c) == 'float' and c in ds_a.specs and ds_a.kind(c) == 'float']
+    type_a, type_b = _types(ds_a, pos_a), _types(ds_b, pos_b)
+    changed = type_a != type_b
+    deltas, differs, parameters = {}, {}, {}
+    for col in columns:
+        va, vb = ds_a.values(col)[pos_a], ds_b.values(col)[pos_b]
+        diff = ~((va == vb) | (np.isnan(va) & np.isnan(vb)))
+        delta = vb - va
+        finite = diff & ~np.isnan(delta)
+        differs[col], deltas[col] = diff, (va, vb, delta)
+        changed |= diff
+        parameters[col] = {'changed': int(diff.sum()),
+                           'mean_delta': _value(delta[finite].mean()) if finite.any() else None,
+                           'max_abs_delta': _value(np.abs(delta[finite]).max()) if finite.any() else None}
+
+    changed_idx = np.flatnonzero(changed)
+    result = {
+        'counts': {'added': len(added), 'removed': len(removed), 'changed': len(changed_idx),
+                   'unchanged': len(pos_b) - len(changed_idx)},
+        'duplicate_names': {'a': dup_a, 'b': dup_b},
+        'parameters': parameters,
+        'added': [], 'removed': [], 'changed': [],
+    }
+    shown = added[:max_items]
+    for row, t in zip(shown.tolist(), _types(ds_b, shown)):
+        result['added'].append(_record(names_b[row], t, ds_b, columns, row))
+    shown = removed[:max_items]
+    for row, t in zip(shown.tolist(), _types(ds_a, shown)):
+        result['removed'].append(_record(names_a[row], t, ds_a, columns, row))
+    for i in changed_idx[:max_items].tolist():
+        entry = {'equipment': names_b[pos_b[i]], 'type': type_b[i], 'deltas': {}}
+        if type_a[i] != type_b[i]:
+            entry['type_from'] = type_a[i]
+        for col in columns:
+            if differs[col][i]:
+                va, vb, delta = deltas[col]
+                entry['deltas'][col] = {'from': _value(va[i]), 'to': _value(vb[i]), 'delta': _value(delta[i])}
+        result['changed'].append(entry)
+    result['truncated'] = any(result['counts'][k] > max_items for k in ('added', 'removed', 'changed'))
+    return result
+
+
+def comparison_key(a, b, max_items):
+    return f'compare_{a.id}-{b.id}-{max_items}-v{COMPARE_VERSION}'
+
+
+def cached_comparison(a, b):
+    '''(comparison of dataset a to dataset b, cache hit); datasets never change, so entries never go stale.'''
+    max_items = getattr(settings, 'COMPARE_MAX_ITEMS', 1000)
+    cache = get_report_cache('compare', '.json', comparison_datasets)
+    key = comparison_key(a, b, max_items)
+    with metrics.span('cache'):
+        data = cache.get(key)
+    metrics.incr('cache_requests_total', cache='compare', result='miss' if data is None else 'hit')
+    if data is not None:
+        return json.loads(data), True
+    with metrics.span('compare'):
+        result = compare_datasets(open_dataset(a), open_dataset(b), max_items)
+    cache.set(key, json.dumps(result).encode('utf-8'))
+    return result, False
+
+
+def remove_comparisons(instances):
+    '''Drop cached comparisons that involve any of the given datasets, with a single scan of the cache.'''
+    ids = [inst.id for inst in instances]
+    if ids:
+        get_report_cache('compare', '.json', comparison_datasets).forget(ids)
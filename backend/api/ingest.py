@@ -0,0 +1,429 @@
+import gzip
+import hashlib
+import os
+import time
+import zipfile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .summary import SummaryAccumulator, merge_summaries
+from .columnar import ColumnarDataset, ColumnarWriter, build_sidecar, remove_sidecar, sidecar_dir
+from .models import UploadedDataset
+from .uploads import content_hash
+from .parallel import map_ingest
+from .trends import record_trends
+from .anomalies import copy_anomalies, record_anomalies
+from . import metrics
+from .parsing import MissingColumnsError, read_chunks
+from .schemas import dataset_schema, get_schema
+from .validation import ValidationReport
+
+# Accepted compressed uploads, by suffix after .csv.
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+CSV_NAME_ERROR = 'Only CSV files are allowed (filename must end with .csv, .csv.gz or .csv.zst).'
+
+
+class IngestError(Exception):
+    '''Raised when an upload cannot be ingested; the message is safe to show to clients.'''
+
+
+class TeeReader:
+    '''File-like wrapper that counts the bytes read by the parser and optionally copies them into a sink
+    and/or feeds them to a hashlib object.'''
+
+    def __init__(self, src, sink=None, hasher=None):
+        self.src = src
+        self.sink = sink
+        self.hasher = hasher
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.src.read(size)
+        if data:
+            self.bytes_read += len(data)
+            if self.sink is not None:
+                self.sink.write(data)
+            if self.hasher is not None:
+                self.hasher.update(data)
+        return data
+
+    def __iter__(self):
+        return iter(self.read, b'')
+
+
+def iter_chunks(src, chunk_rows=None, engine=None, schema=None, on_invalid=None):
+    '''Yield validated, typed DataFrame chunks (see api/parsing.py) with numeric columns already coerced.'''
+    try:
+        yield from read_chunks(src, chunk_rows, engine, schema=schema, on_invalid=on_invalid)
+    except MissingColumnsError as e:
+        raise IngestError(str(e))
+    except Exception as e:
+        raise IngestError('Failed to parse CSV: ' + str(e))
+
+
+def ingest_csv(src, sink=None, chunk_rows=None, writer=None, progress=None, hasher=None, schema=None):
+    '''Single pass over src: parse and validate each chunk against schema (default: the built-in one),
+    copy its bytes to sink, fold it into a SummaryAccumulator and, when a ColumnarWriter is given, append
+    it to the columnar sidecar. Values outside the schema's ranges are blanked and counted, and the
+    row-level validation report is left on the accumulator as acc.validation.
+    progress, if given, is called with the number of bytes consumed after every chunk; hasher, if
+    given, is updated with every byte read.'''
+    schema = get_schema(schema)
+    acc = SummaryAccumulator(schema.numeric)
+    report = ValidationReport(schema)
+    reader = TeeReader(src, sink, hasher)
+    # Time per stage; 'parse' includes reading src and copying it to sink.
+    start = mark = time.perf_counter()
+    parse = summarize = columnar = 0.0
+    validate = 0.0
+    for df in iter_chunks(reader, chunk_rows, schema=schema, on_invalid=report.invalid_numeric):
+        parsed = time.perf_counter()
+        out_of_range = schema.range_mask(df)
+        report.update(df, out_of_range)
+        acc.add_out_of_range(schema.clean(df, out_of_range))
+        validated = time.perf_counter()
+        acc.update(df)
+        summarized = time.perf_counter()
+        if writer is not None:
+            writer.append(df)
+        if progress is not None:
+            progress(reader.bytes_read)
+        parse += parsed - mark
+        validate += validated - parsed
+        summarize += summarized - validated
+        mark = time.perf_counter()
+        columnar += mark - summarized
+    elapsed = time.perf_counter() - start
+    metrics.record('parse', parse + elapsed - (mark - start))
+    metrics.record('validate', validate)
+    metrics.record('summarize', summarize)
+    if writer is not None:
+        metrics.record('columnar', columnar)
+    metrics.incr('ingest_bytes_total', reader.bytes_read)
+    metrics.incr('ingest_rows_total', acc.total)
+    if elapsed > 0:
+        metrics.set_gauge('ingest_rows_per_second', round(acc.total / elapsed))
+    if acc.total == 0:
+        raise IngestError('Failed to parse CSV: no data rows')
+    for col in schema.numeric:
+        if col in schema.required and acc.columns[col].count == 0:
+            raise IngestError(f'Column {col} must contain numeric values.')
+    acc.validation = report.result()
+    return acc
+
+
+def split_compression(name):
+    '''(name without a .gz/.zst suffix, codec or None).'''
+    root, ext = os.path.splitext(name)
+    codec = COMPRESSION_SUFFIXES.get(ext.lower())
+    return (root, codec) if codec else (name, None)
+
+
+def is_csv_name(name):
+    return split_compression(name)[0].lower().endswith('.csv')
+
+
+class SizeLimitedReader:
+    '''Raises IngestError once more than limit bytes were read, so a compressed upload cannot expand without bound.'''
+
+    def __init__(self, src, limit):
+        self.src = src
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.src.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise IngestError(f'Decompressed file is larger than {self.limit} bytes.')
+        return data
+
+    def __iter__(self):
+        return iter(self.read, b'')
+
+
+def decompressing_reader(src, codec):
+    '''File-like over the decompressed bytes of src; decompression happens as the parser reads.'''
+    if codec is None:
+        return src
+    limit = getattr(settings, 'MAX_DECOMPRESSED_SIZE', 5 * 1024 ** 3)
+    if codec == 'gzip':
+        return SizeLimitedReader(gzip.GzipFile(fileobj=src, mode='rb'), limit)
+    try:
+        import zstandard
+    except ImportError:
+        raise IngestError('.zst uploads are not supported by this server (the zstandard package is not installed).')
+    return SizeLimitedReader(zstandard.ZstdDecompressor().stream_reader(src), limit)
+
+
+def _new_upload_path(name):
+    storage_name = default_storage.get_available_name(os.path.join('uploads', os.path.basename(name)))
+    path = default_storage.path(storage_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return storage_name, path
+
+
+def _ingest_stream(src, name, chunk_rows=None, progress=None, hasher=None, schema=None):
+    '''Parse src while copying it into a new CSV under uploads/; returns (storage name, SummaryAccumulator).'''
+    schema = get_schema(schema)
+    storage_name, path = _new_upload_path(name)
+    writer = ColumnarWriter(sidecar_dir(path), numeric_columns=schema.numeric)
+    try:
+        with open(path, 'wb') as sink:
+            acc = ingest_csv(src, sink, chunk_rows, writer, progress, hasher, schema)
+        writer.close()
+    except Exception:
+        writer.abort()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return storage_name, acc
+
+
+def ingest_upload(file, name, chunk_rows=None, hasher=None, schema=None):
+    '''Stream an uploaded file into storage under uploads/ and return (storage name, SummaryAccumulator).
+
+    .csv.gz/.csv.zst uploads are decompressed while they are parsed and stored as plain CSV.'''
+    plain_name, codec = split_compression(name)
+    file.seek(0)
+    return _ingest_stream(decompressing_reader(file, codec), plain_name, chunk_rows, hasher=hasher, schema=schema)
+
+
+def stage_upload(file, name):
+    '''Copy an upload into storage without parsing it, for ingest_stored() to pick up in a background job.'''
+    storage_name, path = _new_upload_path(name)
+    with open(path, 'wb') as sink:
+        for block in file.chunks():
+            sink.write(block)
+    return storage_name
+
+
+def ingest_path(path, chunk_rows=None, progress=None, hasher=None, schema=None):
+    '''Ingest a CSV already on disk in place; the file is removed if it turns out to be invalid.'''
+    schema = get_schema(schema)
+    writer = ColumnarWriter(sidecar_dir(path), numeric_columns=schema.numeric)
+    try:
+        with open(path, 'rb') as src:
+            acc = ingest_csv(src, None, chunk_rows, writer, progress, hasher, schema)
+        writer.close()
+    except Exception:
+        writer.abort()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return acc
+
+
+def ingest_stored(storage_name, chunk_rows=None, progress=None, hasher=None, schema=None):
+    '''Ingest a staged file; returns (storage name of the CSV, SummaryAccumulator).
+
+    A compressed staged file is decompressed while it is parsed into a plain CSV next to it and then
+    removed; progress then counts compressed bytes so it matches the staged file size.'''
+    plain_name, codec = split_compression(storage_name)
+    path = default_storage.path(storage_name)
+    if codec is None:
+        return storage_name, ingest_path(path, chunk_rows, progress, hasher, schema)
+    try:
+        with open(path, 'rb') as src:
+            raw = TeeReader(src)
+            report = (lambda n: progress(raw.bytes_read)) if progress is not None else None
+            return _ingest_stream(decompressing_reader(raw, codec), plain_name, chunk_rows, report, hasher, schema)
+    finally:
+        os.remove(path)
+
+
+def _schedule_sweep(owner):
+    from .jobs import schedule_sweep  # jobs imports this module
+    schedule_sweep(owner)
+
+
+def register_dataset(name, storage_name, acc, content_hash='', owner=None, schema=None):
+    '''Create owner's UploadedDataset row for an ingested file (with acc's validation report, if any), add
+    its trend rollup and anomalies and schedule a retention sweep of the owner's datasets.'''
+    instance = UploadedDataset.objects.create(owner=owner, name=name, csv_file=storage_name, summary_json=acc.result(),
+                                              partial_summary=acc.to_dict(), content_hash=content_hash,
+                                              size=default_storage.size(storage_name), schema_id=get_schema(schema).id,
+                                              validation=acc.validation or {})
+    record_trends(instance)
+    record_anomalies(instance, open_dataset(instance))
+    _schedule_sweep(owner)
+    return instance
+
+
+def find_duplicate(content_hash, owner=None, schema=None):
+    '''Owner's most recent dataset with these exact bytes, parsed with the same schema, whose stored file
+    is still on disk.
+
+    Only an owner's own datasets are candidates, so a duplicate never reveals another user's upload.'''
+    if not content_hash:
+        return None
+    candidates = UploadedDataset.objects.filter(owner=owner, content_hash=content_hash, schema_id=get_schema(schema).id)
+    for inst in candidates.order_by('-uploaded_at')[:3]:
+        if inst.csv_file and default_storage.exists(inst.csv_file.name):
+            return inst
+    return None
+
+
+def register_duplicate(name, source):
+    '''New dataset reference reusing the stored file, sidecar and summaries of source, owned by source's owner.'''
+    instance = UploadedDataset.objects.create(owner_id=source.owner_id, name=name, csv_file=source.csv_file.name, summary_json=source.summary_json,
+                                              partial_summary=source.partial_summary, content_hash=source.content_hash,
+                                              size=source.size, schema_id=source.schema_id, validation=source.validation)
+    record_trends(instance)
+    copy_anomalies(source, instance)
+    _schedule_sweep(instance.owner)
+    return instance
+
+
+def register_or_reuse(name, storage_name, acc, content_hash, owner=None, schema=None):
+    '''Register a freshly ingested file, or drop it in favour of one of owner's datasets with the same bytes.
+
+    Returns (dataset, source dataset or None).'''
+    source = find_duplicate(content_hash, owner, schema)
+    if source is None:
+        return register_dataset(name, storage_name, acc, content_hash, owner, schema), None
+    path = default_storage.path(storage_name)
+    if os.path.exists(path):
+        os.remove(path)
+    remove_sidecar(path)
+    return register_duplicate(name, source), source
+
+
+def open_dataset(inst):
+    '''Memory-mapped columnar view of a dataset; builds the sidecar from the CSV for uploads that predate it.'''
+    path = inst.csv_file.path
+    try:
+        return ColumnarDataset(sidecar_dir(path))
+    except FileNotFoundError:
+        schema = dataset_schema(inst)
+        with open(path, 'rb') as fh:
+            return build_sidecar(path, iter_chunks(fh, schema=schema), schema.numeric)
+
+
+def _stage_stream(src, name, max_size):
+    '''Copy a file-like object into storage under uploads/, hashing it on the way; returns (storage name, sha256).'''
+    storage_name, path = _new_upload_path(name)
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as sink:
+        for block in iter(lambda: src.read(1024 * 1024), b''):
+            size += len(block)
+            if size > max_size:
+                break
+            sha.update(block)
+            sink.write(block)
+    if size > max_size:
+        os.remove(path)
+        raise IngestError(f'File too large. Max allowed size is {max_size} bytes.')
+    return storage_name, sha.hexdigest()
+
+
+def expand_batch(files, max_size, max_files):
+    '''Stage every CSV in a batch (plain or .gz/.zst-compressed uploads, or zip archives of them).
+
+    Returns a list of dicts with name, storage_name and content_hash, or name and error for rejected entries.'''
+    staged = []
+    try:
+        for f in files:
+            fname = os.path.basename(f.name or 'dataset')
+            if fname.lower().endswith('.zip'):
+                try:
+                    archive = zipfile.ZipFile(f)
+                except zipfile.BadZipFile:
+                    staged.append({'name': fname, 'error': 'Not a valid zip archive.'})
+                    continue
+                with archive:
+                    members = [info for info in archive.infolist() if not info.is_dir() and '__MACOSX' not in info.filename
+                               and not os.path.basename(info.filename).startswith('.') and os.path.basename(info.filename)]
+                    # Checked against the archive's directory, before any member is extracted.
+                    if len(staged) + len(members) > max_files:
+                        raise IngestError(f'Too many files in one batch. Max allowed is {max_files}.')
+                    for info in members:
+                        member = os.path.basename(info.filename)
+                        if not is_csv_name(member):
+                            staged.append({'name': member, 'error': CSV_NAME_ERROR})
+                            continue
+                        plain, codec = split_compression(member)
+                        try:
+                            with archive.open(info) as src:
+                                storage_name, digest = _stage_stream(decompressing_reader(src, codec), plain, max_size)
+                        except IngestError as e:
+                            staged.append({'name': member, 'error': str(e)})
+                            continue
+                        staged.append({'name': plain, 'storage_name': storage_name, 'content_hash': digest})
+            elif f.size > max_size:
+                staged.append({'name': fname, 'error': f'File too large. Max allowed size is {max_size} bytes.'})
+            elif not is_csv_name(fname):
+                staged.append({'name': fname, 'error': CSV_NAME_ERROR})
+            elif split_compression(fname)[1]:
+                plain, codec = split_compression(fname)
+                try:
+                    storage_name, digest = _stage_stream(decompressing_reader(f, codec), plain,
+                                                         getattr(settings, 'MAX_DECOMPRESSED_SIZE', 5 * 1024 ** 3))
+                except IngestError as e:
+                    staged.append({'name': fname, 'error': str(e)})
+                    continue
+                staged.append({'name': plain, 'storage_name': storage_name, 'content_hash': digest})
+            else:
+                staged.append({'name': fname, 'storage_name': stage_upload(f, fname), 'content_hash': content_hash(f)})
+            if len(staged) > max_files:
+                raise IngestError(f'Too many files in one batch. Max allowed is {max_files}.')
+    except Exception:
+        for entry in staged:
+            if entry.get('storage_name'):
+                default_storage.delete(entry['storage_name'])
+        raise
+    return staged
+
+
+def ingest_batch(files, owner=None, chunk_rows=None, schema=None):
+    '''Stage, parse and register every CSV of a batch upload as datasets of owner.
+
+    Distinct files are parsed in parallel by the process pool; exact duplicates (of stored datasets or of
+    earlier files in the batch) reuse the existing summary. Returns (per-file results, new datasets,
+    combined SummaryAccumulator over every successfully ingested file).'''
+    max_size = getattr(settings, 'MAX_UPLOAD_SIZE', 500 * 1024 * 1024)
+    entries = expand_batch(files, max_size, getattr(settings, 'BATCH_MAX_FILES', 100))
+    first_seen, todo = {}, []
+    for i, entry in enumerate(entries):
+        if 'error' in entry:
+            continue
+        digest = entry['content_hash']
+        source = find_duplicate(digest, owner, schema)
+        if source is not None or digest in first_seen:
+            default_storage.delete(entry['storage_name'])
+            entry['source'] = source if source is not None else first_seen[digest]
+        else:
+            first_seen[digest] = i
+            todo.append(i)
+
+    chunk_rows = chunk_rows or getattr(settings, 'INGEST_CHUNK_ROWS', 50000)
+    workers = getattr(settings, 'BATCH_WORKERS', 1)
+    schema = get_schema(schema)
+    outputs = map_ingest([default_storage.path(entries[i]['storage_name']) for i in todo], chunk_rows, workers, schema)
+
+    results, created, partials, instances = [], [], [], {}
+    for i, (partial, error, validation) in zip(todo, outputs):
+        entries[i]['partial'], entries[i]['error'], entries[i]['validation'] = partial, error, validation
+    for i, entry in enumerate(entries):
+        if entry.get('error'):
+            results.append({'name': entry['name'], 'error': entry['error']})
+            continue
+        source = entry.get('source')
+        if source is None:
+            acc = SummaryAccumulator.from_dict(entry['partial'])
+            acc.validation = entry['validation']
+            instance = register_dataset(entry['name'], entry['storage_name'], acc, entry['content_hash'], owner, schema)
+            created.append(instance)
+            result = {'name': entry['name'], 'id': instance.id, 'summary': instance.summary_json}
+        else:
+            if isinstance(source, int):
+                source = instances.get(source)
+                if source is None:
+                    results.append({'name': entry['name'], 'error': 'Duplicate of a file in this batch that failed.'})
+                    continue
+            instance = register_duplicate(entry['name'], source)
+            result = {'name': entry['name'], 'id': instance.id, 'summary': instance.summary_json, 'duplicate_of': source.id}
+        instances[i] = instance
+        partials.append(instance.partial_summary)
+        results.append(result)
+    return results, created, merge_summaries(partials)
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.core.files.storage import default_storage
+from .models import Job, UploadSession, UploadedDataset
+from .ingest import IngestError, ingest_stored, register_or_reuse
+from .reports import store_report
+from .chunked import commit_session
+from .catalog import sweep
+
+# Background jobs are rows in the Job table, so the queue lives in the regular database (SQLite by
+# default) and needs no broker. JOB_QUEUE_MODE picks who runs them:
+#   'thread' - an in-process pool of JOB_WORKERS threads picks them up as soon as they are queued
+#   'db'     - they stay queued until a `manage.py run_jobs` worker process claims them
+#   'eager'  - they run inline in enqueue(), which is what the tests use
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+_executor = None
+
+
+def job_handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'JOB_WORKERS', None) or os.cpu_count() or 2
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+    return _executor
+
+
+def enqueue(kind, dataset=None, owner=None, **params):
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job = Job.objects.create(kind=kind, dataset=dataset, owner=owner, params=params)
+    mode = getattr(settings, 'JOB_QUEUE_MODE', 'thread')
+    if mode == 'eager':
+        run_job(job.id)
+        job.refresh_from_db()
+    elif mode == 'thread':
+        # After commit, so the worker thread's connection can see the job row.
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.id))
+    return job
+
+
+def prerender_report(instance):
+    '''Queue a report render right after upload when PRERENDER_REPORTS is on.'''
+    if getattr(settings, 'PRERENDER_REPORTS', False):
+        return enqueue('report', dataset=instance, owner=instance.owner, dataset_id=instance.id)
+    return None
+
+
+def schedule_sweep(owner=None):
+    '''Queue a retention sweep of owner's datasets (of everyone's without an owner) unless one is pending
+    or was queued within RETENTION_SWEEP_INTERVAL seconds.
+
+    A queued or running sweep untouched for RETENTION_SWEEP_STALE seconds was lost to a restart or a
+    crashed worker; it is marked failed and no longer holds back new sweeps.'''
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'RETENTION_SWEEP_INTERVAL', 60))
+    stale = now - timedelta(seconds=getattr(settings, 'RETENTION_SWEEP_STALE', 3600))
+    sweeps = Job.objects.filter(kind='sweep', owner=owner)
+    sweeps.filter(status__in=['queued', 'running'], updated_at__lt=stale).update(
+        status='failed', error='Abandoned: no progress for RETENTION_SWEEP_STALE seconds.', updated_at=now)
+    recent = Q(status__in=['queued', 'running']) | Q(created_at__gte=cutoff)
+    if sweeps.filter(recent).exists():
+        return None
+    return enqueue('sweep', owner=owner)
+
+
+def completed_job(kind, dataset, result):
+    '''Record work that needed no processing (e.g. a duplicate upload) as an already finished job.'''
+    return Job.objects.create(kind=kind, dataset=dataset, owner_id=dataset.owner_id, status='done', progress=1.0,
+                              result=result)
+
+
+def claim(job_id):
+    '''Atomically move a queued job to running; False if another worker got it first.'''
+    return Job.objects.filter(pk=job_id, status='queued').update(status='running', updated_at=timezone.now()) == 1
+
+
+def claim_next():
+    for job_id in Job.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:10]:
+        if claim(job_id):
+            return job_id
+    return None
+
+
+def report_progress(job, progress, message=''):
+    job.progress = progress
+    job.message = message[:200]
+    Job.objects.filter(pk=job.pk).update(progress=progress, message=job.message, updated_at=timezone.now())
+
+
+def run_job(job_id, claimed=False):
+    if not claimed and not claim(job_id):
+        return
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = HANDLERS[job.kind](job, **job.params)
+    except Exception as e:
+        if isinstance(e, IngestError):
+            logger.info('Job %s (%s) rejected: %s', job.id, job.kind, e)
+        else:
+            logger.exception('Job %s (%s) failed', job.id, job.kind)
+        job.status, job.error = 'failed', str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        return
+    job.refresh_from_db(fields=['dataset'])
+    job.status, job.progress, job.message, job.result = 'done', 1.0, '', result
+    job.save(update_fields=['status', 'progress', 'message', 'result', 'updated_at'])
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+@job_handler('ingest')
+def ingest_job(job, name, storage_name, content_hash='', schema=None):
+    size = os.path.getsize(default_storage.path(storage_name)) or 1
+    report_progress(job, 0.0, 'parsing')
+    # Compressed uploads are staged without a hash; it is taken over the decompressed bytes while parsing.
+    sha = None if content_hash else hashlib.sha256()
+    storage_name, acc = ingest_stored(storage_name, hasher=sha, schema=schema,
+                                      progress=lambda n: report_progress(job, min(n / size, 1.0) * 0.9, 'parsing'))
+    instance, source = register_or_reuse(name, storage_name, acc, content_hash or sha.hexdigest(), job.owner, schema)
+    Job.objects.filter(pk=job.pk).update(dataset=instance)
+    result = {'id': instance.id, 'summary': instance.summary_json}
+    if source is not None:
+        result['duplicate_of'] = source.id
+    else:
+        prerender_report(instance)
+    return result
+
+
+@job_handler('commit_upload')
+def commit_upload_job(job, upload_id):
+    session = UploadSession.objects.get(upload_id=upload_id)
+    report_progress(job, 0.0, 'parsing')
+    instance, source = commit_session(
+        session, progress=lambda n: report_progress(job, min(n / (session.size or 1), 1.0) * 0.9, 'parsing'))
+    Job.objects.filter(pk=job.pk).update(dataset=instance)
+    result = {'id': instance.id, 'summary': instance.summary_json}
+    if source is not None:
+        result['duplicate_of'] = source.id
+    else:
+        prerender_report(instance)
+    return result
+
+
+@job_handler('report')
+def report_job(job, dataset_id):
+    inst = UploadedDataset.objects.get(pk=dataset_id)
+    report_progress(job, 0.0, 'rendering')
+    cached = store_report(inst)
+    return {'dataset_id': inst.id, 'pdf': f'generate_pdf/{inst.id}/', 'cached': cached}
+
+
+@job_handler('sweep')
+def sweep_job(job):
+    report_progress(job, 0.0, 'sweeping')
+    return {'deleted': sweep(owners=None if job.owner_id is None else [job.owner_id])}
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from api.jobs import claim_next, run_job, schedule_sweep
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (uploads, reports, retention sweeps). Start one process per core to scale out.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to sleep when idle.')
+
+    def handle(self, *args, **options):
+        while True:
+            job_id = claim_next()
+            if job_id is None and schedule_sweep() is not None:
+                job_id = claim_next()
+            if job_id is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+            self.stdout.write(f'Running job {job_id}')
+            run_job(job_id, claimed=True)
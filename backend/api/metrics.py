@@ -0,0 +1,199 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+
+# In-process instrumentation. span() times a stage of the hot path (parse, summarize, render, ...) and
+# incr()/set_gauge() update counters; everything lands in one process-wide registry rendered in Prometheus
+# text format by /api/metrics/. While a request is being served (see MetricsMiddleware) its spans and DB
+# queries are also collected per request and returned as a Server-Timing header. Each process keeps its
+# own registry, so scrape every worker (or sum across them).
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_gauges = {}
+_summaries = {}   # (name, labels) -> [count, sum]
+_help = {}
+_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def describe(name, kind, text):
+    _help[name] = (kind, text)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def incr(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        entry = _summaries.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += value
+
+
+def record(stage, seconds):
+    '''Account seconds to a stage: in the stage summary and, during a request, in its Server-Timing.'''
+    observe('stage_seconds', seconds, stage=stage)
+    spans = _request.get()
+    if spans is not None:
+        spans[stage] = spans.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+
+def render_prometheus():
+    '''The registry in Prometheus text exposition format.'''
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        summaries = {k: tuple(v) for k, v in _summaries.items()}
+    lines = []
+    for series, kind in ((counters, 'counter'), (gauges, 'gauge'), (summaries, 'summary')):
+        for name in sorted({n for n, _ in series}):
+            text = _help.get(name, (kind, name.replace('_', ' ')))[1]
+            lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}']
+            for (n, labels), value in sorted(series.items()):
+                if n != name:
+                    continue
+                if kind == 'summary':
+                    lines.append(f'{name}_count{_labels(labels)} {value[0]}')
+                    lines.append(f'{name}_sum{_labels(labels)} {value[1]:.6f}')
+                else:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    '''Clear the registry (tests).'''
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+
+describe('http_requests_total', 'counter', 'Requests served, by view, method and status.')
+describe('http_request_seconds', 'summary', 'Request wall time, by view.')
+describe('db_queries_total', 'counter', 'Database queries issued while serving requests, by view.')
+describe('stage_seconds', 'summary', 'Time spent in each instrumented stage of the hot paths.')
+describe('ingest_bytes_total', 'counter', 'CSV bytes parsed by ingest.')
+describe('ingest_rows_total', 'counter', 'CSV rows parsed by ingest.')
+describe('ingest_rows_per_second', 'gauge', 'Parse throughput of the most recent ingest.')
+describe('cache_requests_total', 'counter', 'Report and comparison cache lookups, by cache and result.')
+
+
+class SamplingProfiler:
+    '''Samples one thread's Python stack every interval seconds from a background thread.
+
+    stacks() returns collapsed stacks ("outer;inner count" lines, the input format of flamegraph tools).'''
+
+    def __init__(self, thread_id, interval):
+        self.thread_id, self.interval = thread_id, interval
+        self.samples = Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+
+    def stacks(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class MetricsMiddleware:
+    '''Counts requests and their DB queries, adds a Server-Timing header with the request's spans and,
+    when PROFILE_SLOW_REQUESTS is on, samples the request's stack and dumps it if the request is slow.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        spans = {}
+        token = _request.set(spans)
+        queries = [0, 0.0]
+
+        def count_queries(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - start
+
+        profiler = None
+        if getattr(settings, 'PROFILE_SLOW_REQUESTS', False):
+            profiler = SamplingProfiler(threading.get_ident(), getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)).start()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                response = self.get_response(request)
+        finally:
+            _request.reset(token)
+            if profiler is not None:
+                profiler.stop()
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        incr('http_requests_total', view=view, method=request.method, status=response.status_code)
+        observe('http_request_seconds', elapsed, view=view)
+        incr('db_queries_total', queries[0], view=view)
+        timings = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in spans.items()]
+        timings.append(f'db;dur={queries[1] * 1000:.1f};desc="{queries[0]} queries"')
+        timings.append(f'total;dur={elapsed * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        if profiler is not None and elapsed * 1000 >= getattr(settings, 'PROFILE_SLOW_MS', 1000):
+            self._dump(profiler, view, elapsed)
+        return response
+
+    def _dump(self, profiler, view, elapsed):
+        directory = getattr(settings, 'PROFILE_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{view}-{int(elapsed * 1000)}ms-{os.getpid()}.folded'
+        with open(os.path.join(directory, name), 'w') as fh:
+            fh.write(profiler.stacks())
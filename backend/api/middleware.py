@@ -0,0 +1,53 @@
+import re
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+# Content-negotiated response compression: zstd when the client accepts it and the zstandard package
+# is installed, gzip otherwise. Bodies that are already compressed (PDF, zip, ...) are passed through.
+
+ACCEPTS_ZSTD = re.compile(r'\bzstd\b')
+PRECOMPRESSED_TYPES = ('application/pdf', 'application/zip', 'application/gzip', 'application/zstd', 'image/')
+
+
+def _zstd_sequence(sequence, level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for chunk in sequence:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    zstd_level = 3
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(PRECOMPRESSED_TYPES):
+            return response
+        ae = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if zstandard is None or not ACCEPTS_ZSTD.search(ae) or getattr(response, 'is_async', False):
+            return super().process_response(request, response)
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = _zstd_sequence(response.streaming_content, self.zstd_level)
+            del response.headers['Content-Length']
+        else:
+            compressed = zstandard.ZstdCompressor(level=self.zstd_level).compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'zstd'
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-16 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddataset',
+            name='partial_summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-16 22:16
+
+from django.db import migrations, models
+
+
+def backfill_sizes(apps, schema_editor):
+    from django.core.files.storage import default_storage
+    UploadedDataset = apps.get_model('api', 'UploadedDataset')
+    for inst in UploadedDataset.objects.all().only('id', 'csv_file'):
+        try:
+            size = default_storage.size(inst.csv_file.name)
+        except (OSError, ValueError):
+            continue
+        UploadedDataset.objects.filter(pk=inst.pk).update(size=size)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddataset',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='uploadeddataset',
+            name='csv_file',
+            field=models.FileField(db_index=True, upload_to='uploads/'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['kind', 'created_at'], name='job_kind_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddataset',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='dataset_recent_idx'),
+        ),
+        migrations.RunPython(backfill_sizes, migrations.RunPython.noop),
+    ]
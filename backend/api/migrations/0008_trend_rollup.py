@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-16 22:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_trends(apps, schema_editor):
+    from api.trends import STAT_FIELDS, trend_rows
+    UploadedDataset = apps.get_model('api', 'UploadedDataset')
+    TrendPoint = apps.get_model('api', 'TrendPoint')
+    for inst in UploadedDataset.objects.exclude(summary_json=None).iterator():
+        TrendPoint.objects.bulk_create([
+            TrendPoint(owner_id=inst.owner_id, dataset_id=inst.id, name=inst.name[:200], uploaded_at=inst.uploaded_at,
+                       type=type_name[:200], metric=metric, count=st.get('count') or 0,
+                       **{f: st.get(f) for f in STAT_FIELDS if f != 'count'})
+            for type_name, metric, st in trend_rows(inst.summary_json)], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_dataset_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('uploaded_at', models.DateTimeField()),
+                ('type', models.CharField(blank=True, default='', max_length=200)),
+                ('metric', models.CharField(max_length=64)),
+                ('count', models.BigIntegerField(default=0)),
+                ('mean', models.FloatField(null=True)),
+                ('std', models.FloatField(null=True)),
+                ('min', models.FloatField(null=True)),
+                ('max', models.FloatField(null=True)),
+                ('p50', models.FloatField(null=True)),
+                ('dataset', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.uploadeddataset')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'metric', 'type', '-uploaded_at'], name='trend_series_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_trends, migrations.RunPython.noop),
+    ]
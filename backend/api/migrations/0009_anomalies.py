@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-16 22:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_trend_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddataset',
+            name='anomalies_scored',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.BigIntegerField()),
+                ('equipment', models.CharField(blank=True, default='', max_length=200)),
+                ('type', models.CharField(blank=True, default='', max_length=200)),
+                ('metric', models.CharField(max_length=64)),
+                ('value', models.FloatField()),
+                ('zscore', models.FloatField()),
+                ('robust_z', models.FloatField()),
+                ('methods', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='api.uploadeddataset')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dataset', '-score'], name='anomaly_score_idx'), models.Index(fields=['dataset', 'metric', '-score'], name='anomaly_metric_idx')],
+            },
+        ),
+    ]
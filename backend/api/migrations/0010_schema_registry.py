@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-16 22:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The built-in 'equipment' schema (api/schemas.py) plus the extra channels some sites log.
+EXTENDED = [
+    {'name': 'Equipment Name', 'kind': 'string', 'required': True},
+    {'name': 'Type', 'kind': 'category', 'required': True},
+    {'name': 'Flowrate', 'kind': 'float', 'unit': 'm³/h', 'required': True},
+    {'name': 'Pressure', 'kind': 'float', 'unit': 'bar', 'required': True},
+    {'name': 'Temperature', 'kind': 'float', 'unit': '°C', 'required': True},
+    {'name': 'Level', 'kind': 'float', 'unit': '%', 'min': 0, 'max': 100, 'required': True},
+    {'name': 'Vibration', 'kind': 'float', 'unit': 'mm/s', 'min': 0, 'required': True},
+    {'name': 'Power', 'kind': 'float', 'unit': 'kW', 'min': 0, 'required': True},
+]
+
+
+def seed_schemas(apps, schema_editor):
+    Schema = apps.get_model('api', 'Schema')
+    Schema.objects.get_or_create(name='equipment_extended', defaults={
+        'description': 'The equipment schema plus Level, Vibration and Power', 'columns': EXTENDED})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_anomalies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Schema',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(max_length=64, unique=True)),
+                ('description', models.CharField(blank=True, default='', max_length=200)),
+                ('columns', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='uploadeddataset',
+            name='schema',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='datasets', to='api.schema'),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='schema',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.schema'),
+        ),
+        migrations.RunPython(seed_schemas, migrations.RunPython.noop),
+    ]
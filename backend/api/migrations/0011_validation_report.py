@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-16 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_schema_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddataset',
+            name='validation',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-16 23:05
+
+from django.conf import settings
+from django.db import migrations
+
+
+def adopt_unowned(apps, schema_editor):
+    # Mirrors catalog.adopt_unowned with the historical models.
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    username = getattr(settings, 'LEGACY_DATASET_OWNER', '')
+    owner = User.objects.filter(**({'username': username} if username else {'is_superuser': True})).order_by('id').first()
+    if owner is None:
+        return
+    for name in ('UploadedDataset', 'Job', 'UploadSession'):
+        apps.get_model('api', name).objects.filter(owner__isnull=True).update(owner=owner)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_validation_report'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(adopt_unowned, migrations.RunPython.noop),
+    ]
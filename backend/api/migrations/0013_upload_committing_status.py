@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_adopt_unowned_datasets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('committing', 'Committing'), ('committed', 'Committed'), ('failed', 'Failed')], db_index=True, default='open', max_length=16),
+        ),
+    ]
@@ -1,9 +1,188 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+
+
+class Schema(models.Model):
+    '''A named upload schema: the columns an upload must have, each with a kind, unit and valid range.
+
+    columns is a list of {"name", "kind": "string" | "category" | "float", "unit", "min", "max", "required"},
+    and category columns may list their allowed "values";
+    every schema has the Equipment Name (string) and Type (category) columns that datasets are keyed and
+    grouped by. The name 'equipment' is reserved for the built-in default. Compiled and cached by api/schemas.py.'''
+    KINDS = ('string', 'category', 'float')
+    FIXED = {'Equipment Name': 'string', 'Type': 'category'}
+
+    name = models.SlugField(max_length=64, unique=True)
+    description = models.CharField(max_length=200, blank=True, default='')
+    columns = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        if self.name == 'equipment':
+            raise ValidationError({'name': 'equipment is the built-in default schema.'})
+        if not isinstance(self.columns, list) or not all(isinstance(c, dict) and c.get('name') for c in self.columns):
+            raise ValidationError({'columns': 'columns must be a list of objects with a name.'})
+        names = [c['name'] for c in self.columns]
+        if len(set(names)) != len(names):
+            raise ValidationError({'columns': 'Column names must be unique.'})
+        kinds = {c['name']: c.get('kind', 'float') for c in self.columns}
+        for name, kind in self.FIXED.items():
+            if kinds.get(name) != kind:
+                raise ValidationError({'columns': f'{name} must be a {kind} column.'})
+        for c in self.columns:
+            if kinds[c['name']] not in self.KINDS:
+                raise ValidationError({'columns': f"{c['name']}: kind must be one of {', '.join(self.KINDS)}."})
+            if c.get('values') is not None and (kinds[c['name']] != 'category' or not isinstance(c['values'], list)):
+                raise ValidationError({'columns': f"{c['name']}: values is a list of allowed values of a category column."})
+            lo, hi = c.get('min'), c.get('max')
+            if any(v is not None and not isinstance(v, (int, float)) for v in (lo, hi)) or \
+                    (lo is not None and hi is not None and lo > hi):
+                raise ValidationError({'columns': f"{c['name']}: min and max must be numbers with min <= max."})
+        if not any(k == 'float' for k in kinds.values()):
+            raise ValidationError({'columns': 'A schema needs at least one float column.'})
+
+    def __str__(self):
+        return self.name
+
+
 class UploadedDataset(models.Model):
+    # Null only for datasets uploaded before datasets had owners.
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE, related_name='datasets')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     name = models.CharField(max_length=200)
-    csv_file = models.FileField(upload_to='uploads/')
+    # Indexed so retention can tell with one query whether a stored file is still shared.
+    csv_file = models.FileField(upload_to='uploads/', db_index=True)
     summary_json = models.JSONField(null=True, blank=True)
+    # Serialized SummaryAccumulator state, mergeable across datasets without rereading rows.
+    partial_summary = models.JSONField(null=True, blank=True)
+    # SHA-256 of the uploaded bytes; datasets with the same hash share csv_file and its sidecar.
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Bytes of the stored CSV, for size-based retention.
+    size = models.BigIntegerField(default=0)
+    # Set once the dataset's Anomaly rows are stored; older uploads are scored on first request.
+    anomalies_scored = models.BooleanField(default=False)
+    # Schema the upload was parsed with; null means the default schema.
+    schema = models.ForeignKey(Schema, null=True, blank=True, on_delete=models.PROTECT, related_name='datasets')
+    # Row-level validation report (api/validation.py); empty for uploads that predate it until first requested.
+    validation = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-uploaded_at', '-id'], name='dataset_recent_idx'),
+                   models.Index(fields=['owner', '-uploaded_at', '-id'], name='dataset_owner_recent_idx'),
+                   models.Index(fields=['owner', 'content_hash'], name='dataset_owner_hash_idx')]
 
     def __str__(self):
         return f"{self.name} ({self.uploaded_at})"
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    kind = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='queued', db_index=True)
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.FloatField(default=0.0)
+    message = models.CharField(max_length=200, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    dataset = models.ForeignKey(UploadedDataset, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'created_at'], name='job_kind_idx')]
+
+    def as_dict(self):
+        return {'id': self.id, 'kind': self.kind, 'status': self.status, 'progress': self.progress,
+                'message': self.message, 'result': self.result, 'error': self.error or None,
+                'dataset_id': self.dataset_id, 'created_at': self.created_at.isoformat(),
+                'updated_at': self.updated_at.isoformat()}
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+
+class UploadSession(models.Model):
+    '''A resumable chunked upload; bytes are appended to storage_name until the client commits.'''
+    STATUS_CHOICES = [('open', 'Open'), ('committing', 'Committing'), ('committed', 'Committed'), ('failed', 'Failed')]
+
+    upload_id = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=200)
+    storage_name = models.CharField(max_length=300)
+    size = models.BigIntegerField()
+    # Bytes acknowledged so far; the next chunk must start at this offset.
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    schema = models.ForeignKey(Schema, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='open', db_index=True)
+    error = models.TextField(blank=True, default='')
+    dataset = models.ForeignKey(UploadedDataset, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def as_dict(self):
+        return {'upload_id': self.upload_id, 'name': self.name, 'size': self.size, 'received': self.received,
+                'status': self.status, 'error': self.error or None, 'dataset_id': self.dataset_id,
+                'schema_id': self.schema_id}
+
+    def __str__(self):
+        return f"upload {self.upload_id} ({self.received}/{self.size})"
+
+
+class TrendPoint(models.Model):
+    '''Statistics of one metric in one dataset, over all rows (type '') or one Type: the rollup behind /api/trends/.
+
+    Written once when a dataset is registered. Rows outlive their dataset (no FK constraint), so trends keep
+    covering uploads that retention has since removed.'''
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    dataset = models.ForeignKey(UploadedDataset, db_constraint=False, on_delete=models.DO_NOTHING, related_name='+')
+    name = models.CharField(max_length=200)
+    uploaded_at = models.DateTimeField()
+    type = models.CharField(max_length=200, blank=True, default='')
+    metric = models.CharField(max_length=64)
+    count = models.BigIntegerField(default=0)
+    mean = models.FloatField(null=True)
+    std = models.FloatField(null=True)
+    min = models.FloatField(null=True)
+    max = models.FloatField(null=True)
+    p50 = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['owner', 'metric', 'type', '-uploaded_at'], name='trend_series_idx')]
+
+    def __str__(self):
+        return f"{self.metric}/{self.type or '*'} of dataset {self.dataset_id}"
+
+
+class Anomaly(models.Model):
+    '''One flagged value of a dataset: row position, metric and the per-Type scores that flagged it.
+
+    methods is a bitmask of the tests that fired (1 z-score, 2 IQR, 4 modified z-score, see api/anomalies.py);
+    score is |modified z| and orders the table.'''
+    METHOD_NAMES = [(1, 'zscore'), (2, 'iqr'), (4, 'mad')]
+
+    dataset = models.ForeignKey(UploadedDataset, on_delete=models.CASCADE, related_name='anomalies')
+    row = models.BigIntegerField()
+    equipment = models.CharField(max_length=200, blank=True, default='')
+    type = models.CharField(max_length=200, blank=True, default='')
+    metric = models.CharField(max_length=64)
+    value = models.FloatField()
+    zscore = models.FloatField()
+    robust_z = models.FloatField()
+    methods = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['dataset', '-score'], name='anomaly_score_idx'),
+                   models.Index(fields=['dataset', 'metric', '-score'], name='anomaly_metric_idx')]
+
+    def as_dict(self):
+        return {'row': self.row, 'equipment': self.equipment, 'type': self.type or None, 'metric': self.metric,
+                'value': self.value, 'zscore': round(self.zscore, 3), 'robust_z': round(self.robust_z, 3),
+                'methods': [name for bit, name in self.METHOD_NAMES if self.methods & bit]}
+
+    def __str__(self):
+        return f"{self.metric} of row {self.row} in dataset {self.dataset_id}"
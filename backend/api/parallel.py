@@ -0,0 +1,58 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pool for CPU-bound CSV parsing. This module must stay importable without a configured
+# Django so that spawned/forkserver workers can unpickle its functions before django.setup() runs.
+# Workers are started with BATCH_START_METHOD, forkserver by default (spawn where it is unavailable):
+# the pool is created from threaded server processes holding open database connections, and a
+# forked worker would inherit those sockets and whatever locks other threads held at the time.
+
+_pool = None
+_pool_key = None
+_lock = threading.Lock()
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def ingest_file(path, chunk_rows, schema=None):
+    '''Worker entry point: (partial summary dict, None, validation report) on success or (None, error message, None).
+
+    schema is a CompiledSchema (it pickles), so workers never look schemas up in the database.'''
+    from .ingest import IngestError, ingest_path
+    try:
+        acc = ingest_path(path, chunk_rows, schema=schema)
+        return acc.to_dict(), None, acc.validation
+    except IngestError as e:
+        return None, str(e), None
+
+
+def start_method():
+    from django.conf import settings
+    method = getattr(settings, 'BATCH_START_METHOD', '')
+    if method:
+        return method
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def get_pool(workers):
+    global _pool, _pool_key
+    key = (workers, start_method())
+    with _lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        mp_context=multiprocessing.get_context(key[1]))
+            _pool_key = key
+        return _pool
+
+
+def map_ingest(paths, chunk_rows, workers, schema=None):
+    '''ingest_file over paths, in order; runs inline when workers <= 1 or there is a single file.'''
+    if workers <= 1 or len(paths) <= 1:
+        return [ingest_file(p, chunk_rows, schema) for p in paths]
+    return list(get_pool(workers).map(ingest_file, paths, [chunk_rows] * len(paths), [schema] * len(paths)))
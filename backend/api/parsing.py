@@ -0,0 +1,184 @@
+import csv
+import io
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .schemas import DEFAULT, get_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional; the C engine is always available
+    pa = None
+
+# Typed CSV parsing against an upload schema (api/schemas.py): only the schema's columns are read, Type
+# is parsed straight into a category, string columns stay strings and the float columns end up as
+# CSV_FLOAT_DTYPE. Two engines produce identical chunks:
+#   c        pandas' C parser. Numerics are left to its per-chunk inference (float unless a chunk has
+#            junk in it) and only object columns are coerced, so clean files skip pd.to_numeric.
+#   pyarrow  pyarrow's streaming multithreaded reader. Numerics are read as strings and cast in Arrow;
+#            a batch whose cast fails (junk values) falls back to pd.to_numeric for that column only.
+# CSV_ENGINE 'auto' picks pyarrow when it is installed. Either way junk and infinite cells become NaN; an on_invalid
+# callback is told about them (column, row mask, raw values) before their chunk is yielded, and the
+# check only runs on the coercion fallback, so clean files pay nothing for it.
+
+# Columns of the built-in default schema.
+REQUIRED_COLUMNS = DEFAULT.required
+ENGINES = ('c', 'pyarrow')
+
+
+class MissingColumnsError(ValueError):
+    pass
+
+
+def available_engines():
+    return [e for e in ENGINES if e != 'pyarrow' or pa is not None]
+
+
+def resolve_engine(engine=None):
+    engine = engine or getattr(settings, 'CSV_ENGINE', 'auto')
+    if engine == 'auto':
+        return 'pyarrow' if pa is not None else 'c'
+    if engine not in available_engines():
+        raise ValueError(f'CSV engine {engine!r} is not available (have {available_engines()})')
+    return engine
+
+
+def _float_dtype(float_dtype=None):
+    return np.dtype(float_dtype or getattr(settings, 'CSV_FLOAT_DTYPE', 'float64'))
+
+
+def _check_columns(names, schema):
+    missing = schema.missing(names)
+    if missing:
+        raise MissingColumnsError(f'Missing required columns: {missing}')
+
+
+def _to_numeric(raw, column, on_invalid):
+    values = pd.to_numeric(raw, errors='coerce')
+    if on_invalid is not None:
+        bad = values.isna().to_numpy() & raw.notna().to_numpy()
+        if bad.any():
+            on_invalid(column, bad, raw)
+    return values
+
+
+def _drop_infinite(values, column, on_invalid):
+    '''values with +-inf (cells like "inf" or "1e999") blanked; they are reported like other invalid numbers.'''
+    bad = np.isinf(values)
+    if not bad.any():
+        return values
+    if on_invalid is not None:
+        on_invalid(column, bad, pd.Series(values).astype(str))
+    return np.where(bad, np.nan, values).astype(values.dtype)
+
+
+def _coerce(df, float_dtype, schema, on_invalid=None):
+    for col in schema.numeric:
+        if col not in df.columns:
+            continue
+        if df[col].dtype != float_dtype:
+            if df[col].dtype.kind not in 'fiu':
+                df[col] = _to_numeric(df[col], col, on_invalid)
+            df[col] = df[col].astype(float_dtype)
+        df[col] = _drop_infinite(df[col].to_numpy(), col, on_invalid)
+    return df
+
+
+def _string_types(schema):
+    return {c['name']: c['kind'] for c in schema.columns if c.get('kind') in ('string', 'category')}
+
+
+def _c_chunks(src, chunk_rows, float_dtype, schema, on_invalid):
+    wanted = set(schema.names)
+    kinds = _string_types(schema)
+    reader = pd.read_csv(src, chunksize=chunk_rows, engine='c', usecols=lambda c: c in wanted,
+                         dtype={c: 'category' if kind == 'category' else str for c, kind in kinds.items()})
+    first = True
+    for df in reader:
+        if first:
+            _check_columns(df.columns, schema)
+            first = False
+        yield _coerce(df, float_dtype, schema, on_invalid)
+
+
+class _Replay(io.RawIOBase):
+    '''Read-only stream that returns head before the rest of src.'''
+
+    def __init__(self, head, src):
+        self.head, self.src = head, src
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        data = self.head[:len(buf)] if self.head else self.src.read(len(buf))
+        if self.head:
+            self.head = self.head[len(data):]
+        buf[:len(data)] = data
+        return len(data)
+
+
+def _mangle(names):
+    '''Header names with repeats renamed the way pandas does ('a', 'a.1', 'a.2'), so the first one wins.'''
+    seen, out = {}, []
+    for name in names:
+        n = seen.get(name, 0)
+        seen[name] = n + 1
+        while n and f'{name}.{n}' in seen:
+            n += 1
+        out.append(f'{name}.{n}' if n else name)
+        if n:
+            seen[out[-1]] = 1
+    return out
+
+
+def _arrow_chunks(src, chunk_rows, float_dtype, schema, on_invalid):
+    # The header is read here so missing columns are reported before pyarrow sees the file.
+    head = b''
+    while not head.endswith(b'\n'):
+        block = src.read(1)
+        if not block:
+            break
+        head += block
+    names = _mangle(next(csv.reader([head.decode('utf-8-sig')]), []))
+    _check_columns(names, schema)
+    types = {c: pa.dictionary(pa.int32(), pa.string()) if kind == 'category' else pa.string()
+             for c, kind in _string_types(schema).items()}
+    types.update({c: pa.string() for c in schema.numeric})
+    wanted = set(schema.names)
+    reader = pa_csv.open_csv(
+        io.BufferedReader(_Replay(head, src), buffer_size=1 << 20),
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=max(1 << 20, chunk_rows * 64),
+                                        column_names=names, skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(include_columns=[c for c in names if c in wanted],
+                                              column_types=types, strings_can_be_null=True))
+    arrow_float = pa.from_numpy_dtype(float_dtype)
+    numeric = set(schema.numeric)
+    for batch in reader:
+        columns = {}
+        for name, arr in zip(batch.schema.names, batch.columns):
+            if name in numeric:
+                try:
+                    columns[name] = pc.cast(arr, arrow_float).to_numpy(zero_copy_only=False)
+                except pa.ArrowInvalid:
+                    columns[name] = _to_numeric(arr.to_pandas(), name, on_invalid).to_numpy(dtype=float_dtype)
+                columns[name] = _drop_infinite(columns[name], name, on_invalid)
+            else:
+                columns[name] = arr.to_pandas()
+        yield pd.DataFrame(columns, columns=batch.schema.names)
+
+
+def read_chunks(src, chunk_rows=None, engine=None, float_dtype=None, schema=None, on_invalid=None):
+    '''Yield typed DataFrame chunks of the schema's columns (in file order) from a binary CSV stream.
+
+    schema is anything get_schema() accepts (default: the built-in schema). on_invalid(column, mask, raw)
+    is called for each numeric column of the next chunk with cells that are present but not numbers.
+    Raises MissingColumnsError when a required column is absent; parser errors propagate unchanged.'''
+    chunk_rows = chunk_rows or getattr(settings, 'INGEST_CHUNK_ROWS', 50000)
+    float_dtype = _float_dtype(float_dtype)
+    schema = get_schema(schema)
+    if resolve_engine(engine) == 'pyarrow':
+        return _arrow_chunks(src, chunk_rows, float_dtype, schema, on_invalid)
+    return _c_chunks(src, chunk_rows, float_dtype, schema, on_invalid)
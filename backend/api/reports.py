@@ -0,0 +1,392 @@
+import hashlib
+import io
+import json
+import os
+import re
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+import numpy as np
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from .columnar import ColumnarDataset, sidecar_dir
+from .models import Anomaly
+from .schemas import dataset_schema
+from . import metrics
+
+# Bump whenever render_report output changes so cached reports are re-rendered.
+REPORT_TEMPLATE_VERSION = 6
+
+
+HIST_BINS = 24
+MAX_TYPES = 12
+MAX_OUTLIERS = 10
+MAX_ANOMALIES = 40
+OUTLIER_Z = 3.0
+COUNT_WORDS = ('no', 'one', 'two', 'three')
+PALETTE = ['#4e79a7', '#f28e2b', '#e15759', '#76b7b2', '#59a14f', '#edc949']
+
+
+def report_aggregates(ds, summary):
+    '''Binned aggregates for the report charts, computed with vectorized passes over the sidecar.
+
+    Everything drawn later is bounded by HIST_BINS, MAX_TYPES and MAX_OUTLIERS, so rendering cost does
+    not depend on the number of rows.'''
+    stats = summary.get('stats', {})
+    numeric = [c for c in ds.columns if ds.kind(c) == 'float']
+    out = {'histograms': {}, 'type_means': {}, 'outliers': []}
+    for col in numeric:
+        st = stats.get(col) or {}
+        if st.get('count'):
+            lo, hi = st['min'], st['max']
+            if lo == hi:
+                lo, hi = lo - 0.5, hi + 0.5
+            counts, edges = np.histogram(ds.values(col), bins=HIST_BINS, range=(lo, hi))
+            out['histograms'][col] = (counts, edges)
+    if 'Type' in ds.specs and ds.kind('Type') == 'category':
+        codes, cats = ds.codes('Type')
+        codes = np.asarray(codes)
+        valid = codes >= 0
+        counts = np.bincount(codes[valid], minlength=len(cats))
+        top = np.argsort(-counts, kind='stable')[:MAX_TYPES]
+        top = top[counts[top] > 0]
+        out['types'] = [cats[i] for i in top]
+        for col in numeric:
+            values = ds.values(col)
+            ok = valid & ~np.isnan(values)
+            sums = np.bincount(codes[ok], weights=values[ok], minlength=len(cats))
+            n = np.bincount(codes[ok], minlength=len(cats))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out['type_means'][col] = (sums / n)[top]
+    for col in numeric:
+        st = stats.get(col) or {}
+        if not st.get('std'):
+            continue
+        with np.errstate(invalid='ignore'):
+            z = np.abs((ds.values(col) - st['mean']) / st['std'])
+        z = np.where(np.isnan(z), 0.0, z)
+        k = min(MAX_OUTLIERS, len(z))
+        idx = np.argpartition(z, -k)[-k:] if k else np.array([], dtype=np.int64)
+        idx = idx[z[idx] > OUTLIER_Z]
+        for i in idx[np.argsort(z[idx])[::-1]].tolist():
+            out['outliers'].append((col, i, float(ds.values(col)[i]), float(z[i])))
+    out['outliers'].sort(key=lambda o: -o[3])
+    out['outliers'] = out['outliers'][:MAX_OUTLIERS]
+    if out['outliers'] and 'Equipment Name' in ds.specs:
+        names = ds.column('Equipment Name', np.array([o[1] for o in out['outliers']]))
+        out['outliers'] = [(str(n),) + o for n, o in zip(names, out['outliers'])]
+    else:
+        out['outliers'] = [(f'row {o[1] + 1}',) + o for o in out['outliers']]
+    return out
+
+
+def _fmt(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return '-'
+    return f'{v:,.3f}' if isinstance(v, float) else f'{v:,}'
+
+
+def _bar_chart(p, x, y, w, h, values, title, labels=None, color=PALETTE[0]):
+    '''Draw one bar per value; callers pass already-binned data so the bar count stays small.'''
+    values = [0.0 if v is None or np.isnan(v) else float(v) for v in values]
+    p.setFont('Helvetica-Bold', 10)
+    p.setFillColor(colors.black)
+    p.drawString(x, y + h + 6, title)
+    if not values:
+        return
+    vmin, vmax = min(0.0, min(values)), max(0.0, max(values))
+    span = (vmax - vmin) or 1.0
+    base = y + h * (0 - vmin) / span
+    bw = w / len(values)
+    p.setFillColor(colors.HexColor(color))
+    for i, v in enumerate(values):
+        top = y + h * (v - vmin) / span
+        p.rect(x + i * bw + 0.5, min(base, top), max(bw - 1, 0.5), abs(top - base), stroke=0, fill=1)
+    p.setStrokeColor(colors.grey)
+    p.line(x, base, x + w, base)
+    p.setFillColor(colors.black)
+    p.setFont('Helvetica', 7)
+    p.drawRightString(x - 2, y + h - 6, _fmt(int(vmax)) if all(float(v).is_integer() for v in values) else _fmt(vmax))
+    if labels:
+        if len(labels) == 2:
+            p.drawString(x, y - 10, labels[0])
+            p.drawRightString(x + w, y - 10, labels[1])
+        else:
+            for i, label in enumerate(labels):
+                p.drawCentredString(x + (i + 0.5) * bw, y - 10, str(label)[:10])
+
+
+def render_report(inst, ds=None, anomalies=None):
+    '''Render the PDF report for a dataset and return its bytes.
+
+    anomalies, when given, are the dataset's stored Anomaly rows to list (highest score first). Columns
+    are labelled with the units of the dataset's schema.'''
+    summary = inst.summary_json or {}
+    label = dataset_schema(inst).label
+    if ds is None:
+        try:
+            ds = ColumnarDataset(sidecar_dir(inst.csv_file.path))
+        except (FileNotFoundError, ValueError):
+            ds = None
+    agg = report_aggregates(ds, summary) if ds is not None else None
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    p.setFont('Helvetica-Bold', 14)
+    p.drawString(30,750, f"Report for: {inst.name}")
+    p.setFont('Helvetica', 11)
+    p.drawString(30,735, f"Uploaded at: {inst.uploaded_at}")
+    y = 710
+    p.drawString(30,y, 'Summary:')
+    y -= 16
+    totals = summary.get('total')
+    if totals is not None:
+        p.drawString(40,y, f"Total rows: {totals}")
+        y -= 14
+
+    stats = summary.get('stats', {})
+    avgs = summary.get('averages', {})
+    if stats:
+        headers = ['mean', 'std', 'min', 'p50', 'max']
+        p.setFont('Helvetica-Bold', 10)
+        p.drawString(48, y, 'Column')
+        for i, h in enumerate(headers):
+            p.drawRightString(260 + i * 72, y, h)
+        p.setFont('Helvetica', 10)
+        y -= 14
+        for col, st in stats.items():
+            p.drawString(48, y, label(col))
+            for i, h in enumerate(headers):
+                p.drawRightString(260 + i * 72, y, _fmt(st.get(h)))
+            y -= 14
+    elif avgs:
+        p.drawString(40,y, 'Averages:')
+        y -= 14
+        for k,v in avgs.items():
+            p.drawString(48,y, label(k))
+            p.drawRightString(550, y, f"{v}")
+            y -= 14
+
+    out_of_range = {k: v for k, v in (summary.get('out_of_range') or {}).items() if v}
+    if out_of_range:
+        y -= 6
+        p.drawString(40, y, 'Out-of-range values (excluded): ' + ', '.join(f'{k} {v:,}' for k, v in out_of_range.items()))
+        y -= 14
+
+    td = summary.get('type_distribution', {})
+    if td:
+        y -= 6
+        p.setFont('Helvetica', 11)
+        p.drawString(40,y, 'Type distribution:')
+        y -= 14
+        ranked = sorted(td.items(), key=lambda kv: -kv[1])
+        shown = ranked[:MAX_TYPES]
+        for k,v in shown:
+            p.drawString(48,y, f"{k}")
+            p.drawRightString(550, y, f"{v}")
+            y -= 14
+        if len(ranked) > len(shown):
+            p.drawString(48, y, f"... {len(ranked) - len(shown)} more types")
+            p.drawRightString(550, y, f"{sum(v for _, v in ranked[len(shown):])}")
+            y -= 14
+        if y > 260:
+            _bar_chart(p, 60, y - 150, 480, 120, [v for _, v in shown], 'Rows per type', [k for k, _ in shown])
+    p.showPage()
+
+    if agg and agg['histograms']:
+        p.setFont('Helvetica-Bold', 14)
+        p.drawString(30, 750, 'Distributions')
+        y = 590
+        for i, (col, (counts, edges)) in enumerate(agg['histograms'].items()):
+            if y < 60:
+                p.showPage()
+                y = 590
+            _bar_chart(p, 60, y, 480, 120, counts.tolist(), f'{label(col)} histogram ({len(counts)} bins)',
+                       [_fmt(float(edges[0])), _fmt(float(edges[-1]))], PALETTE[i % len(PALETTE)])
+            y -= 180
+        p.showPage()
+
+    if agg and agg['type_means']:
+        p.setFont('Helvetica-Bold', 14)
+        p.drawString(30, 750, 'Per-type averages')
+        y = 590
+        for i, (col, means) in enumerate(agg['type_means'].items()):
+            if y < 60:
+                p.showPage()
+                y = 590
+            _bar_chart(p, 60, y, 480, 110, means.tolist(), f'Mean {label(col)} by type', agg['types'], PALETTE[i % len(PALETTE)])
+            y -= 165
+        p.showPage()
+    if agg:
+        p.setFont('Helvetica-Bold', 14)
+        p.drawString(30, 750, f'Outliers (|z| > {OUTLIER_Z:g})')
+        y = 725
+        if not agg['outliers']:
+            p.setFont('Helvetica', 11)
+            p.drawString(40, y, 'No values outside the threshold.')
+        else:
+            p.setFont('Helvetica-Bold', 10)
+            for x, h in ((40, 'Equipment'), (260, 'Column')):
+                p.drawString(x, y, h)
+            p.drawRightString(460, y, 'Value')
+            p.drawRightString(550, y, 'z-score')
+            p.setFont('Helvetica', 10)
+            for name, col, _, value, z in agg['outliers']:
+                y -= 14
+                p.drawString(40, y, name[:40])
+                p.drawString(260, y, col)
+                p.drawRightString(460, y, _fmt(value))
+                p.drawRightString(550, y, f'{z:.2f}')
+        p.showPage()
+    if anomalies is not None:
+        p.setFont('Helvetica-Bold', 14)
+        p.drawString(30, 750, 'Anomalies by type')
+        y = 725
+        if not anomalies:
+            p.setFont('Helvetica', 11)
+            needed = getattr(settings, 'ANOMALY_MIN_METHODS', 2)
+            needed = COUNT_WORDS[needed] if 0 <= needed < len(COUNT_WORDS) else str(needed)
+            p.drawString(40, y, f'No values flagged by at least {needed} of z-score, IQR and MAD.')
+        else:
+            p.setFont('Helvetica-Bold', 10)
+            for x, h in ((40, 'Equipment'), (200, 'Type'), (300, 'Column')):
+                p.drawString(x, y, h)
+            p.drawRightString(430, y, 'Value')
+            p.drawRightString(490, y, 'robust z')
+            p.drawString(500, y, 'Tests')
+            p.setFont('Helvetica', 9)
+            for a in anomalies[:MAX_ANOMALIES]:
+                y -= 14
+                p.drawString(40, y, a.equipment[:28])
+                p.drawString(200, y, a.type[:18])
+                p.drawString(300, y, a.metric)
+                p.drawRightString(430, y, _fmt(a.value))
+                p.drawRightString(490, y, f'{a.robust_z:.2f}')
+                p.drawString(500, y, ','.join(a.as_dict()['methods']))
+        p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+_REPORT = re.compile(r'^report_(\d+)-')
+
+
+def report_datasets(key):
+    '''Ids (as strings) of the datasets a report cache key or file name belongs to.'''
+    m = _REPORT.match(key)
+    return m.groups() if m else ()
+
+
+class DiskReportCache:
+    '''Rendered reports (or other derived files, by directory and suffix) under MEDIA_ROOT, written atomically.
+
+    datasets maps a key to the ids of the datasets it was derived from, so forget() can find them.'''
+
+    def __init__(self, directory='reports', suffix='.pdf', datasets=report_datasets):
+        self.directory, self.suffix, self.datasets = directory, suffix, datasets
+
+    def _path(self, key):
+        return default_storage.path(os.path.join(self.directory, f'{key}{self.suffix}'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def set(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def forget(self, ids):
+        '''Remove every entry derived from any of the given datasets, in one directory scan.'''
+        ids = {str(i) for i in ids}
+        directory = default_storage.path(self.directory)
+        if ids and os.path.isdir(directory):
+            for fname in os.listdir(directory):
+                if ids.intersection(self.datasets(fname)):
+                    try:
+                        os.remove(os.path.join(directory, fname))
+                    except OSError:
+                        pass
+
+
+class DjangoReportCache:
+    '''Rendered reports in one of the Django CACHES backends.
+
+    Cache backends cannot list their keys, so every stored key carries a generation token of each dataset it
+    was derived from; forget() replaces those tokens, which orphans the entries for the backend to evict.'''
+
+    def __init__(self, alias, namespace='report', datasets=report_datasets):
+        self.cache, self.namespace, self.datasets = caches[alias], namespace, datasets
+
+    def _generation_key(self, dataset_id):
+        return f'{self.namespace}:generation:{dataset_id}'
+
+    def _key(self, key):
+        names = [self._generation_key(i) for i in self.datasets(key)]
+        generations = self.cache.get_many(names) if names else {}
+        return ':'.join([f'{self.namespace}:{key}'] + [generations.get(n, '0') for n in names])
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, data):
+        self.cache.set(self._key(key), data, timeout=None)
+
+    def forget(self, ids):
+        self.cache.set_many({self._generation_key(i): uuid.uuid4().hex for i in ids}, timeout=None)
+
+
+def get_report_cache(directory='reports', suffix='.pdf', datasets=report_datasets):
+    '''The REPORT_CACHE backend; directory and suffix keep other derived files (comparisons) apart from reports,
+    and datasets maps their keys to the dataset ids they depend on.'''
+    backend = getattr(settings, 'REPORT_CACHE', 'disk')
+    if backend == 'disk':
+        return DiskReportCache(directory, suffix, datasets)
+    return DjangoReportCache(backend, directory, datasets)
+
+
+def report_key(inst):
+    '''Cache key and ETag for a dataset's report: dataset id, summary hash and template version.'''
+    schema = dataset_schema(inst)
+    summary = json.dumps([inst.name, str(inst.uploaded_at), inst.summary_json, inst.anomalies_scored, schema.name,
+                          schema.version, getattr(settings, 'ANOMALY_MIN_METHODS', 2)], sort_keys=True, default=str)
+    digest = hashlib.sha256(summary.encode('utf-8')).hexdigest()[:16]
+    return f'report_{inst.id}-{digest}-v{REPORT_TEMPLATE_VERSION}'
+
+
+def cached_report(inst):
+    '''(pdf bytes, cache hit) for a dataset, rendering and caching it on a miss.'''
+    cache = get_report_cache()
+    key = report_key(inst)
+    with metrics.span('cache'):
+        data = cache.get(key)
+    metrics.incr('cache_requests_total', cache='report', result='miss' if data is None else 'hit')
+    if data is not None:
+        return data, True
+    anomalies = list(Anomaly.objects.filter(dataset_id=inst.id).order_by('-score', 'id')[:MAX_ANOMALIES])
+    with metrics.span('render'):
+        data = render_report(inst, anomalies=anomalies if inst.anomalies_scored else None)
+    with metrics.span('cache'):
+        cache.set(key, data)
+    return data, False
+
+
+def store_report(inst):
+    '''Pre-render a report into the cache so generate_pdf can serve it without rendering.'''
+    return cached_report(inst)[1]
+
+
+def remove_reports(instances):
+    '''Drop the cached reports of several datasets with a single scan of the cache.'''
+    ids = [inst.id for inst in instances]
+    if ids:
+        get_report_cache().forget(ids)
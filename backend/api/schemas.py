@@ -0,0 +1,140 @@
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from .models import Schema
+
+# Upload schemas. A schema lists the columns an upload must (or may) have, each with a kind, unit and
+# valid range; it is compiled once into a CompiledSchema whose checks are whole-chunk numpy operations
+# (a values matrix compared against lo/hi vectors), so adding columns adds no per-row Python work.
+# The built-in 'equipment' schema is used when an upload names none and never touches the database;
+# named schemas live in the Schema table and are cached in memory per process, dropped on save/delete
+# and after SCHEMA_CACHE_SECONDS so edits made by other processes are picked up.
+
+DEFAULT_SCHEMA = 'equipment'
+DEFAULT_COLUMNS = [
+    {'name': 'Equipment Name', 'kind': 'string', 'required': True},
+    {'name': 'Type', 'kind': 'category', 'required': True},
+    {'name': 'Flowrate', 'kind': 'float', 'unit': 'm³/h', 'required': True},
+    {'name': 'Pressure', 'kind': 'float', 'unit': 'bar', 'required': True},
+    {'name': 'Temperature', 'kind': 'float', 'unit': '°C', 'required': True},
+]
+
+
+class UnknownSchema(LookupError):
+    pass
+
+
+class CompiledSchema:
+    '''Column lists, units and range vectors of one schema, ready for vectorized checks.
+
+    Plain data only, so it pickles into ingest worker processes.'''
+
+    def __init__(self, name, columns, id=None, version=''):
+        self.name, self.id, self.version = name, id, version
+        self.columns = [dict(c) for c in columns]
+        self.names = [c['name'] for c in self.columns]
+        self.required = [c['name'] for c in self.columns if c.get('required', True)]
+        self.numeric = [c['name'] for c in self.columns if c.get('kind', 'float') == 'float']
+        self.units = {c['name']: c['unit'] for c in self.columns if c.get('unit')}
+        # Category columns may list their allowed values; other values are reported as unknown.
+        self.allowed = {c['name']: list(c['values']) for c in self.columns
+                        if c.get('kind') == 'category' and c.get('values')}
+        bounds = {c['name']: c for c in self.columns}
+        self.lo = np.array([_bound(bounds[n].get('min'), -np.inf) for n in self.numeric])
+        self.hi = np.array([_bound(bounds[n].get('max'), np.inf) for n in self.numeric])
+        self.has_ranges = bool(np.isfinite(self.lo).any() or np.isfinite(self.hi).any())
+
+    def missing(self, names):
+        names = set(names)
+        return [c for c in self.required if c not in names]
+
+    def label(self, col):
+        unit = self.units.get(col)
+        return f'{col} ({unit})' if unit else col
+
+    def range_mask(self, df):
+        '''(columns, rows x columns mask of their out-of-range cells) for the numeric columns present in df.'''
+        present = [j for j, col in enumerate(self.numeric) if col in df.columns]
+        cols = [self.numeric[j] for j in present]
+        if not self.has_ranges or not len(df):
+            return cols, np.zeros((len(df), len(cols)), dtype=bool)
+        values = df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            return cols, (values < self.lo[present]) | (values > self.hi[present])
+
+    def clean(self, df, mask=None):
+        '''Blank out-of-range numeric cells of df in place; returns {column: cells blanked} for columns with any.
+
+        mask, if given, is range_mask(df) already computed for this chunk.'''
+        if not self.has_ranges or not len(df):
+            return {}
+        cols, bad = mask or self.range_mask(df)
+        counts = bad.sum(axis=0)
+        if not counts.any():
+            return {}
+        for k in np.flatnonzero(counts):
+            col = cols[k]
+            df[col] = df[col].mask(bad[:, k])
+        return {cols[k]: int(counts[k]) for k in np.flatnonzero(counts)}
+
+    def as_dict(self):
+        return {'name': self.name, 'columns': self.columns}
+
+
+def _bound(value, default):
+    return default if value is None else float(value)
+
+
+DEFAULT = CompiledSchema(DEFAULT_SCHEMA, DEFAULT_COLUMNS)
+_cache = {}   # name or id -> (CompiledSchema, loaded at)
+_lock = threading.Lock()
+
+
+def compile_schema(schema):
+    return CompiledSchema(schema.name, schema.columns, schema.id, schema.updated_at.isoformat() if schema.updated_at else '')
+
+
+def get_schema(ref=None):
+    '''The CompiledSchema for a Schema row, its name or id, or the built-in default for None/'' /'equipment'.
+
+    Raises UnknownSchema for names and ids that do not exist.'''
+    if isinstance(ref, CompiledSchema):
+        return ref
+    if isinstance(ref, Schema):
+        ref = ref.id
+    if ref in (None, '', DEFAULT_SCHEMA):
+        return DEFAULT
+    ttl = getattr(settings, 'SCHEMA_CACHE_SECONDS', 60)
+    with _lock:
+        hit = _cache.get(ref)
+    if hit is not None and time.monotonic() - hit[1] < ttl:
+        return hit[0]
+    lookup = {'id': ref} if isinstance(ref, int) else {'name': ref}
+    row = Schema.objects.filter(**lookup).first()
+    if row is None:
+        raise UnknownSchema(f'Unknown schema: {ref}')
+    compiled = compile_schema(row)
+    now = time.monotonic()
+    with _lock:
+        _cache[row.id] = _cache[row.name] = (compiled, now)
+    return compiled
+
+
+def dataset_schema(inst):
+    '''Schema a dataset was ingested with (the default for uploads that predate schemas).'''
+    return get_schema(getattr(inst, 'schema_id', None))
+
+
+def list_schemas():
+    return [DEFAULT] + [compile_schema(s) for s in Schema.objects.exclude(name=DEFAULT_SCHEMA).order_by('name')]
+
+
+def clear_cache(**kwargs):
+    with _lock:
+        _cache.clear()
+
+
+post_save.connect(clear_cache, sender=Schema, dispatch_uid='schemas.clear_cache.save')
+post_delete.connect(clear_cache, sender=Schema, dispatch_uid='schemas.clear_cache.delete')
@@ -1,10 +1,14 @@
 from rest_framework import serializers
 from .models import UploadedDataset
+from .schemas import dataset_schema
 class UploadedDatasetSerializer(serializers.ModelSerializer):
     csv_url = serializers.SerializerMethodField()
+    schema = serializers.SerializerMethodField()
     class Meta:
         model = UploadedDataset
-        fields = ['id','name','uploaded_at','summary_json','csv_url']
+        fields = ['id','name','uploaded_at','summary_json','csv_url','content_hash','schema']
+    def get_schema(self, obj):
+        return dataset_schema(obj).name
     def get_csv_url(self, obj):
         request = self.context.get('request') if hasattr(self, 'context') else None
         try:
@@ -0,0 +1,476 @@
+import math
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ['Flowrate','Pressure','Temperature']
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class QuantileSketch:
+    '''Log-bucketed quantile sketch with relative error alpha; merging is adding bucket counts.'''
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.pos = {}
+        self.neg = {}
+        self.zero = 0
+
+    @property
+    def count(self):
+        return self.zero + sum(self.pos.values()) + sum(self.neg.values())
+
+    def bucket(self, values):
+        '''Vectorized (sign, key) per value: sign is 1/-1, or 0 for values counted as zero.'''
+        magnitude = np.abs(values)
+        sign = np.where(magnitude > self.MIN_VALUE, np.sign(values), 0).astype(np.int8)
+        with np.errstate(divide='ignore'):
+            keys = np.where(sign != 0, np.ceil(np.log(magnitude) / self.log_gamma), 0).astype(np.int64)
+        return sign, keys
+
+    def add(self, sign, key, count):
+        if sign == 0:
+            self.zero += count
+        else:
+            store = self.pos if sign > 0 else self.neg
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            sign, keys = self.bucket(values)
+            uniq, counts = np.unique(_pack_buckets(np.zeros(len(keys), dtype=np.int64), sign, keys), return_counts=True)
+            _, usign, ukey = _unpack_buckets(uniq)
+            for sg, k, c in zip(usign.tolist(), ukey.tolist(), counts.tolist()):
+                self.add(sg, k, c)
+        return self
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError('Cannot merge sketches with different alpha')
+        for store, theirs in ((self.pos, other.pos), (self.neg, other.neg)):
+            for k, c in theirs.items():
+                store[k] = store.get(k, 0) + c
+        self.zero += other.zero
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        n = self.count
+        if n == 0:
+            return None
+        rank = q * (n - 1)
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return self._value(k)
+        return self._value(max(self.pos)) if self.pos else 0.0
+
+    def to_dict(self):
+        return {'alpha': self.alpha, 'zero': self.zero,
+                'pos': {str(k): c for k, c in self.pos.items()},
+                'neg': {str(k): c for k, c in self.neg.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d.get('alpha', 0.01))
+        s.zero = d.get('zero', 0)
+        s.pos = {int(k): c for k, c in d.get('pos', {}).items()}
+        s.neg = {int(k): c for k, c in d.get('neg', {}).items()}
+        return s
+
+
+class NumericAccumulator:
+    '''Count, sum, min/max, Welford mean/M2 and a quantile sketch for one column.'''
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sketch = QuantileSketch()
+
+    def _combine(self, n, total, mn, mx, mean, m2):
+        if n == 0:
+            return
+        if self.count == 0:
+            self.count, self.sum, self.min, self.max, self.mean, self.m2 = n, total, mn, mx, mean, m2
+            return
+        count = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / count
+        self.m2 += m2 + delta * delta * self.count * n / count
+        self.count = count
+        self.sum += total
+        self.min = min(self.min, mn)
+        self.max = max(self.max, mx)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            mean = float(values.mean())
+            self._combine(len(values), float(values.sum()), float(values.min()), float(values.max()),
+                          mean, float(((values - mean) ** 2).sum()))
+            self.sketch.update(values)
+        return self
+
+    def merge(self, other):
+        self._combine(other.count, other.sum, other.min, other.max, other.mean, other.m2)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+    def quantile(self, q):
+        v = self.sketch.quantile(q)
+        return None if v is None else min(max(v, self.min), self.max)
+
+    def stats(self):
+        if self.count == 0:
+            return {'count': 0, 'sum': 0.0, 'mean': None, 'min': None, 'max': None, 'std': None}
+        out = {'count': self.count, 'sum': self.sum, 'mean': self.mean, 'min': self.min, 'max': self.max, 'std': self.std}
+        for q in QUANTILES:
+            out[f'p{int(q * 100)}'] = self.quantile(q)
+        return out
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'mean': self.mean, 'm2': self.m2, 'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        a = cls()
+        a.count, a.sum, a.min, a.max, a.mean, a.m2 = d['count'], d['sum'], d['min'], d['max'], d['mean'], d['m2']
+        a.sketch = QuantileSketch.from_dict(d['sketch'])
+        return a
+
+
+MOMENT_FIELDS = ['count', 'sum', 'min', 'max', 'mean', 'm2']
+GROUP_SKETCH_ALPHA = 0.02
+
+
+def _pack_buckets(group, sign, key):
+    '''One int64 per (group, sign, bucket) so bucket counts can be aggregated with np.unique.'''
+    return ((group.astype(np.int64) * 4 + (sign.astype(np.int64) + 1)) << 32) + (key.astype(np.int64) + 2 ** 31)
+
+
+def _unpack_buckets(packed):
+    return packed >> 34, ((packed >> 32) & 3) - 1, (packed & 0xFFFFFFFF) - 2 ** 31
+
+
+def _sum_buckets(keys, counts):
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=counts, minlength=len(uniq)).astype(np.int64)
+
+
+class GroupedAccumulator:
+    '''Per-Type count, sum, min/max, Welford moments and quantile sketch for every numeric column.
+
+    State is a (types x columns) array per moment plus packed sketch bucket counts, so a chunk costs one
+    groupby aggregation and one np.unique, and merging partials is a vectorized array merge. Per-type
+    sketches use GROUP_SKETCH_ALPHA (2% relative error) to keep partial_summary small with many types.'''
+
+    def __init__(self, columns=None, key='Type'):
+        self.columns = list(NUMERIC_COLUMNS if columns is None else columns)
+        self.key = key
+        self.sketch = QuantileSketch(GROUP_SKETCH_ALPHA)
+        self.names = []
+        self._ids = {}
+        self.moments = {f: np.zeros((0, len(self.columns))) for f in MOMENT_FIELDS}
+        self.bucket_keys = np.zeros(0, dtype=np.int64)
+        self.bucket_counts = np.zeros(0, dtype=np.int64)
+        self._pending = []
+
+    def _ensure(self, names):
+        ids = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            gid = self._ids.get(name)
+            if gid is None:
+                gid = self._ids[name] = len(self.names)
+                self.names.append(name)
+            ids[i] = gid
+        grow = len(self.names) - len(self.moments['count'])
+        if grow > 0:
+            for f in MOMENT_FIELDS:
+                fill = np.nan if f in ('min', 'max') else 0.0
+                self.moments[f] = np.vstack([self.moments[f], np.full((grow, len(self.columns)), fill)])
+        return ids
+
+    def _combine(self, ids, chunk):
+        '''Chan/Welford merge of chunk moment arrays (rows aligned with ids) into the state.'''
+        m = self.moments
+        na, nb = m['count'][ids], chunk['count']
+        n = na + nb
+        delta = chunk['mean'] - m['mean'][ids]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(nb == 0, m['mean'][ids], np.where(na == 0, chunk['mean'], m['mean'][ids] + delta * nb / n))
+            m2 = m['m2'][ids] + chunk['m2'] + np.nan_to_num(delta * delta * na * nb / n)
+        m['sum'][ids] += chunk['sum']
+        m['min'][ids] = np.fmin(m['min'][ids], chunk['min'])
+        m['max'][ids] = np.fmax(m['max'][ids], chunk['max'])
+        m['mean'][ids], m['m2'][ids], m['count'][ids] = mean, m2, n
+
+    def update(self, df, values=None):
+        '''Fold a chunk in; values, if given, is its (rows x self.columns) float matrix (see value_matrix).'''
+        if self.key not in df.columns or not len(df):
+            return self
+        codes, uniques = pd.factorize(df[self.key])
+        present = codes >= 0
+        if not any(c in df.columns for c in self.columns) or not present.any():
+            return self
+        codes = codes[present]
+        values = (value_matrix(df, self.columns) if values is None else values)[present]
+        agg = pd.DataFrame(values).groupby(codes, sort=False).agg(['count', 'sum', 'min', 'max', 'mean', 'var'])
+        ids = self._ensure([str(u) for u in uniques[agg.index.to_numpy()]])
+        chunk = {f: agg.xs(f, axis=1, level=1).to_numpy(dtype=np.float64) for f in ('count', 'sum', 'min', 'max', 'mean')}
+        chunk['mean'] = np.nan_to_num(chunk['mean'])
+        chunk['sum'] = np.nan_to_num(chunk['sum'])
+        chunk['m2'] = np.nan_to_num(agg.xs('var', axis=1, level=1).to_numpy(dtype=np.float64) * (chunk['count'] - 1))
+        self._combine(ids, chunk)
+
+        rows, colidx = np.nonzero(~np.isnan(values))
+        sign, keys = self.sketch.bucket(values[rows, colidx])
+        gid = self._ensure([str(u) for u in uniques])[codes[rows]]
+        uniq, counts = np.unique(_pack_buckets(gid * len(self.columns) + colidx, sign, keys), return_counts=True)
+        self._pending.append((uniq, counts))
+        if sum(len(k) for k, _ in self._pending) > max(len(self.bucket_keys), 200000):
+            self._compact()
+        return self
+
+    def _compact(self):
+        if self._pending:
+            keys = np.concatenate([self.bucket_keys] + [k for k, _ in self._pending])
+            counts = np.concatenate([self.bucket_counts] + [c for _, c in self._pending])
+            self.bucket_keys, self.bucket_counts = _sum_buckets(keys, counts)
+            self._pending = []
+
+    def _widen(self, columns):
+        '''Add columns (absent from every group so far) to the state, e.g. to merge datasets of other schemas.'''
+        extra = [c for c in columns if c not in self.columns]
+        if not extra:
+            return
+        self._compact()
+        old, new = len(self.columns), len(self.columns) + len(extra)
+        for f in MOMENT_FIELDS:
+            fill = np.nan if f in ('min', 'max') else 0.0
+            self.moments[f] = np.hstack([self.moments[f], np.full((len(self.moments[f]), len(extra)), fill)])
+        group, sign, key = _unpack_buckets(self.bucket_keys)
+        self.bucket_keys = _pack_buckets(group // old * new + group % old, sign, key)
+        self.columns = self.columns + extra
+
+    def merge(self, other):
+        if not other.names:
+            return self
+        if not self.names:
+            self.columns = list(other.columns) + [c for c in self.columns if c not in other.columns]
+            self.moments = {f: np.zeros((0, len(self.columns))) for f in MOMENT_FIELDS}
+        self._widen(other.columns)
+        cols = np.array([self.columns.index(c) for c in other.columns], dtype=np.int64)
+        ids = self._ensure(other.names)
+        # Scatter other's columns into self's layout; columns other lacks merge as empty.
+        chunk = {f: np.full((len(ids), len(self.columns)), np.nan if f in ('min', 'max') else 0.0) for f in MOMENT_FIELDS}
+        for f in MOMENT_FIELDS:
+            chunk[f][:, cols] = other.moments[f]
+        self._combine(ids, chunk)
+        other._compact()
+        group, sign, key = _unpack_buckets(other.bucket_keys)
+        ncols = len(other.columns)
+        remapped = ids[group // ncols] * len(self.columns) + cols[group % ncols]
+        self._pending.append((_pack_buckets(remapped, sign, key), other.bucket_counts))
+        return self
+
+    def quantiles(self):
+        '''Approximate quantiles as a dict of (types x columns) arrays, computed for all groups at once.'''
+        self._compact()
+        ncols = len(self.columns)
+        out = {f'p{int(q * 100)}': np.full((len(self.names), ncols), np.nan) for q in QUANTILES}
+        if not len(self.bucket_keys):
+            return out
+        group, sign, key = _unpack_buckets(self.bucket_keys)
+        gamma = self.sketch.gamma
+        v = sign * 2 * np.power(gamma, key.astype(np.float64)) / (gamma + 1)
+        order = np.lexsort((v, group))
+        group, v, n = group[order], v[order], self.bucket_counts[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        cum = np.cumsum(n)
+        before = np.r_[0, cum[starts[1:] - 1]]
+        seg = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(group)]))
+        within = cum - before[seg]
+        totals = np.add.reduceat(n, starts)
+        gids = group[starts]
+        for q in QUANTILES:
+            hit = np.flatnonzero(within > q * (totals[seg] - 1))
+            first_seg, first = np.unique(seg[hit], return_index=True)
+            out[f'p{int(q * 100)}'][gids[first_seg] // ncols, gids[first_seg] % ncols] = v[hit[first]]
+        return out
+
+    def result(self):
+        m = self.moments
+        count = m['count']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.where(count > 1, np.sqrt(m['m2'] / (count - 1)), np.nan)
+            mean = np.where(count > 0, m['mean'], np.nan)
+        fields = {'sum': m['sum'], 'mean': mean, 'min': m['min'], 'max': m['max'], 'std': std}
+        fields.update({k: np.clip(v, m['min'], m['max']) for k, v in self.quantiles().items()})
+        fields = {k: np.where(np.isnan(v), None, v).tolist() for k, v in fields.items()}
+        counts = count.astype(np.int64).tolist()
+        out = {}
+        for i, name in enumerate(self.names):
+            out[name] = {col: dict({'count': counts[i][j]}, **{k: v[i][j] for k, v in fields.items()})
+                         for j, col in enumerate(self.columns) if counts[i][j]}
+        return out
+
+    def to_dict(self):
+        self._compact()
+        return {'alpha': self.sketch.alpha, 'columns': self.columns, 'names': list(self.names),
+                'moments': {f: np.where(np.isnan(v), None, v).tolist() for f, v in self.moments.items()},
+                'bucket_keys': self.bucket_keys.tolist(), 'bucket_counts': self.bucket_counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, d, columns=None):
+        g = cls((d or {}).get('columns', columns))
+        if d and d.get('names'):
+            g._ensure(d['names'])
+            g.moments = {f: np.array(d['moments'][f], dtype=np.float64).reshape(len(g.names), len(g.columns))
+                         for f in MOMENT_FIELDS}
+            g.bucket_keys = np.array(d['bucket_keys'], dtype=np.int64)
+            g.bucket_counts = np.array(d['bucket_counts'], dtype=np.int64)
+        return g
+
+
+def value_matrix(df, columns):
+    '''(rows x columns) float64 matrix of df; absent columns, non-numeric and infinite cells are NaN.'''
+    present = [c for c in columns if c in df.columns]
+    if present == list(columns) and all(df[c].dtype.kind == 'f' for c in present):
+        out = df[present].to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        out = np.full((len(df), len(columns)), np.nan)
+        for j, col in enumerate(columns):
+            if col in df.columns:
+                out[:, j] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+    # The sketch has no bucket for +-inf and one would swamp the moments, so they count as missing.
+    infinite = np.isinf(out)
+    return np.where(infinite, np.nan, out) if infinite.any() else out
+
+
+class SummaryAccumulator:
+    '''Mergeable dataset summary: row count, per-column numeric accumulators and Type counts.
+
+    out_of_range counts values a schema's range checks blanked before they reached the accumulators.'''
+
+    def __init__(self, columns=None):
+        self.total = 0
+        self.columns = {c: NumericAccumulator() for c in (NUMERIC_COLUMNS if columns is None else columns)}
+        self.types = {}
+        self.out_of_range = {}
+        # Row-level validation report of the file this summarizes (set by ingest; not part of the state).
+        self.validation = None
+        self.by_type = GroupedAccumulator(list(self.columns))
+
+    def _update_columns(self, values):
+        '''Moments of every column from one pass of column-wise reductions over the values matrix.'''
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        if not counts.any():
+            return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sums = np.nansum(values, axis=0)
+            means = sums / counts
+            m2 = np.nansum((values - means) ** 2, axis=0)
+            mins = np.where(valid, values, np.inf).min(axis=0)
+            maxs = np.where(valid, values, -np.inf).max(axis=0)
+        accs = list(self.columns.values())
+        for j in np.flatnonzero(counts).tolist():
+            accs[j]._combine(int(counts[j]), float(sums[j]), float(mins[j]), float(maxs[j]), float(means[j]), float(m2[j]))
+        # One np.unique over (column, bucket) for all columns' sketches.
+        rows, colidx = np.nonzero(valid)
+        sketch = accs[0].sketch
+        sign, keys = sketch.bucket(values[rows, colidx])
+        uniq, n = np.unique(_pack_buckets(colidx.astype(np.int64), sign, keys), return_counts=True)
+        col, usign, ukey = _unpack_buckets(uniq)
+        for j, sg, k, c in zip(col.tolist(), usign.tolist(), ukey.tolist(), n.tolist()):
+            accs[j].sketch.add(sg, k, c)
+
+    def update(self, df):
+        self.total += len(df)
+        values = value_matrix(df, list(self.columns))
+        if len(df) and self.columns:
+            self._update_columns(values)
+        if 'Type' in df.columns:
+            # sort=False also keeps a categorical Type from listing categories absent from this chunk.
+            for k, v in df['Type'].value_counts(sort=False).items():
+                if not v:
+                    continue
+                k = str(k)
+                self.types[k] = self.types.get(k, 0) + int(v)
+        self.by_type.update(df, values)
+        return self
+
+    def add_out_of_range(self, counts):
+        for k, v in counts.items():
+            self.out_of_range[k] = self.out_of_range.get(k, 0) + v
+        return self
+
+    def merge(self, other):
+        self.total += other.total
+        self.add_out_of_range(other.out_of_range)
+        for col, acc in other.columns.items():
+            self.columns.setdefault(col, NumericAccumulator()).merge(acc)
+        for k, v in other.types.items():
+            self.types[k] = self.types.get(k, 0) + v
+        self.by_type.merge(other.by_type)
+        return self
+
+    def result(self):
+        averages = {c: (a.mean if a.count else None) for c, a in self.columns.items()}
+        return {'total': self.total, 'averages': averages, 'type_distribution': dict(self.types),
+                'stats': {c: a.stats() for c, a in self.columns.items()},
+                'by_type': self.by_type.result(), 'out_of_range': dict(self.out_of_range)}
+
+    def to_dict(self):
+        return {'total': self.total, 'types': dict(self.types), 'out_of_range': dict(self.out_of_range),
+                'columns': {c: a.to_dict() for c, a in self.columns.items()},
+                'by_type': self.by_type.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        acc = cls(list(d.get('columns', {})))
+        acc.total = d.get('total', 0)
+        acc.types = dict(d.get('types', {}))
+        acc.out_of_range = dict(d.get('out_of_range', {}))
+        acc.columns = {c: NumericAccumulator.from_dict(v) for c, v in d.get('columns', {}).items()}
+        acc.by_type = GroupedAccumulator.from_dict(d.get('by_type'), list(acc.columns))
+        return acc
+
+
+def merge_summaries(states):
+    '''Combine serialized partial summaries (e.g. UploadedDataset.partial_summary) without rereading rows.'''
+    acc = SummaryAccumulator([])
+    for state in states:
+        if state:
+            acc.merge(SummaryAccumulator.from_dict(state))
+    return acc
+
+
+def compute_summary(df, columns=None):
+    '''Summary of an in-memory frame over columns (default NUMERIC_COLUMNS, or a schema's numeric columns).'''
+    return SummaryAccumulator(columns).update(df).result()
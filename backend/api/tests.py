@@ -1,9 +1,14 @@
-from django.test import TestCase, override_settings
+from django.test import SimpleTestCase, TestCase, override_settings
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from .models import UploadedDataset
 import io, os
+import numpy as np
+import pandas as pd
+from .summary import SummaryAccumulator, compute_summary, merge_summaries
+from .ingest import open_dataset
+from .columnar import remove_sidecar
 from django.conf import settings
 
 SAMPLE_CSV = """Equipment Name,Type,Flowrate,Pressure,Temperature
@@ -52,3 +57,711 @@ class APITest(TestCase):
         res = self.client.get(f'/api/generate_pdf/{pid}/')
         self.assertEqual(res.status_code, 200)
         self.assertEqual(res['Content-Type'], 'application/pdf') or True
+    def test_report_aggregates_are_binned(self):
+        from .columnar import build_sidecar
+        from .reports import HIST_BINS, report_aggregates, render_report
+        df = pd.DataFrame({'Equipment Name': [f'P{i}' for i in range(200)], 'Type': ['Pump', 'Valve'] * 100,
+                           'Flowrate': np.r_[np.ones(199), 1000.0], 'Pressure': np.arange(200.0), 'Temperature': np.full(200, 50.0)})
+        path = str(settings.BASE_DIR / 'test_media' / 'agg.csv')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ds = build_sidecar(path, [df], ['Flowrate', 'Pressure', 'Temperature'])
+        summary = compute_summary(df)
+        agg = report_aggregates(ds, summary)
+        counts, edges = agg['histograms']['Pressure']
+        self.assertEqual(len(counts), HIST_BINS)
+        self.assertEqual(counts.sum(), 200)
+        self.assertEqual(agg['types'], ['Pump', 'Valve'])
+        self.assertAlmostEqual(agg['type_means']['Pressure'][0], df[df.Type == 'Pump'].Pressure.mean())
+        self.assertEqual([o[0] for o in agg['outliers']], ['P199'])
+        inst = UploadedDataset(id=1, name='agg.csv', summary_json=summary)
+        self.assertTrue(render_report(inst, ds).startswith(b'%PDF'))
+    def test_report_charts_stay_on_the_page_for_wide_schemas(self):
+        from unittest import mock
+        from . import reports
+        from .columnar import build_sidecar
+        from .models import Schema
+        schema = Schema.objects.get(name='equipment_extended')
+        columns = [c['name'] for c in schema.columns if c['kind'] == 'float']
+        self.assertEqual(len(columns), 6)
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame(dict({'Equipment Name': [f'P{i}' for i in range(60)], 'Type': ['Pump', 'Valve', 'Tank'] * 20},
+                               **{c: rng.uniform(1, 50, 60) for c in columns}))
+        path = str(settings.BASE_DIR / 'test_media' / 'wide.csv')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ds = build_sidecar(path, [df], columns)
+        inst = UploadedDataset(id=1, name='wide.csv', summary_json=compute_summary(df, columns), schema=schema)
+        with mock.patch.object(reports, '_bar_chart', wraps=reports._bar_chart) as chart:
+            self.assertTrue(reports.render_report(inst, ds).startswith(b'%PDF'))
+        titles = [c.args[6] for c in chart.call_args_list]
+        self.assertEqual(sum(t.startswith('Mean ') for t in titles), 6)
+        self.assertTrue(all(c.args[2] >= 40 for c in chart.call_args_list))
+    @override_settings(INGEST_CHUNK_ROWS=1)
+    def test_upload_streams_chunks_once(self):
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'chunked.csv'}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        summary = res.json()['summary']
+        self.assertEqual(summary['total'], 2)
+        self.assertAlmostEqual(summary['averages']['Flowrate'], 110.25)
+        self.assertEqual(summary['type_distribution'], {'Pump': 2})
+        inst = UploadedDataset.objects.get(pk=res.json()['id'])
+        with open(inst.csv_file.path, 'rb') as fh:
+            self.assertEqual(fh.read(), SAMPLE_CSV.encode('utf-8'))
+    def test_upload_rejects_missing_columns(self):
+        bad = "Equipment Name,Type,Flowrate\nPump A,Pump,1\n"
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(bad.encode('utf-8')), 'name': 'bad.csv'}, format='multipart')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Missing required columns', res.json()['error'])
+        self.assertEqual(UploadedDataset.objects.count(), 0)
+    def test_infinite_values_are_reported_not_summarized(self):
+        from .parsing import available_engines
+        csv = SAMPLE_CSV + 'Pump C,Pump,inf,-inf,1e999\n'
+        for engine in available_engines():
+            with self.settings(CSV_ENGINE=engine):
+                res = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': f'inf_{engine}.csv'}, format='multipart')
+            self.assertEqual(res.status_code, 200)
+            summary = res.json()['summary']
+            self.assertAlmostEqual(summary['averages']['Flowrate'], 110.25)
+            self.assertEqual(summary['stats']['Pressure']['count'], 2)
+            inst = UploadedDataset.objects.get(pk=res.json()['id'])
+            self.assertEqual(inst.validation['counts']['bad_numeric'], {'Flowrate': 1, 'Pressure': 1, 'Temperature': 1})
+            self.assertTrue(np.isnan(open_dataset(inst).values('Flowrate')[2]))
+        acc = SummaryAccumulator(['Flowrate']).update(pd.DataFrame({'Flowrate': [1.0, np.inf, 3.0]}))
+        self.assertEqual((acc.columns['Flowrate'].count, acc.columns['Flowrate'].mean), (2, 2.0))
+    def test_upload_accepts_repeated_headers(self):
+        from .parsing import available_engines
+        repeated = SAMPLE_CSV.replace('Temperature', 'Temperature,Flowrate').replace('75.0', '75.0,1').replace('80.1', '80.1,2')
+        for engine in available_engines():
+            with self.settings(CSV_ENGINE=engine):
+                res = self.client.post('/api/upload/', {'file': io.BytesIO(repeated.encode('utf-8')), 'name': f'{engine}.csv'}, format='multipart')
+            self.assertEqual(res.status_code, 200)
+            self.assertAlmostEqual(res.json()['summary']['averages']['Flowrate'], 110.25)
+    @override_settings(INGEST_CHUNK_ROWS=1)
+    def test_upload_writes_columnar_sidecar(self):
+        csv = SAMPLE_CSV + 'Valve "X",,,1.5,\n'
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': 'cols.csv'}, format='multipart')
+        inst = UploadedDataset.objects.get(pk=res.json()['id'])
+        ds = open_dataset(inst)
+        self.assertIsInstance(ds.values('Pressure'), np.memmap)
+        expected = pd.read_csv(io.StringIO(csv))
+        got = ds.to_frame()
+        self.assertEqual(list(got.columns), list(expected.columns))
+        self.assertEqual(list(got['Equipment Name']), list(expected['Equipment Name']))
+        self.assertEqual(list(got['Type'].astype(object).where(got['Type'].notna(), None)), ['Pump', 'Pump', None])
+        np.testing.assert_array_equal(got['Pressure'].to_numpy(), expected['Pressure'].to_numpy())
+        np.testing.assert_array_equal(got['Flowrate'].to_numpy(), expected['Flowrate'].to_numpy())
+        remove_sidecar(inst.csv_file.path)
+        self.assertEqual(list(open_dataset(inst).take([1], ['Flowrate'])['Flowrate']), [120.0])
+    def test_dataset_rows_paginates_sorts_and_filters(self):
+        csv = SAMPLE_CSV + "Valve A,Valve,10.0,0.5,30.0\nPump C,Pump,90.0,2.1,70.0\n"
+        pid = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': 'rows.csv'}, format='multipart').json()['id']
+        res = self.client.get(f'/api/datasets/{pid}/rows/', {'limit': 2, 'offset': 1, 'columns': 'Equipment Name,Flowrate'})
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['columns'], ['Equipment Name', 'Flowrate'])
+        self.assertEqual(data['rows'], [['Pump B', 120.0], ['Valve A', 10.0]])
+        data = self.client.get(f'/api/datasets/{pid}/rows/', {'sort': '-Flowrate', 'type': 'Pump', 'min_Pressure': 2.2}).json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual([r[0] for r in data['rows']], ['Pump B', 'Pump A'])
+        res = self.client.get(f'/api/datasets/{pid}/rows/', {'sort': 'Bogus'})
+        self.assertEqual(res.status_code, 400)
+    def test_dataset_rows_keep_blank_values_last_in_both_directions(self):
+        csv = SAMPLE_CSV + "Valve A,,,0.5,30.0\nPump C,Pump,90.0,2.1,70.0\nValve B,,,0.7,31.0\n"
+        pid = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': 'blank.csv'}, format='multipart').json()['id']
+        names = lambda **q: [r[0] for r in self.client.get(f'/api/datasets/{pid}/rows/', {'columns': 'Equipment Name', **q}).json()['rows']]
+        self.assertEqual(names(sort='Flowrate'), ['Pump C', 'Pump A', 'Pump B', 'Valve A', 'Valve B'])
+        self.assertEqual(names(sort='-Flowrate'), ['Pump B', 'Pump A', 'Pump C', 'Valve A', 'Valve B'])
+        self.assertEqual(names(sort='-Flowrate', offset=2, limit=2), ['Pump C', 'Valve A'])
+        self.assertEqual(names(sort='-Type'), ['Pump C', 'Pump B', 'Pump A', 'Valve A', 'Valve B'])
+        from .columnar import sidecar_dir
+        inst = UploadedDataset.objects.get(pk=pid)
+        self.assertFalse([f for f in os.listdir(sidecar_dir(inst.csv_file.path)) if f.endswith('.tmp')])
+        remove_sidecar(inst.csv_file.path)
+        os.remove(inst.csv_file.path)
+        self.assertEqual(self.client.get(f'/api/datasets/{pid}/rows/').status_code, 404)
+    @override_settings(JOB_QUEUE_MODE='eager')
+    def test_async_upload_and_report_jobs(self):
+        res = self.client.post('/api/upload/?async=1', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'async.csv'}, format='multipart')
+        self.assertEqual(res.status_code, 202)
+        job = self.client.get(f"/api/jobs/{res.json()['job_id']}/").json()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['summary']['total'], 2)
+        pid = job['dataset_id']
+        res = self.client.get(f'/api/generate_pdf/{pid}/', {'async': 1})
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(self.client.get(f"/api/jobs/{res.json()['job_id']}/").json()['status'], 'done')
+        res = self.client.get(f'/api/generate_pdf/{pid}/')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(b''.join(res.streaming_content).startswith(b'%PDF'))
+    @override_settings(JOB_QUEUE_MODE='eager')
+    def test_async_upload_failure_is_reported(self):
+        bad = "Equipment Name,Type\nPump A,Pump\n"
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(bad.encode('utf-8')), 'name': 'bad.csv', 'async': 'true'}, format='multipart')
+        job = self.client.get(f"/api/jobs/{res.json()['job_id']}/").json()
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('Missing required columns', job['error'])
+        self.assertEqual(UploadedDataset.objects.count(), 0)
+    @override_settings(JOB_QUEUE_MODE='eager', RETENTION_SWEEP_INTERVAL=0)
+    def test_duplicate_upload_reuses_stored_content(self):
+        first = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'day1.csv'}, format='multipart').json()
+        second = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'day2.csv'}, format='multipart').json()
+        self.assertEqual(second['duplicate_of'], first['id'])
+        self.assertEqual(second['summary'], first['summary'])
+        a, b = UploadedDataset.objects.get(pk=first['id']), UploadedDataset.objects.get(pk=second['id'])
+        self.assertEqual(a.csv_file.name, b.csv_file.name)
+        self.assertEqual(len(a.content_hash), 64)
+        self.assertEqual(len(os.listdir(os.path.dirname(a.csv_file.path))), 2)
+        for i in range(5):
+            self.client.post('/api/upload/', {'file': io.BytesIO(f"{SAMPLE_CSV}Pump {i},Pump,1,1,1\n".encode('utf-8')), 'name': f'other{i}.csv'}, format='multipart')
+            if i == 3:
+                self.assertFalse(UploadedDataset.objects.filter(pk=a.pk).exists())
+                self.assertTrue(os.path.exists(b.csv_file.path))
+        self.assertFalse(UploadedDataset.objects.filter(pk=a.pk).exists())
+        self.assertFalse(UploadedDataset.objects.filter(pk=b.pk).exists())
+        self.assertFalse(os.path.exists(a.csv_file.path))
+    @override_settings(BATCH_MAX_FILES=3)
+    def test_batch_zip_over_the_file_limit_is_rejected_before_extraction(self):
+        import zipfile
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from . import ingest
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i in range(10):
+                zf.writestr(f'unit{i}.csv', SAMPLE_CSV)
+        with mock.patch.object(ingest, '_stage_stream', wraps=ingest._stage_stream) as stage:
+            res = self.client.post('/api/upload_batch/', {'files': [SimpleUploadedFile('units.zip', archive.getvalue())]}, format='multipart')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Too many files', res.json()['error'])
+        stage.assert_not_called()
+    @override_settings(BATCH_WORKERS=2)
+    def test_batch_upload_of_files_and_zip(self):
+        import zipfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        other = SAMPLE_CSV + "Valve C,Valve,10,1.5,60\n"
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('unit2.csv', other)
+            zf.writestr('notes.txt', 'ignored')
+            zf.writestr('unit1_copy.csv', SAMPLE_CSV)
+        files = [SimpleUploadedFile('unit1.csv', SAMPLE_CSV.encode('utf-8')),
+                 SimpleUploadedFile('broken.csv', b'a,b\n1,2\n'),
+                 SimpleUploadedFile('units.zip', archive.getvalue())]
+        res = self.client.post('/api/upload_batch/', {'files': files}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        from .parallel import get_pool
+        self.assertIn(get_pool(2)._mp_context.get_start_method(), ('forkserver', 'spawn'))
+        data = res.json()
+        results = {r['name']: r for r in data['results']}
+        self.assertEqual((data['count'], data['failed']), (3, 2))
+        self.assertIn('Missing required columns', results['broken.csv']['error'])
+        self.assertIn('error', results['notes.txt'])
+        self.assertEqual(results['unit1_copy.csv']['duplicate_of'], results['unit1.csv']['id'])
+        self.assertEqual(results['unit2.csv']['summary']['total'], 3)
+        combined = data['combined']
+        self.assertEqual(combined['total'], 7)
+        self.assertEqual(combined['type_distribution'], {'Pump': 6, 'Valve': 1})
+        self.assertAlmostEqual(combined['averages']['Flowrate'], (3 * 220.5 + 10) / 7)
+        self.assertEqual(combined['by_type']['Valve']['Pressure']['count'], 1)
+        self.assertEqual(UploadedDataset.objects.count(), 3)
+    def test_history_is_cursor_paginated(self):
+        ids = [self.client.post('/api/upload/', {'file': io.BytesIO(f"{SAMPLE_CSV}Pump {i},Pump,1,1,1\n".encode('utf-8')), 'name': f'h{i}.csv'}, format='multipart').json()['id']
+               for i in range(5)]
+        res = self.client.get('/api/history/', {'limit': 2})
+        seen = [d['id'] for d in res.json()]
+        while 'Link' in res:
+            res = self.client.get(res['Link'][1:res['Link'].index('>')])
+            seen += [d['id'] for d in res.json()]
+        self.assertEqual(seen, ids[::-1])
+        self.assertEqual(self.client.get('/api/history/', {'cursor': 'bogus'}).status_code, 400)
+    def test_retention_sweep_applies_count_age_and_size_limits(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .catalog import sweep
+        ids = [self.client.post('/api/upload/', {'file': io.BytesIO(f"{SAMPLE_CSV}Pump {i},Pump,1,1,1\n".encode('utf-8')), 'name': f'r{i}.csv'}, format='multipart').json()['id']
+               for i in range(6)]
+        self.assertEqual(UploadedDataset.objects.count(), 6)
+        oldest = UploadedDataset.objects.get(pk=ids[0])
+        UploadedDataset.objects.filter(pk=ids[1]).update(uploaded_at=timezone.now() - timedelta(days=10))
+        self.assertEqual(sweep({'max_datasets': 0, 'max_age_days': 7, 'max_bytes': 0}), 1)
+        with self.settings(RETENTION_BATCH_SIZE=1):
+            self.assertEqual(sweep({'max_datasets': 4, 'max_age_days': 0, 'max_bytes': 0}), 1)
+        self.assertEqual(sorted(UploadedDataset.objects.values_list('id', flat=True)), ids[2:])
+        self.assertFalse(os.path.exists(oldest.csv_file.path))
+        size = UploadedDataset.objects.get(pk=ids[5]).size
+        self.assertEqual(size, os.path.getsize(UploadedDataset.objects.get(pk=ids[5]).csv_file.path))
+        self.assertEqual(sweep({'max_datasets': 0, 'max_age_days': 0, 'max_bytes': 2 * size}), 2)
+        self.assertEqual(sorted(UploadedDataset.objects.values_list('id', flat=True)), ids[4:])
+    @override_settings(JOB_QUEUE_MODE='eager', RETENTION_SWEEP_INTERVAL=0, RETENTION_MAX_DATASETS=2)
+    def test_datasets_and_retention_are_scoped_per_user(self):
+        other = User.objects.create_user('other', password='pass123')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        mine = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'mine.csv'}, format='multipart').json()
+        for i in range(3):
+            res = client.post('/api/upload/', {'file': io.BytesIO(f"{SAMPLE_CSV}Pump {i},Pump,1,1,1\n".encode('utf-8')), 'name': f'theirs{i}.csv'}, format='multipart')
+        theirs = client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'same.csv'}, format='multipart').json()
+        self.assertNotIn('duplicate_of', theirs)
+        self.assertEqual([d['id'] for d in self.client.get('/api/history/').json()], [mine['id']])
+        self.assertEqual(UploadedDataset.objects.filter(owner=other).count(), 2)
+        self.assertEqual(self.client.get(f"/api/summary/{theirs['id']}/").status_code, 404)
+        self.assertEqual(client.get(f"/api/generate_pdf/{mine['id']}/").status_code, 404)
+        self.assertEqual(client.get(f"/api/datasets/{mine['id']}/rows/").status_code, 404)
+    @override_settings(JOB_QUEUE_MODE='db', RETENTION_SWEEP_INTERVAL=60, RETENTION_SWEEP_STALE=600)
+    def test_stale_sweep_jobs_do_not_block_retention(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import schedule_sweep
+        from .models import Job
+        stuck = Job.objects.create(kind='sweep', owner=self.user, status='running')
+        self.assertIsNone(schedule_sweep(self.user))
+        Job.objects.filter(pk=stuck.pk).update(created_at=timezone.now() - timedelta(hours=2),
+                                               updated_at=timezone.now() - timedelta(hours=2))
+        job = schedule_sweep(self.user)
+        self.assertIsNotNone(job)
+        self.assertEqual(Job.objects.get(pk=stuck.pk).status, 'failed')
+        self.assertIsNone(schedule_sweep(self.user))
+    def test_unowned_datasets_are_adopted_not_swept_together(self):
+        import importlib
+        from django.apps import apps
+        from .catalog import sweep
+        ids = [self.client.post('/api/upload/', {'file': io.BytesIO(f"{SAMPLE_CSV}Pump {i},Pump,1,1,1\n".encode('utf-8')), 'name': f'u{i}.csv'}, format='multipart').json()['id']
+               for i in range(3)]
+        UploadedDataset.objects.filter(pk__in=ids).update(owner=None)
+        policy = {'max_datasets': 1, 'max_age_days': 0, 'max_bytes': 0}
+        # Without a legacy owner they are kept rather than pruned as one anonymous pool.
+        self.assertEqual(sweep(policy), 0)
+        self.assertEqual(UploadedDataset.objects.filter(owner__isnull=True).count(), 3)
+        migration = importlib.import_module('api.migrations.0012_adopt_unowned_datasets')
+        with self.settings(LEGACY_DATASET_OWNER='tester'):
+            migration.adopt_unowned(apps, None)
+        self.assertEqual(sorted(d['id'] for d in self.client.get('/api/history/').json()), ids)
+        UploadedDataset.objects.filter(pk__in=ids).update(owner=None)
+        admin = User.objects.create_superuser('admin', password='pass123')
+        self.assertEqual(sweep(policy), 2)
+        self.assertEqual(list(UploadedDataset.objects.values_list('owner', flat=True)), [admin.id])
+    @override_settings(JOB_QUEUE_MODE='eager', RETENTION_SWEEP_INTERVAL=0, RETENTION_MAX_DATASETS=2)
+    def test_trends_come_from_rollup_and_outlive_retention(self):
+        ids = []
+        for i in range(3):
+            csv = SAMPLE_CSV + f"Valve {i},Valve,10,{i + 1}.5,60\n"
+            ids.append(self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': f't{i}.csv'}, format='multipart').json()['id'])
+        self.assertEqual(UploadedDataset.objects.count(), 2)
+        data = self.client.get('/api/trends/', {'metric': 'Pressure', 'type': 'Valve'}).json()
+        self.assertEqual([d['id'] for d in data['datasets']], ids)
+        series = {s['type']: s for s in data['series']}
+        self.assertEqual(set(series), {None, 'Valve'})
+        self.assertEqual(series['Valve']['mean'], [1.5, 2.5, 3.5])
+        self.assertAlmostEqual(series[None]['mean'][2], (2.3 + 2.8 + 3.5) / 3)
+        self.assertEqual(series[None]['count'], [3, 3, 3])
+        data = self.client.get('/api/trends/', {'by_type': 1, 'limit': 2, 'from_id': ids[0]}).json()
+        self.assertEqual([d['id'] for d in data['datasets']], ids[1:])
+        self.assertEqual(len(data['series']), 3 * 3)
+        self.assertEqual(self.client.get('/api/trends/', {'since': '2100-01-01'}).json()['datasets'], [])
+        self.assertEqual(self.client.get('/api/trends/', {'since': 'yesterday'}).status_code, 400)
+    def test_anomalies_are_scored_per_type_on_upload(self):
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame({'Equipment Name': [f'Unit {i}' for i in range(200)],
+                           'Type': ['Pump'] * 100 + ['Valve'] * 100,
+                           'Flowrate': np.r_[rng.normal(100, 5, 100), rng.normal(10, 1, 100)],
+                           'Pressure': rng.normal(5, 0.5, 200),
+                           'Temperature': rng.normal(70, 2, 200)})
+        # 40 is ordinary overall but far outside the Valve family.
+        df.loc[150, 'Flowrate'] = 40.0
+        df['Temperature'] = df['Temperature'].astype(object)
+        df.loc[7, 'Temperature'] = 'n/a'
+        body = df.to_csv(index=False).encode('utf-8')
+        pid = self.client.post('/api/upload/', {'file': io.BytesIO(body), 'name': 'anom.csv'}, format='multipart').json()['id']
+        data = self.client.get(f'/api/datasets/{pid}/anomalies/', {'metric': 'Flowrate'}).json()
+        top = data['anomalies'][0]
+        self.assertEqual((top['row'], top['equipment'], top['type'], top['value']), (150, 'Unit 150', 'Valve', 40.0))
+        self.assertEqual(top['methods'], ['zscore', 'iqr', 'mad'])
+        self.assertGreater(top['robust_z'], 3.5)
+        self.assertEqual(data['total'], len(data['anomalies']))
+        self.assertEqual(self.client.get(f'/api/datasets/{pid}/anomalies/', {'type': 'Pump', 'metric': 'Flowrate'}).json()['total'],
+                         sum(a['type'] == 'Pump' for a in data['anomalies']))
+
+        dup = self.client.post('/api/upload/', {'file': io.BytesIO(body), 'name': 'anom2.csv'}, format='multipart').json()['id']
+        self.assertEqual(self.client.get(f'/api/datasets/{dup}/anomalies/').json()['anomalies'],
+                         self.client.get(f'/api/datasets/{pid}/anomalies/').json()['anomalies'])
+        # Datasets registered before scoring existed are scored on first request.
+        from .models import Anomaly
+        Anomaly.objects.filter(dataset_id=pid).delete()
+        UploadedDataset.objects.filter(pk=pid).update(anomalies_scored=False)
+        self.assertEqual(self.client.get(f'/api/datasets/{pid}/anomalies/').json()['total'],
+                         Anomaly.objects.filter(dataset_id=dup).count())
+        self.assertEqual(self.client.get(f'/api/generate_pdf/{pid}/').status_code, 200)
+
+        from .anomalies import score_column
+        values, groups = df['Pressure'].to_numpy(float), (df['Type'] == 'Valve').to_numpy().astype(np.int64)
+        z, robust, _ = score_column(values, groups, 2)
+        for g in (0, 1):
+            v = values[groups == g]
+            mad = np.median(np.abs(v - np.median(v)))
+            np.testing.assert_allclose(z[groups == g], (v - v.mean()) / v.std(ddof=1))
+            np.testing.assert_allclose(robust[groups == g], (v - np.median(v)) / (1.4826 * mad))
+    def test_anomaly_scoring_is_atomic_and_report_states_the_rule(self):
+        from unittest import mock
+        from reportlab.pdfgen import canvas
+        from .anomalies import record_anomalies
+        from .models import Anomaly
+        from .reports import render_report
+        rng = np.random.default_rng(5)
+        df = pd.DataFrame({'Equipment Name': [f'Unit {i}' for i in range(50)], 'Type': ['Pump'] * 50,
+                           'Flowrate': rng.normal(100, 5, 50), 'Pressure': rng.normal(5, 0.5, 50),
+                           'Temperature': rng.normal(70, 2, 50)})
+        df.loc[3, 'Flowrate'] = 500.0
+        body = df.to_csv(index=False).encode('utf-8')
+        pid = self.client.post('/api/upload/', {'file': io.BytesIO(body), 'name': 'atomic.csv'}, format='multipart').json()['id']
+        inst = UploadedDataset.objects.get(pk=pid)
+        Anomaly.objects.filter(dataset_id=pid).delete()
+        UploadedDataset.objects.filter(pk=pid).update(anomalies_scored=False)
+        inst.anomalies_scored = False
+        with mock.patch.object(Anomaly.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                record_anomalies(inst, open_dataset(inst))
+        self.assertFalse(UploadedDataset.objects.get(pk=pid).anomalies_scored)
+        stored = record_anomalies(inst, open_dataset(inst))
+        self.assertGreater(stored, 0)
+        self.assertTrue(UploadedDataset.objects.get(pk=pid).anomalies_scored)
+        # A request that loaded the dataset before another one scored it stores nothing more.
+        stale = UploadedDataset.objects.get(pk=pid)
+        stale.anomalies_scored = False
+        self.assertEqual(record_anomalies(stale, open_dataset(stale)), stored)
+        self.assertEqual(Anomaly.objects.filter(dataset_id=pid).count(), stored)
+
+        for needed, text in ((2, 'at least two of'), (3, 'at least three of')):
+            with override_settings(ANOMALY_MIN_METHODS=needed), \
+                    mock.patch.object(canvas.Canvas, 'drawString', autospec=True, side_effect=canvas.Canvas.drawString) as draw:
+                render_report(inst, open_dataset(inst), anomalies=[])
+            self.assertTrue(any(text in call.args[3] for call in draw.call_args_list))
+    def test_compare_joins_on_equipment_name(self):
+        a = SAMPLE_CSV + "Valve C,Valve,10,1.5,60\nPump A,Pump,1,1,1\n"
+        b = ("Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+             "Mixer D,Mixer,5,,40\nValve C,Valve,10,1.5,60\nPump A,Compressor,100.5,3.0,75.0\n")
+        ids = [self.client.post('/api/upload/', {'file': io.BytesIO(body.encode('utf-8')), 'name': f'c{i}.csv'}, format='multipart').json()['id']
+               for i, body in enumerate((a, b))]
+        res = self.client.get('/api/compare/', {'a': ids[0], 'b': ids[1]})
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(data['counts'], {'added': 1, 'removed': 1, 'changed': 1, 'unchanged': 1})
+        self.assertEqual(data['duplicate_names'], {'a': 1, 'b': 0})
+        self.assertEqual(data['added'], [{'equipment': 'Mixer D', 'type': 'Mixer', 'Flowrate': 5.0, 'Pressure': None, 'Temperature': 40.0}])
+        self.assertEqual([r['equipment'] for r in data['removed']], ['Pump B'])
+        changed = data['changed'][0]
+        self.assertEqual((changed['equipment'], changed['type'], changed['type_from']), ('Pump A', 'Compressor', 'Pump'))
+        self.assertEqual(list(changed['deltas']), ['Pressure'])
+        self.assertAlmostEqual(changed['deltas']['Pressure']['delta'], 0.7)
+        self.assertEqual(data['parameters']['Flowrate']['changed'], 0)
+        self.assertFalse(data['truncated'])
+        cached = os.listdir(settings.BASE_DIR / 'test_media' / 'compare')
+        self.assertEqual(len(cached), 1)
+        self.assertEqual(self.client.get('/api/compare/', {'a': ids[0], 'b': ids[1], 'limit': 0}).json()['changed'], [])
+        reverse = self.client.get('/api/compare/', {'a': ids[1], 'b': ids[0]}).json()
+        self.assertEqual(reverse['counts']['added'], 1)
+        self.assertEqual(self.client.get('/api/compare/', {'a': ids[0]}).status_code, 400)
+        other = User.objects.create_user('other', password='pass123')
+        foreign = UploadedDataset.objects.create(owner=other, name='x.csv', csv_file=UploadedDataset.objects.get(pk=ids[0]).csv_file.name)
+        self.assertEqual(self.client.get('/api/compare/', {'a': ids[0], 'b': foreign.id}).status_code, 404)
+        from .catalog import delete_datasets
+        delete_datasets([ids[0]])
+        self.assertEqual(os.listdir(settings.BASE_DIR / 'test_media' / 'compare'), [])
+    def test_metrics_and_server_timing(self):
+        from . import metrics
+        metrics.reset()
+        profiles = settings.BASE_DIR / 'test_media' / 'profiles'
+        with self.settings(PROFILE_SLOW_REQUESTS=True, PROFILE_SLOW_MS=0, PROFILE_DIR=str(profiles)):
+            res = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'm.csv'}, format='multipart')
+        stages = [part.split(';')[0] for part in res['Server-Timing'].split(', ')]
+        for stage in ('hash', 'parse', 'summarize', 'columnar', 'register', 'anomalies', 'db', 'total'):
+            self.assertIn(stage, stages)
+        self.assertTrue(any(f.endswith('.folded') and 'upload_csv' in f for f in os.listdir(profiles)))
+        pid = res.json()['id']
+        self.assertIn('render', self.client.get(f'/api/generate_pdf/{pid}/')['Server-Timing'])
+        self.client.get(f'/api/generate_pdf/{pid}/')
+        body = self.client.get('/api/metrics/').content.decode('utf-8')
+        self.assertIn('ingest_rows_total 2', body)
+        self.assertIn('cache_requests_total{cache="report",result="hit"} 1', body)
+        self.assertIn('http_requests_total{method="POST",status="200",view="upload_csv"} 1', body)
+        self.assertIn('stage_seconds_count{stage="render"} 1', body)
+        self.assertRegex(body, r'db_queries_total\{view="upload_csv"\} [1-9]')
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(APIClient().get('/api/metrics/').status_code, 401)
+            self.assertEqual(APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        remote = {'REMOTE_ADDR': '203.0.113.9'}
+        self.assertEqual(APIClient().get('/api/metrics/', **remote).status_code, 403)
+        for header in ({'HTTP_X_FORWARDED_FOR': '203.0.113.9'}, {'HTTP_FORWARDED': 'for=203.0.113.9'}):
+            self.assertEqual(APIClient().get('/api/metrics/', REMOTE_ADDR='127.0.0.1', **header).status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', **remote).status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(self.client.get('/api/metrics/', **remote).status_code, 200)
+        with self.settings(METRICS_PUBLIC=True):
+            self.assertEqual(APIClient().get('/api/metrics/', **remote).status_code, 200)
+    def test_csv_and_summary_support_conditional_get(self):
+        pid = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'cond.csv'}, format='multipart').json()['id']
+        inst = UploadedDataset.objects.get(pk=pid)
+        self.assertEqual(self.client.get('/api/history/').json()[0]['content_hash'], inst.content_hash)
+        res = self.client.get(f'/api/datasets/{pid}/csv/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content).decode('utf-8'), SAMPLE_CSV)
+        self.assertEqual(res['ETag'], f'"{inst.content_hash}"')
+        self.assertEqual(self.client.get(f'/api/datasets/{pid}/csv/', HTTP_IF_NONE_MATCH=res['ETag']).status_code, 304)
+        res = self.client.get(f'/api/summary/{pid}/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.client.get(f'/api/summary/{pid}/', HTTP_IF_NONE_MATCH=res['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f'/api/summary/{pid}/', HTTP_IF_MODIFIED_SINCE=res['Last-Modified']).status_code, 304)
+    @override_settings(JOB_QUEUE_MODE='eager')
+    def test_chunked_upload_resumes_and_commits(self):
+        import hashlib
+        data = (SAMPLE_CSV + ''.join(f"Valve {i},Valve,{i},1.5,60\n" for i in range(200))).encode('utf-8')
+        init = self.client.post('/api/uploads/', {'name': 'big.csv', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}, format='json')
+        self.assertEqual(init.status_code, 201)
+        url = f"/api/uploads/{init.json()['upload_id']}/"
+
+        def put(start, chunk, checksum=None):
+            return self.client.put(url, chunk, content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(chunk) - 1}/{len(data)}',
+                                   HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest())
+        self.assertEqual(put(0, data[:1000]).json()['received'], 1000)
+        self.assertEqual(put(1000, data[1000:2000], checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.client.get(url).json()['received'], 1000)
+        conflict = put(0, data[:1000])
+        self.assertEqual((conflict.status_code, conflict.json()['received']), (409, 1000))
+        self.assertEqual(self.client.post(url + 'commit/').status_code, 409)
+        # A dropped connection sends no body at all.
+        empty = self.client.put(url, b'', content_type='application/octet-stream', HTTP_CONTENT_RANGE=f'bytes 1000-1999/{len(data)}',
+                                HTTP_X_CHUNK_SHA256=hashlib.sha256(b'').hexdigest())
+        self.assertEqual((empty.status_code, empty.json()['received']), (400, 1000))
+        self.assertIn('incomplete', empty.json()['error'])
+        wrong_total = self.client.put(url, data[1000:2000], content_type='application/octet-stream',
+                                      HTTP_CONTENT_RANGE=f'bytes 1000-1999/{len(data) + 1}',
+                                      HTTP_X_CHUNK_SHA256=hashlib.sha256(data[1000:2000]).hexdigest())
+        self.assertEqual(wrong_total.status_code, 400)
+        self.assertEqual(put(1000, data[1000:]).json()['received'], len(data))
+        # Only one commit can claim the session.
+        from .models import UploadSession
+        UploadSession.objects.filter(upload_id=init.json()['upload_id']).update(status='committing')
+        self.assertEqual(self.client.post(url + 'commit/').status_code, 409)
+        UploadSession.objects.filter(upload_id=init.json()['upload_id']).update(status='open')
+        job = self.client.post(url + 'commit/', {'async': '1'}).json()
+        job = self.client.get(f"/api/jobs/{job['job_id']}/").json()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['summary']['total'], 202)
+        inst = UploadedDataset.objects.get(pk=job['result']['id'])
+        self.assertEqual(inst.content_hash, hashlib.sha256(data).hexdigest())
+        with open(inst.csv_file.path, 'rb') as fh:
+            self.assertEqual(fh.read(), data)
+        self.assertEqual(self.client.get(url).json()['status'], 'committed')
+    def test_gzip_upload_and_compressed_responses(self):
+        import gzip
+        plain = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'plain.csv'}, format='multipart').json()
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(gzip.compress(SAMPLE_CSV.encode('utf-8'))), 'name': 'packed.csv.gz'}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['summary'], plain['summary'])
+        self.assertEqual(res.json()['duplicate_of'], plain['id'])
+        other = (SAMPLE_CSV + "Pump Z,Pump,1,2,3\n").encode('utf-8')
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(gzip.compress(other)), 'name': 'other.csv.gz'}, format='multipart').json()
+        inst = UploadedDataset.objects.get(pk=res['id'])
+        self.assertEqual(inst.name, 'other.csv')
+        with open(inst.csv_file.path, 'rb') as fh:
+            self.assertEqual(fh.read(), other)
+        res = self.client.get(f"/api/datasets/{inst.id}/csv/", HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(res.streaming_content)), other)
+        bad = self.client.post('/api/upload/', {'file': io.BytesIO(b'not gzip'), 'name': 'bad.csv.gz'}, format='multipart')
+        self.assertEqual(bad.status_code, 400)
+    def test_deleting_datasets_invalidates_cached_reports_and_comparisons(self):
+        from .compare import cached_comparison, remove_comparisons
+        from .reports import cached_report, remove_reports
+        ids = [self.client.post('/api/upload/', {'file': io.BytesIO(f"{SAMPLE_CSV}Pump {i},Pump,1,1,1\n".encode('utf-8')), 'name': f'k{i}.csv'}, format='multipart').json()['id']
+               for i in range(3)]
+        for backend in ('disk', 'default'):
+            with self.settings(REPORT_CACHE=backend):
+                a, b, c = (UploadedDataset.objects.get(pk=i) for i in ids)
+                for inst in (a, b, c):
+                    cached_report(inst)
+                cached_comparison(a, b)
+                cached_comparison(b, c)
+                self.assertTrue(cached_report(a)[1] and cached_comparison(a, b)[1])
+                remove_reports([a])
+                remove_comparisons([a])
+                self.assertFalse(cached_report(a)[1])
+                self.assertFalse(cached_comparison(a, b)[1])
+                self.assertTrue(cached_report(b)[1] and cached_comparison(b, c)[1])
+    @override_settings(JOB_QUEUE_MODE='eager', PRERENDER_REPORTS=True)
+    def test_pdf_is_cached_and_supports_conditional_get(self):
+        from .reports import get_report_cache, report_key
+        pid = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'etag.csv'}, format='multipart').json()['id']
+        inst = UploadedDataset.objects.get(pk=pid)
+        self.assertIsNotNone(get_report_cache().get(report_key(inst)))
+        res = self.client.get(f'/api/generate_pdf/{pid}/')
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+        self.assertIn('Last-Modified', res)
+        res = self.client.get(f'/api/generate_pdf/{pid}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+        inst.summary_json = dict(inst.summary_json, total=3)
+        inst.save()
+        res = self.client.get(f'/api/generate_pdf/{pid}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_upload_with_named_schema(self):
+        res = self.client.get('/api/schemas/')
+        self.assertEqual(res.status_code, 200)
+        names = [s['name'] for s in res.json()['schemas']]
+        self.assertEqual(names[:2], ['equipment', 'equipment_extended'])
+        csv = ('Equipment Name,Type,Flowrate,Pressure,Temperature,Level,Vibration,Power\n'
+               'Pump A,Pump,100,2,70,55,1.2,15\nPump B,Pump,110,2.5,72,140,1.4,16\nTank C,Tank,5,1,20,80,0.1,-3\n')
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': 'ext.csv',
+                                                'schema': 'equipment_extended'}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        summary = res.json()['summary']
+        self.assertEqual(summary['out_of_range'], {'Level': 1, 'Power': 1})
+        self.assertEqual(summary['stats']['Level']['max'], 80.0)
+        self.assertEqual(summary['by_type']['Pump']['Vibration']['count'], 2)
+        pid = res.json()['id']
+        body = self.client.get(f'/api/summary/{pid}/').json()
+        self.assertEqual((body['schema'], body['units']['Power']), ('equipment_extended', 'kW'))
+        self.assertTrue(np.isnan(open_dataset(UploadedDataset.objects.get(pk=pid)).values('Level')[1]))
+        self.assertEqual(self.client.get(f'/api/generate_pdf/{pid}/').status_code, 200)
+        # The same bytes under the default schema are a different dataset, not a duplicate.
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': 'plain.csv'}, format='multipart')
+        self.assertNotIn('duplicate_of', res.json())
+        self.assertNotIn('Level', res.json()['summary']['stats'])
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'short.csv',
+                                                'schema': 'equipment_extended'}, format='multipart')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Level', res.json()['error'])
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(SAMPLE_CSV.encode('utf-8')), 'name': 'x.csv',
+                                                'schema': 'nope'}, format='multipart')
+        self.assertEqual(res.status_code, 400)
+
+
+    def test_validation_report_is_stored_and_downloadable(self):
+        csv = SAMPLE_CSV + 'Pump A,Pump,bad,2,70\nValve C,,1,x,3\nValve D,Valve,4,5,6\n'
+        res = self.client.post('/api/upload/', {'file': io.BytesIO(csv.encode('utf-8')), 'name': 'dirty.csv'}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        pid = res.json()['id']
+        report = self.client.get(f'/api/datasets/{pid}/validation/').json()
+        self.assertEqual((report['rows'], report['rows_with_errors']), (5, 2))
+        self.assertEqual(report['counts'], {'bad_numeric': {'Flowrate': 1, 'Pressure': 1},
+                                            'duplicate_name': {'Equipment Name': 1}, 'unknown_type': {'Type': 1}})
+        self.assertEqual(report['examples']['bad_numeric']['Flowrate'], [{'row': 2, 'line': 4, 'value': 'bad'}])
+        self.assertEqual(report['examples']['duplicate_name']['Equipment Name'][0]['value'], 'Pump A')
+        res = self.client.get(f'/api/datasets/{pid}/validation/', {'download': 'csv'})
+        self.assertIn('attachment', res['Content-Disposition'])
+        self.assertIn('bad_numeric,Pressure,1,5,x', res.content.decode())
+        # Datasets stored before reports existed are validated on first request.
+        UploadedDataset.objects.filter(pk=pid).update(validation={})
+        self.assertEqual(self.client.get(f'/api/datasets/{pid}/validation/').json()['counts'], report['counts'])
+
+
+class SummaryAccumulatorTest(SimpleTestCase):
+    def test_merged_partials_match_single_pass(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'Type': rng.choice(['Pump', 'Valve'], 1000),
+                           'Flowrate': rng.normal(100, 15, 1000),
+                           'Pressure': rng.normal(-2, 1, 1000),
+                           'Temperature': rng.uniform(20, 90, 1000)})
+        whole = SummaryAccumulator().update(df)
+        parts = [SummaryAccumulator().update(df.iloc[i:i + 300]).to_dict() for i in range(0, 1000, 300)]
+        merged = merge_summaries(parts)
+        self.assertEqual(merged.total, 1000)
+        self.assertEqual(merged.types, whole.types)
+        for col in ['Flowrate', 'Pressure', 'Temperature']:
+            a, b = whole.columns[col], merged.columns[col]
+            self.assertAlmostEqual(a.mean, df[col].mean())
+            self.assertAlmostEqual(b.mean, a.mean)
+            self.assertAlmostEqual(b.std, df[col].std())
+            self.assertEqual((b.min, b.max), (df[col].min(), df[col].max()))
+            median = df[col].median()
+            self.assertAlmostEqual(b.quantile(0.5), median, delta=abs(median) * 0.03)
+
+    def test_by_type_stats_match_groupby(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({'Type': rng.choice(['Pump', 'Valve', 'Mixer'], 2000),
+                           'Flowrate': rng.normal(100, 15, 2000),
+                           'Pressure': rng.normal(5, 1, 2000),
+                           'Temperature': rng.uniform(20, 90, 2000)})
+        df.loc[::7, 'Pressure'] = np.nan
+        parts = [SummaryAccumulator().update(df.iloc[i:i + 450]).to_dict() for i in range(0, 2000, 450)]
+        by_type = merge_summaries(parts).result()['by_type']
+        expected = df.groupby('Type')
+        self.assertEqual(set(by_type), set(expected.groups))
+        for name, group in expected:
+            for col in ['Flowrate', 'Pressure', 'Temperature']:
+                stats = by_type[name][col]
+                self.assertEqual(stats['count'], group[col].count())
+                self.assertAlmostEqual(stats['mean'], group[col].mean())
+                self.assertAlmostEqual(stats['std'], group[col].std())
+                self.assertEqual((stats['min'], stats['max']), (group[col].min(), group[col].max()))
+                self.assertAlmostEqual(stats['p50'], group[col].median(), delta=abs(group[col].median()) * 0.05)
+
+    def test_parser_engines_agree(self):
+        from .parsing import available_engines, read_chunks
+        csv = (SAMPLE_CSV.replace('Temperature', 'Temperature,Notes').replace('75.0', '75.0,a').replace('80.1', '80.1,b')
+               + 'Valve C,Valve,n/a,bad,,c\n,,1e3,2,3,d\n').encode('utf-8')
+        for engine in available_engines():
+            chunks = list(read_chunks(io.BytesIO(csv), 2, engine))
+            self.assertTrue(all(isinstance(c['Type'].dtype, pd.CategoricalDtype) for c in chunks))
+            df = pd.concat(chunks, ignore_index=True)
+            self.assertEqual(list(df.columns), ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+            self.assertEqual(str(df['Pressure'].dtype), 'float64')
+            np.testing.assert_array_equal(df['Flowrate'], [100.5, 120.0, np.nan, 1000.0])
+            np.testing.assert_array_equal(df['Pressure'], [2.3, 2.8, np.nan, 2.0])
+            self.assertEqual(list(df['Type'].astype(object).where(df['Type'].notna(), None)), ['Pump', 'Pump', 'Valve', None])
+        self.assertEqual(str(next(read_chunks(io.BytesIO(csv), 10, 'c', 'float32'))['Flowrate'].dtype), 'float32')
+        # Names that look like numbers stay strings, leading zeros included.
+        numeric_names = b'Equipment Name,Type,Flowrate,Pressure,Temperature\n001,Pump,1,2,3\n002,Pump,1,2,3\n1e3,Pump,1,2,3\n'
+        for engine in available_engines():
+            df = pd.concat(read_chunks(io.BytesIO(numeric_names), 2, engine), ignore_index=True)
+            self.assertEqual(list(df['Equipment Name']), ['001', '002', '1e3'])
+        # A repeated header keeps its first column under every engine, as pandas does.
+        repeated = b'Equipment Name,Type,Flowrate,Pressure,Temperature,Flowrate\nPump A,Pump,1,2,3,9\n'
+        for engine in available_engines():
+            df = pd.concat(read_chunks(io.BytesIO(repeated), 2, engine), ignore_index=True)
+            self.assertEqual(list(df.columns), ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+            self.assertEqual(list(df['Flowrate']), [1.0])
+
+    def test_vectorized_columns_and_mixed_schema_merge(self):
+        rng = np.random.default_rng(2)
+        df = pd.DataFrame({'Type': rng.choice(['Pump', 'Valve'], 500), 'Flowrate': rng.normal(100, 15, 500),
+                           'Level': rng.uniform(0, 100, 500)})
+        df.loc[::9, 'Level'] = np.nan
+        acc = SummaryAccumulator(['Flowrate', 'Level']).update(df)
+        self.assertEqual(acc.columns['Level'].count, df['Level'].count())
+        self.assertAlmostEqual(acc.columns['Level'].std, df['Level'].std())
+        self.assertEqual(acc.columns['Level'].sketch.count, df['Level'].count())
+        plain = SummaryAccumulator(['Flowrate', 'Pressure']).update(df.drop(columns='Level'))
+        merged = merge_summaries([plain.to_dict(), acc.to_dict()]).result()
+        self.assertEqual(merged['by_type']['Pump']['Flowrate']['count'], 2 * (df['Type'] == 'Pump').sum())
+        self.assertEqual(merged['by_type']['Valve']['Level']['count'], df.loc[df['Type'] == 'Valve', 'Level'].count())
+        self.assertNotIn('Pressure', merged['by_type']['Pump'])
+
+    def test_validation_report_memory_is_bounded(self):
+        from .parsing import available_engines, read_chunks
+        from .schemas import CompiledSchema, DEFAULT_COLUMNS
+        from .validation import ValidationReport
+        columns = [dict(c, values=['Pump']) if c['name'] == 'Type' else dict(c) for c in DEFAULT_COLUMNS]
+        columns[2]['max'] = 10
+        schema = CompiledSchema('strict', columns)
+        rows = ''.join(f'Same,Valve,{i + 100},junk,1\n' for i in range(5000))
+        csv = ('Equipment Name,Type,Flowrate,Pressure,Temperature\n' + rows).encode('utf-8')
+        results = []
+        for engine in available_engines():
+            report = ValidationReport(schema, sample_size=5)
+            for df in read_chunks(io.BytesIO(csv), 700, engine, schema=schema, on_invalid=report.invalid_numeric):
+                report.update(df)
+            self.assertTrue(all(len(s[1]) == 5 for s in report.samples.values()))
+            results.append(report.result())
+        result = results[0]
+        self.assertEqual((result['rows'], result['rows_with_errors']), (5000, 5000))
+        self.assertEqual(result['counts'], {'bad_numeric': {'Pressure': 5000}, 'out_of_range': {'Flowrate': 5000},
+                                            'duplicate_name': {'Equipment Name': 4999}, 'unknown_type': {'Type': 5000}})
+        lines = [e['line'] for e in result['examples']['out_of_range']['Flowrate']]
+        self.assertEqual(lines, sorted(lines))
+        self.assertTrue(all(e['value'] == e['line'] + 98 for e in result['examples']['out_of_range']['Flowrate']))
+        # Engines chunk differently, so only the exact parts of the report must agree.
+        self.assertTrue(all(r['counts'] == result['counts'] and r['rows_with_errors'] == 5000 for r in results))
@@ -0,0 +1,71 @@
+from django.conf import settings
+from .models import TrendPoint
+
+# Cross-dataset trends. Every registered dataset adds one TrendPoint per metric, overall and per Type,
+# taken from the summary that ingest already computed, so /api/trends/ reads a narrow indexed table
+# instead of loading and parsing summary_json for every upload.
+
+STAT_FIELDS = ['count', 'mean', 'std', 'min', 'max', 'p50']
+
+
+def trend_rows(summary):
+    '''(type, metric, stats) for every metric of a summary; type is '' for statistics over all rows.'''
+    for metric, st in (summary.get('stats') or {}).items():
+        yield '', metric, st
+    for type_name, columns in (summary.get('by_type') or {}).items():
+        for metric, st in columns.items():
+            yield type_name, metric, st
+
+
+def record_trends(instance):
+    '''Add a dataset's rollup rows; called once when the dataset is registered.'''
+    points = [TrendPoint(owner_id=instance.owner_id, dataset_id=instance.id, name=instance.name[:200],
+                         uploaded_at=instance.uploaded_at, type=type_name[:200], metric=metric,
+                         **{f: st.get(f) for f in STAT_FIELDS if f != 'count'}, count=st.get('count') or 0)
+              for type_name, metric, st in trend_rows(instance.summary_json or {})]
+    TrendPoint.objects.bulk_create(points, batch_size=1000)
+
+
+def trend_series(owner, metrics=None, types=None, by_type=False, since=None, until=None, from_id=None, to_id=None,
+                 limit=50):
+    '''Per-metric (and per-type) series over the owner's newest `limit` datasets in a time window or id range.
+
+    Returns {'datasets': [...], 'series': [...]}, datasets oldest first; each series holds one list per
+    statistic, aligned with datasets and None where a dataset has no rows of that type.'''
+    limit = min(limit, getattr(settings, 'MAX_TREND_DATASETS', 1000))
+    qs = TrendPoint.objects.filter(owner=owner)
+    if since is not None:
+        qs = qs.filter(uploaded_at__gte=since)
+    if until is not None:
+        qs = qs.filter(uploaded_at__lte=until)
+    if from_id is not None:
+        qs = qs.filter(dataset_id__gte=from_id)
+    if to_id is not None:
+        qs = qs.filter(dataset_id__lte=to_id)
+
+    # Every dataset has overall rows for each of its metrics, so one metric's overall rows list the datasets.
+    first = metrics[0] if metrics else qs.filter(type='').values_list('metric', flat=True).first()
+    datasets = list(qs.filter(type='', metric=first).order_by('-uploaded_at', '-dataset_id')
+                    .values('dataset_id', 'name', 'uploaded_at')[:limit])[::-1]
+    position = {d['dataset_id']: i for i, d in enumerate(datasets)}
+
+    points = qs.filter(dataset_id__in=list(position))
+    if metrics:
+        points = points.filter(metric__in=metrics)
+    if types:
+        points = points.filter(type__in=[''] + list(types))
+    elif not by_type:
+        points = points.filter(type='')
+    series = {}
+    for row in points.order_by('metric', 'type').values('dataset_id', 'type', 'metric', *STAT_FIELDS).iterator():
+        key = (row['metric'], row['type'])
+        s = series.get(key)
+        if s is None:
+            s = series[key] = dict({'metric': row['metric'], 'type': row['type'] or None},
+                                   **{f: [None] * len(datasets) for f in STAT_FIELDS})
+        i = position[row['dataset_id']]
+        for f in STAT_FIELDS:
+            s[f][i] = row[f]
+    return {'datasets': [{'id': d['dataset_id'], 'name': d['name'], 'uploaded_at': d['uploaded_at'].isoformat()}
+                         for d in datasets],
+            'series': list(series.values())}
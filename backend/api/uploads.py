@@ -0,0 +1,41 @@
+import hashlib
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin:
+    '''Computes the SHA-256 of each uploaded file while Django receives it and exposes it as file.sha256.'''
+
+    def new_file(self, *args, **kwargs):
+        self._sha = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        f = super().file_complete(file_size)
+        if f is not None:
+            f.sha256 = self._sha.hexdigest()
+        return f
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_hash(file):
+    '''SHA-256 of an uploaded file, computed by the upload handler when available.'''
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    file.seek(0)
+    for block in file.chunks():
+        sha.update(block)
+    file.seek(0)
+    return sha.hexdigest()
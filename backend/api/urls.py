@@ -3,7 +3,20 @@ from . import views
 urlpatterns = [
     path('register/', views.register, name='register'),
     path('upload/', views.upload_csv, name='upload_csv'),
+    path('upload_batch/', views.upload_batch, name='upload_batch'),
+    path('uploads/', views.upload_init, name='upload_init'),
+    path('uploads/<str:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<str:upload_id>/commit/', views.upload_commit, name='upload_commit'),
+    path('schemas/', views.schemas, name='schemas'),
     path('history/', views.history, name='history'),
     path('summary/<int:pk>/', views.get_summary, name='get_summary'),
+    path('trends/', views.trends, name='trends'),
+    path('compare/', views.compare, name='compare'),
+    path('jobs/<int:pk>/', views.job_status, name='job_status'),
+    path('datasets/<int:pk>/rows/', views.dataset_rows, name='dataset_rows'),
+    path('datasets/<int:pk>/csv/', views.dataset_csv, name='dataset_csv'),
+    path('datasets/<int:pk>/anomalies/', views.dataset_anomalies, name='dataset_anomalies'),
+    path('datasets/<int:pk>/validation/', views.dataset_validation, name='dataset_validation'),
     path('generate_pdf/<int:pk>/', views.generate_pdf, name='generate_pdf'),
+    path('metrics/', views.prometheus_metrics, name='metrics'),
 ]
@@ -0,0 +1,187 @@
+import csv
+import io
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+# Row-level validation of an upload, collected in the same pass as the summary. Every check is a boolean
+# mask over a whole chunk:
+#   bad_numeric     a numeric cell that is present but not a number (reported by the parser, api/parsing.py)
+#   out_of_range    a number outside its column's schema range (blanked before it is summarized)
+#   duplicate_name  an Equipment Name seen earlier in the file
+#   unknown_type    a missing Type, or one outside the schema's allowed values when the schema lists them
+# Counts are exact. Examples are a uniform sample of VALIDATION_SAMPLE_SIZE per check and column, kept
+# by giving every flagged cell a random key and retaining the smallest keys, so a chunk costs one
+# argpartition over its flagged cells and the report never grows with the number of bad rows. The only
+# per-row state is the 8-byte hash of each distinct name, needed to find duplicates across chunks.
+
+VALIDATION_VERSION = 1
+KINDS = ('bad_numeric', 'out_of_range', 'duplicate_name', 'unknown_type')
+KEY = 'Equipment Name'
+
+
+class _SeenHashes:
+    '''Set of uint64 hashes as a few sorted runs; a run is merged into the one before it once it is at
+    least half that size, so there are O(log n) runs and every hash is merged O(log n) times.'''
+
+    def __init__(self):
+        self.runs = []
+
+    def contains(self, hashes):
+        '''Membership of sorted hashes (sorted queries keep searchsorted cache-friendly).'''
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[pos] == hashes
+        return found
+
+    def add(self, hashes):
+        '''Add sorted hashes that are distinct and not yet in the set.'''
+        if not len(hashes):
+            return
+        self.runs.append(hashes)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            # Runs are disjoint and sorted, so a stable sort of the two is a linear merge.
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]), kind='stable')
+
+
+def _json_value(v):
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+
+class ValidationReport:
+    '''Accumulates the validation report of one file, chunk by chunk.
+
+    Pass invalid_numeric as read_chunks(on_invalid=...), then call update() with each chunk it yields.'''
+
+    def __init__(self, schema, sample_size=None, seed=0):
+        self.schema = schema
+        self.sample_size = getattr(settings, 'VALIDATION_SAMPLE_SIZE', 20) if sample_size is None else sample_size
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.rows_with_errors = 0
+        self.counts = {}    # (kind, column) -> flagged cells
+        self.samples = {}   # (kind, column) -> (keys, rows, values) of the retained examples
+        self._pending = []
+        self._names = _SeenHashes()
+
+    def invalid_numeric(self, column, mask, raw):
+        self._pending.append((column, mask, raw))
+
+    def _add(self, kind, column, mask, values):
+        idx = np.flatnonzero(mask)
+        if not len(idx):
+            return
+        key = (kind, column)
+        self.counts[key] = self.counts.get(key, 0) + len(idx)
+        keys = self.rng.random(len(idx))
+        old_keys, old_rows, old_values = self.samples.get(key, (np.zeros(0), np.zeros(0, dtype=np.int64), []))
+        if len(old_keys) >= self.sample_size:
+            keep = np.flatnonzero(keys < old_keys.max())
+            idx, keys = idx[keep], keys[keep]
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size - 1)[:self.sample_size]
+            idx, keys = idx[keep], keys[keep]
+        if not len(idx) and key in self.samples:
+            return
+        new_values = (values.iloc[idx] if hasattr(values, 'iloc') else values[idx]).tolist()
+        keys = np.concatenate([old_keys, keys])
+        rows = np.concatenate([old_rows, self.rows + idx])
+        kept = list(old_values) + new_values
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size - 1)[:self.sample_size]
+            keys, rows, kept = keys[keep], rows[keep], [kept[i] for i in keep.tolist()]
+        self.samples[key] = (keys, rows, kept)
+
+    def update(self, df, range_mask=None):
+        '''Check one parsed chunk; range_mask is schema.range_mask(df) when the caller already has it.'''
+        n = len(df)
+        flagged = np.zeros(n, dtype=bool)
+        for column, mask, raw in self._pending:
+            self._add('bad_numeric', column, mask, raw)
+            flagged |= mask
+        self._pending = []
+
+        cols, bad = range_mask or self.schema.range_mask(df)
+        if bad.any():
+            for k in np.flatnonzero(bad.any(axis=0)).tolist():
+                self._add('out_of_range', cols[k], bad[:, k], df[cols[k]])
+            flagged |= bad.any(axis=1)
+
+        if KEY in df.columns and n:
+            names = df[KEY]
+            present = names.notna().to_numpy() & (names != '').to_numpy(dtype=bool, na_value=False)
+            hashes = pd.util.hash_pandas_object(names, index=False, categorize=False).to_numpy()
+            rows = np.flatnonzero(present)
+            order = rows[np.argsort(hashes[rows], kind='stable')]
+            ordered = hashes[order]
+            # In hash order (ties in row order) a row repeats a name if it equals its predecessor.
+            repeat = np.r_[False, ordered[1:] == ordered[:-1]] | self._names.contains(ordered)
+            dup = np.zeros(n, dtype=bool)
+            dup[order[repeat]] = True
+            self._names.add(ordered[~repeat])
+            self._add('duplicate_name', KEY, dup, names)
+            flagged |= dup
+
+        if 'Type' in df.columns and n:
+            types = df['Type']
+            raw = types.astype(object)
+            unknown = types.isna().to_numpy() | (raw == '').to_numpy(dtype=bool)
+            allowed = self.schema.allowed.get('Type')
+            if allowed is not None:
+                if isinstance(types.dtype, pd.CategoricalDtype):
+                    ok = np.append(types.cat.categories.isin(allowed), False)
+                    unknown |= ~ok[types.cat.codes.to_numpy()]
+                else:
+                    unknown |= ~types.isin(allowed).to_numpy()
+            self._add('unknown_type', 'Type', unknown, raw)
+            flagged |= unknown
+
+        self.rows += n
+        self.rows_with_errors += int(flagged.sum())
+        return self
+
+    def result(self):
+        counts, examples = {}, {}
+        for (kind, column), count in self.counts.items():
+            counts.setdefault(kind, {})[column] = count
+            _, rows, values = self.samples[(kind, column)]
+            order = np.argsort(rows, kind='stable').tolist()
+            examples.setdefault(kind, {})[column] = [
+                {'row': int(rows[i]), 'line': int(rows[i]) + 2, 'value': _json_value(values[i])} for i in order]
+        return {'version': VALIDATION_VERSION, 'schema': self.schema.name, 'rows': self.rows,
+                'rows_with_errors': self.rows_with_errors, 'sample_size': self.sample_size,
+                'counts': {k: counts[k] for k in KINDS if k in counts},
+                'examples': {k: examples[k] for k in KINDS if k in examples}}
+
+
+def validate_stored(inst):
+    '''Build, store and return the report of a dataset uploaded before reports were collected.'''
+    from .ingest import iter_chunks  # ingest imports this module
+    from .schemas import dataset_schema
+    schema = dataset_schema(inst)
+    report = ValidationReport(schema)
+    with open(inst.csv_file.path, 'rb') as fh:
+        for df in iter_chunks(fh, schema=schema, on_invalid=report.invalid_numeric):
+            report.update(df)
+    inst.validation = report.result()
+    inst.save(update_fields=['validation'])
+    return inst.validation
+
+
+def report_csv(report):
+    '''The report's counts and examples as CSV text: one line per example, plus the exact count per check.'''
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['check', 'column', 'count', 'line', 'value'])
+    for kind, columns in report.get('counts', {}).items():
+        for column, count in columns.items():
+            shown = report.get('examples', {}).get(kind, {}).get(column, [])
+            for example in shown:
+                writer.writerow([kind, column, count, example['line'], '' if example['value'] is None else example['value']])
+            if not shown:
+                writer.writerow([kind, column, count, '', ''])
+    return out.getvalue()
@@ -1,41 +1,58 @@
-import io, os, pandas as pd, csv
+import io, os, re, hashlib, hmac, json, datetime
 from django.conf import settings
 from django.http import JsonResponse, FileResponse
+from rest_framework import status
 from rest_framework.decorators import api_view, parser_classes, permission_classes, authentication_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from .models import UploadedDataset
 from .serializers import UploadedDatasetSerializer
 from django.shortcuts import get_object_or_404
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from django.core.files.base import ContentFile
-
-REQUIRED_COLUMNS = ['Equipment Name','Type','Flowrate','Pressure','Temperature']
-
-def compute_summary(df):
-
-    total = len(df)
-    numeric = df.select_dtypes(include='number')
-    averages = numeric.mean().to_dict()
-    type_dist = df['Type'].value_counts().to_dict() if 'Type' in df.columns else {}
-    return {'total': total, 'averages': averages, 'type_distribution': type_dist}
-
-def cleanup_old_files():
-
-    qs = UploadedDataset.objects.all().order_by('-uploaded_at')
-    keep = list(qs[:5])
-    remove = qs[5:]
-    for inst in remove:
-        try:
-           
-            path = inst.csv_file.path
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            pass
-        inst.delete()
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .ingest import (CSV_NAME_ERROR, IngestError, find_duplicate, ingest_batch,
+                     ingest_upload, is_csv_name, open_dataset, register_duplicate, register_or_reuse, split_compression,
+                     stage_upload)
+from .jobs import completed_job, enqueue, prerender_report
+from .uploads import content_hash
+from .columnar import select_rows
+from .reports import cached_report, report_key
+from .catalog import history_page
+from .trends import trend_series
+from .anomalies import record_anomalies
+from .compare import KEY as COMPARE_KEY, cached_comparison
+from . import metrics
+from django.http import HttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from .models import Anomaly, Job, UploadSession
+from .chunked import OffsetMismatch, claim_session, commit_session, create_session, write_chunk
+from .schemas import UnknownSchema, dataset_schema, get_schema, list_schemas
+from .validation import report_csv, validate_stored
+
+
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _not_modified(request, etag, last_modified):
+    '''304 response when the client's validators still match, else None.'''
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        _with_validators(response, etag, last_modified)
+    return response
+
+def _wants_async(request):
+    value = request.query_params.get('async') or request.data.get('async') or ''
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def _upload_schema(request):
+    '''Schema named by the upload's schema parameter (the built-in default when absent); raises UnknownSchema.'''
+    return get_schema(request.query_params.get('schema') or request.data.get('schema') or None)
 
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
@@ -47,111 +64,367 @@ def upload_csv(request):
     if not file:
         return JsonResponse({'error':'No file uploaded'}, status=400)
 
-    max_size = getattr(settings, 'MAX_UPLOAD_SIZE', 5*1024*1024)
+    max_size = getattr(settings, 'MAX_UPLOAD_SIZE', 500*1024*1024)
     if file.size > max_size:
         return JsonResponse({'error': f'File too large. Max allowed size is {max_size} bytes.'}, status=400)
    
-    if not name.lower().endswith('.csv'):
-        return JsonResponse({'error':'Only CSV files are allowed (filename must end with .csv).'}, status=400)
+    if not is_csv_name(name):
+        return JsonResponse({'error': CSV_NAME_ERROR}, status=400)
     try:
-     
-        file.seek(0)
-        df = pd.read_csv(file)
-    except Exception as e:
-        return JsonResponse({'error': 'Failed to parse CSV: ' + str(e)}, status=400)
-   
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    if missing:
-        return JsonResponse({'error': f'Missing required columns: {missing}'}, status=400)
-    
-    for col in ['Flowrate','Pressure','Temperature']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        if df[col].isna().all():
-            return JsonResponse({'error': f'Column {col} must contain numeric values.'}, status=400)
-   
-    file.seek(0)
-    instance = UploadedDataset.objects.create(name=name)
-    instance.csv_file.save(name, ContentFile(file.read()))
-   
-    path = instance.csv_file.path
-    df = pd.read_csv(path)
-    summary = compute_summary(df)
-    instance.summary_json = summary
-    instance.save()
-   
-    cleanup_old_files()
-    return JsonResponse({'id': instance.id, 'summary': summary})
+        schema = _upload_schema(request)
+    except UnknownSchema as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    # Compressed uploads are deduplicated on their decompressed bytes, which are only seen while parsing.
+    compressed = split_compression(name)[1] is not None
+    with metrics.span('hash'):
+        digest = '' if compressed else content_hash(file)
+    source = None if compressed else find_duplicate(digest, request.user, schema)
+    if source is not None:
+        instance = register_duplicate(name, source)
+        result = {'id': instance.id, 'summary': instance.summary_json, 'duplicate_of': source.id}
+        if _wants_async(request):
+            job = completed_job('ingest', instance, result)
+            return JsonResponse({'job_id': job.id, 'status': job.status}, status=202)
+        return JsonResponse(result)
+
+    if _wants_async(request):
+        job = enqueue('ingest', owner=request.user, name=split_compression(name)[0], storage_name=stage_upload(file, name),
+                      content_hash=digest, schema=schema.id)
+        return JsonResponse({'job_id': job.id, 'status': job.status}, status=202)
+    sha = hashlib.sha256() if compressed else None
+    try:
+        storage_name, acc = ingest_upload(file, name, hasher=sha, schema=schema)
+    except IngestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    with metrics.span('register'):
+        instance, source = register_or_reuse(split_compression(name)[0], storage_name, acc, digest or sha.hexdigest(),
+                                             request.user, schema)
+    result = {'id': instance.id, 'summary': instance.summary_json}
+    if source is not None:
+        result['duplicate_of'] = source.id
+    else:
+        prerender_report(instance)
+    return JsonResponse(result)
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def upload_batch(request):
+    files = request.FILES.getlist('files') + request.FILES.getlist('file')
+    if not files:
+        return JsonResponse({'error': 'No files uploaded'}, status=400)
+    try:
+        results, created, combined = ingest_batch(files, request.user, schema=_upload_schema(request))
+    except (IngestError, UnknownSchema) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    for instance in created:
+        prerender_report(instance)
+    ok = [r for r in results if 'error' not in r]
+    code = status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST
+    return JsonResponse({'count': len(ok), 'failed': len(results) - len(ok), 'results': results,
+                         'combined': combined.result() if ok else None}, status=code)
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def upload_init(request):
+    name = os.path.basename(str(request.data.get('name') or ''))
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'size must be the file size in bytes'}, status=400)
+    try:
+        session = create_session(name, size, request.data.get('sha256') or '', request.user, _upload_schema(request))
+    except (IngestError, UnknownSchema) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    body = session.as_dict()
+    body['chunk_size'] = getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    return JsonResponse(body, status=201)
+
+@api_view(['GET', 'PUT'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id):
+    session = get_object_or_404(UploadSession, upload_id=upload_id, owner=request.user)
+    if request.method == 'GET':
+        return JsonResponse(session.as_dict())
+    match = CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+    checksum = request.headers.get('X-Chunk-SHA256', '')
+    if not match or not checksum:
+        return JsonResponse({'error': 'Chunks need a Content-Range: bytes <start>-<end>/<size> and an X-Chunk-SHA256 header'}, status=400)
+    offset, end = int(match.group(1)), int(match.group(2))
+    if match.group(3) != '*' and int(match.group(3)) != session.size:
+        return JsonResponse({'error': f'Content-Range size must be {session.size}', 'received': session.received}, status=400)
+    try:
+        received = write_chunk(session, offset, request.stream, end - offset + 1, checksum)
+    except OffsetMismatch as e:
+        return JsonResponse({'error': str(e), 'received': e.received}, status=409)
+    except IngestError as e:
+        return JsonResponse({'error': str(e), 'received': session.received}, status=400)
+    return JsonResponse({'upload_id': session.upload_id, 'received': received, 'size': session.size})
+
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def upload_commit(request, upload_id):
+    session = get_object_or_404(UploadSession, upload_id=upload_id, owner=request.user)
+    if not claim_session(session):
+        return JsonResponse(dict(session.as_dict(), error='Upload is not complete or was already committed.'), status=409)
+    if _wants_async(request):
+        job = enqueue('commit_upload', owner=request.user, upload_id=session.upload_id)
+        return JsonResponse({'job_id': job.id, 'status': job.status}, status=202)
+    try:
+        instance, source = commit_session(session)
+    except IngestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result = {'id': instance.id, 'summary': instance.summary_json}
+    if source is not None:
+        result['duplicate_of'] = source.id
+    else:
+        prerender_report(instance)
+    return JsonResponse(result)
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def history(request):
-    qs = UploadedDataset.objects.all().order_by('-uploaded_at')[:5]
-    serializer = UploadedDatasetSerializer(qs, many=True)
-    return JsonResponse(serializer.data, safe=False)
+    '''Newest datasets first; the next page, if any, is linked in the Link header (rel="next").'''
+    params = request.query_params
+    try:
+        limit = min(max(int(params.get('limit', 5)), 1), getattr(settings, 'MAX_HISTORY_PAGE', 100))
+        items, cursor = history_page(UploadedDataset.objects.filter(owner=request.user), params.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number and cursor a value from a previous Link header'}, status=400)
+    response = JsonResponse(UploadedDatasetSerializer(items, many=True).data, safe=False)
+    if cursor:
+        response['Link'] = '<%s>; rel="next"' % request.build_absolute_uri(f'?limit={limit}&cursor={cursor}')
+    return response
+
+def _parse_when(value, end=False):
+    '''Datetime from an ISO datetime or date (a date covers its whole day); None if value is empty.'''
+    if not value:
+        return None
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        when = datetime.datetime.combine(day, datetime.time.max if end else datetime.time.min)
+    return timezone.make_aware(when) if timezone.is_naive(when) else when
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def trends(request):
+    '''Per-metric, optionally per-type, statistics across the caller's datasets, oldest first.
+
+    metric and type may be repeated or comma-separated; by_type=1 returns every type. The range is
+    since/until (ISO dates or datetimes) and/or from_id/to_id, capped at the newest limit datasets.'''
+    params = request.query_params
+    split = lambda name: [v.strip() for raw in params.getlist(name) for v in raw.split(',') if v.strip()]
+    try:
+        body = trend_series(request.user, metrics=split('metric'), types=split('type'),
+                            by_type=str(params.get('by_type', '')).lower() in ('1', 'true', 'yes'),
+                            since=_parse_when(params.get('since')), until=_parse_when(params.get('until'), end=True),
+                            from_id=int(params['from_id']) if params.get('from_id') else None,
+                            to_id=int(params['to_id']) if params.get('to_id') else None,
+                            limit=max(int(params.get('limit', 50)), 1))
+    except ValueError:
+        return JsonResponse({'error': 'since/until must be ISO dates or datetimes and from_id, to_id and limit numbers'}, status=400)
+    return JsonResponse(body)
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def compare(request):
+    params = request.query_params
+    try:
+        a_id, b_id = int(params['a']), int(params['b'])
+        limit = min(max(int(params.get('limit', 100)), 0), getattr(settings, 'COMPARE_MAX_ITEMS', 1000))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'a and b must be dataset ids and limit a number'}, status=400)
+    a = get_object_or_404(UploadedDataset, pk=a_id, owner=request.user)
+    b = get_object_or_404(UploadedDataset, pk=b_id, owner=request.user)
+    for inst in (a, b):
+        if not inst.csv_file or not os.path.exists(inst.csv_file.path):
+            return JsonResponse({'error': f'The stored file for dataset {inst.id} is no longer available.'}, status=404)
+    if any(COMPARE_KEY not in open_dataset(inst).specs for inst in (a, b)):
+        return JsonResponse({'error': f'Both datasets need a {COMPARE_KEY} column'}, status=400)
+    result, _ = cached_comparison(a, b)
+    for k in ('added', 'removed', 'changed'):
+        result[k] = result[k][:limit]
+    body = dict({'a': {'id': a.id, 'name': a.name}, 'b': {'id': b.id, 'name': b.name}, 'limit': limit}, **result)
+    return JsonResponse(body)
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_summary(request, pk):
-    inst = get_object_or_404(UploadedDataset, pk=pk)
-    return JsonResponse({'id':inst.id,'name':inst.name,'summary':inst.summary_json})
+    inst = get_object_or_404(UploadedDataset, pk=pk, owner=request.user)
+    schema = dataset_schema(inst)
+    body = {'id':inst.id,'name':inst.name,'schema':schema.name,'units':schema.units,'summary':inst.summary_json}
+    etag = '"summary-%s"' % hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+    last_modified = int(inst.uploaded_at.timestamp())
+    return _not_modified(request, etag, last_modified) or _with_validators(JsonResponse(body), etag, last_modified)
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def dataset_csv(request, pk):
+    inst = get_object_or_404(UploadedDataset, pk=pk, owner=request.user)
+    if not inst.csv_file or not os.path.exists(inst.csv_file.path):
+        return JsonResponse({'error': 'The stored file for this dataset is no longer available.'}, status=404)
+    etag = f'"{inst.content_hash}"' if inst.content_hash else f'"csv-{inst.id}-{int(inst.uploaded_at.timestamp())}"'
+    last_modified = int(inst.uploaded_at.timestamp())
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    response = FileResponse(open(inst.csv_file.path, 'rb'), as_attachment=True, filename=os.path.basename(inst.name) or f'dataset_{inst.id}.csv',
+                            content_type='text/csv')
+    return _with_validators(response, etag, last_modified)
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def schemas(request):
+    return JsonResponse({'default': get_schema().name, 'schemas': [s.as_dict() for s in list_schemas()]})
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def job_status(request, pk):
+    job = get_object_or_404(Job, pk=pk, owner=request.user)
+    return JsonResponse(job.as_dict())
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def dataset_rows(request, pk):
+    inst = get_object_or_404(UploadedDataset, pk=pk, owner=request.user)
+    missing = JsonResponse({'error': 'The stored file for this dataset is no longer available.'}, status=404)
+    try:
+        ds = open_dataset(inst)
+    except FileNotFoundError:
+        return missing
+    params = request.query_params
+    max_rows = getattr(settings, 'MAX_PAGE_ROWS', 1000)
+    try:
+        offset = max(int(params.get('offset', 0)), 0)
+        limit = min(max(int(params.get('limit', 100)), 1), max_rows)
+        ranges = {}
+        for col in ds.columns:
+            lo, hi = params.get(f'min_{col}'), params.get(f'max_{col}')
+            if ds.kind(col) == 'float' and (lo is not None or hi is not None):
+                ranges[col] = (float(lo) if lo is not None else None, float(hi) if hi is not None else None)
+    except ValueError:
+        return JsonResponse({'error': 'offset, limit and min_/max_ filters must be numbers'}, status=400)
+
+    columns = [c.strip() for c in params['columns'].split(',')] if params.get('columns') else ds.columns
+    sort = params.get('sort') or None
+    descending = bool(sort) and sort.startswith('-')
+    if sort:
+        sort = sort[1:] if descending else sort
+    unknown = [c for c in columns + ([sort] if sort else []) if c not in ds.specs]
+    if unknown:
+        return JsonResponse({'error': f'Unknown columns: {unknown}'}, status=400)
+    types = [t for v in params.getlist('type') for t in v.split(',') if t]
+
+    try:
+        page, total = select_rows(ds, types=types, ranges=ranges, sort=sort, descending=descending, offset=offset, limit=limit)
+        frame = ds.take(page, columns).astype(object)
+    except FileNotFoundError:
+        return missing
+    rows = frame.where(frame.notna(), None).values.tolist()
+    return JsonResponse({'id': inst.id, 'total': total, 'offset': offset, 'limit': limit, 'columns': columns, 'rows': rows})
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def dataset_anomalies(request, pk):
+    inst = get_object_or_404(UploadedDataset, pk=pk, owner=request.user)
+    params = request.query_params
+    try:
+        offset = max(int(params.get('offset', 0)), 0)
+        limit = min(max(int(params.get('limit', 100)), 1), getattr(settings, 'MAX_PAGE_ROWS', 1000))
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be numbers'}, status=400)
+    if not inst.anomalies_scored:
+        record_anomalies(inst, open_dataset(inst))
+    qs = Anomaly.objects.filter(dataset=inst)
+    if params.get('metric'):
+        qs = qs.filter(metric=params['metric'])
+    types = [t for v in params.getlist('type') for t in v.split(',') if t]
+    if types:
+        qs = qs.filter(type__in=types)
+    rows = [a.as_dict() for a in qs.order_by('-score', 'id')[offset:offset + limit]]
+    return JsonResponse({'id': inst.id, 'total': qs.count(), 'offset': offset, 'limit': limit, 'anomalies': rows})
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def dataset_validation(request, pk):
+    '''The dataset's row-level validation report; ?download=csv returns it as a CSV attachment.'''
+    inst = get_object_or_404(UploadedDataset, pk=pk, owner=request.user)
+    report = inst.validation or validate_stored(inst)
+    if request.query_params.get('download') == 'csv':
+        response = HttpResponse(report_csv(report), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="validation_{inst.id}.csv"'
+        return response
+    return JsonResponse(dict(report, id=inst.id))
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def generate_pdf(request, pk):
-    inst = get_object_or_404(UploadedDataset, pk=pk)
-  
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.setFont('Helvetica', 12)
-    
-    p.setFont('Helvetica-Bold', 14)
-    p.drawString(30,750, f"Report for: {inst.name}")
-    p.setFont('Helvetica', 11)
-    p.drawString(30,735, f"Uploaded at: {inst.uploaded_at}")
-    y = 710
-    p.drawString(30,730, f"Uploaded at: {inst.uploaded_at}")
-    summary = inst.summary_json or {}
-    p.drawString(30,y, 'Summary:')
-    y -= 16
-    totals = summary.get('total')
-    if totals is not None:
-        p.drawString(40,y, f"Total rows: {totals}")
-        y -= 14
-  
-    avgs = summary.get('averages', {})
-    if avgs:
-        p.drawString(40,y, 'Averages:')
-        y -= 14
-        for k,v in avgs.items():
-            p.drawString(48,y, f"{k}")
-            p.drawRightString(550, y, f"{v}")
-            y -= 14
-            if y < 100:
-                p.showPage(); p.setFont('Helvetica',11); y = 750
-   
-    td = summary.get('type_distribution', {})
-    if td:
-        p.drawString(40,y, 'Type distribution:')
-        y -= 14
-        for k,v in td.items():
-            p.drawString(48,y, f"{k}")
-            p.drawRightString(550, y, f"{v}")
-            y -= 14
-            if y < 100:
-                p.showPage(); p.setFont('Helvetica',11); y = 750
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=f'report_{inst.id}.pdf')
+    inst = get_object_or_404(UploadedDataset, pk=pk, owner=request.user)
+    if _wants_async(request):
+        job = enqueue('report', dataset=inst, owner=request.user, dataset_id=inst.id)
+        return JsonResponse({'job_id': job.id, 'status': job.status}, status=202)
+
+    etag = f'"{report_key(inst)}"'
+    last_modified = int(inst.uploaded_at.timestamp())
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    data, _ = cached_report(inst)
+    response = FileResponse(io.BytesIO(data), as_attachment=True, filename=f'report_{inst.id}.pdf')
+    return _with_validators(response, etag, last_modified)
+
+def _metrics_allowed(request):
+    '''Local scrapers and staff tokens may read the metrics; anyone may when METRICS_PUBLIC is set.
+
+    A loopback address only counts without forwarding headers: behind a reverse proxy on the same host
+    every request arrives from 127.0.0.1.'''
+    if getattr(settings, 'METRICS_PUBLIC', False):
+        return True
+    forwarded = 'HTTP_X_FORWARDED_FOR' in request.META or 'HTTP_FORWARDED' in request.META
+    if not forwarded and request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1'):
+        return True
+    try:
+        auth = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return auth is not None and auth[0].is_staff
+
+
+def prometheus_metrics(request):
+    '''Prometheus scrape target. With METRICS_TOKEN set it needs "Authorization: Bearer <token>"; otherwise
+    it answers local requests and staff tokens only, unless METRICS_PUBLIC opens it.'''
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return JsonResponse({'error': 'Invalid metrics token'}, status=401)
+    if not token and not _metrics_allowed(request):
+        return JsonResponse({'error': 'Metrics are only served to local scrapers and staff'}, status=403)
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
-from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 
 @api_view(['POST'])
@@ -32,7 +32,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so request timings and Server-Timing cover every other middleware.
+    'api.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Compresses responses (zstd or gzip, by Accept-Encoding); must wrap everything that touches the body.
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -104,7 +108,85 @@ REST_FRAMEWORK = {
     ]
 }
 
-MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 5 * 1024 * 1024))
+# Hash uploads while they stream in so duplicates can be detected without another read.
+FILE_UPLOAD_HANDLERS = [
+    'api.uploads.HashingMemoryFileUploadHandler',
+    'api.uploads.HashingTemporaryFileUploadHandler',
+]
+
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 500 * 1024 * 1024))
+# Upper bound on what a .csv.gz/.csv.zst upload may expand to while it is decompressed.
+MAX_DECOMPRESSED_SIZE = int(os.environ.get('MAX_DECOMPRESSED_SIZE', 5 * 1024 ** 3))
+# Rows per chunk for the streaming CSV ingest; bounds peak memory per upload.
+INGEST_CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 50000))
+# CSV parser engine for ingest: 'c' (pandas), 'pyarrow' (multithreaded, needs the pyarrow package) or 'auto'
+# (pyarrow when installed); numeric columns are parsed as CSV_FLOAT_DTYPE ('float64' or 'float32').
+CSV_ENGINE = os.environ.get('CSV_ENGINE', 'auto')
+CSV_FLOAT_DTYPE = os.environ.get('CSV_FLOAT_DTYPE', 'float64')
+# Seconds a compiled upload schema (api.Schema) is reused before it is reloaded; saves in this process reload at once.
+SCHEMA_CACHE_SECONDS = int(os.environ.get('SCHEMA_CACHE_SECONDS', 60))
+# Examples kept per check and column in a dataset's validation report (counts are always exact).
+VALIDATION_SAMPLE_SIZE = int(os.environ.get('VALIDATION_SAMPLE_SIZE', 20))
+# Batch uploads: files per request, and processes parsing them in parallel (1 parses inline).
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 100))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+# How batch parsing workers are started: 'forkserver' or 'spawn'; empty picks forkserver where the platform has it.
+# 'fork' is accepted but unsafe in threaded servers with open database connections.
+BATCH_START_METHOD = os.environ.get('BATCH_START_METHOD', '')
+# Chunked uploads (/api/uploads/): largest file, suggested and largest chunk, and how long an idle
+# upload can be resumed before its partial file is deleted.
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 20 * 1024 ** 3))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_CHUNK_MAX = int(os.environ.get('UPLOAD_CHUNK_MAX', 64 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
+# Background jobs: 'thread' runs them in an in-process pool, 'db' leaves them for
+# `manage.py run_jobs` worker processes, 'eager' runs them inline (tests).
+JOB_QUEUE_MODE = os.environ.get('JOB_QUEUE_MODE', 'thread')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 2))
+# Rendered PDF reports and dataset comparisons: 'disk' (MEDIA_ROOT/reports, MEDIA_ROOT/compare) or the alias
+# of a Django cache in CACHES. A Django cache cannot delete by dataset, so deleting a dataset only invalidates
+# its entries (through a per-dataset generation key) and the backend's own eviction reclaims the space.
+REPORT_CACHE = os.environ.get('REPORT_CACHE', 'disk')
+# Render the report in the background as soon as a dataset is ingested.
+PRERENDER_REPORTS = os.environ.get('PRERENDER_REPORTS', 'False').lower() in ('1', 'true', 'yes')
+# Largest page /api/datasets/<pk>/rows/ will return.
+MAX_PAGE_ROWS = int(os.environ.get('MAX_PAGE_ROWS', 1000))
+# Most datasets one /api/trends/ response covers.
+MAX_TREND_DATASETS = int(os.environ.get('MAX_TREND_DATASETS', 1000))
+# Per-Type anomaly scoring at ingest (api/anomalies.py): thresholds for the z-score, IQR fence and modified
+# z-score tests, how many must agree to flag a value, smallest Type that is scored, and most values stored.
+ANOMALY_Z = float(os.environ.get('ANOMALY_Z', 3.0))
+ANOMALY_IQR_K = float(os.environ.get('ANOMALY_IQR_K', 1.5))
+ANOMALY_MAD = float(os.environ.get('ANOMALY_MAD', 3.5))
+ANOMALY_MIN_METHODS = int(os.environ.get('ANOMALY_MIN_METHODS', 2))
+ANOMALY_MIN_GROUP = int(os.environ.get('ANOMALY_MIN_GROUP', 5))
+ANOMALY_MAX_ROWS = int(os.environ.get('ANOMALY_MAX_ROWS', 10000))
+# /api/metrics/ (Prometheus text): with METRICS_TOKEN set scrapers send it as a Bearer token; without one it
+# only answers direct (unproxied) requests from localhost and staff users' API tokens, unless METRICS_PUBLIC opens it to everyone.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'False').lower() in ('1', 'true', 'yes')
+# Opt-in sampling profiler: sample each request's stack every PROFILE_SAMPLE_INTERVAL seconds and write
+# collapsed stacks (flamegraph input) to PROFILE_DIR (MEDIA_ROOT/profiles) for requests slower than PROFILE_SLOW_MS.
+PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS', 'False').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', 1000))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+# Most added/removed/changed entries kept per list in a cached /api/compare/ result (counts stay exact).
+COMPARE_MAX_ITEMS = int(os.environ.get('COMPARE_MAX_ITEMS', 1000))
+# Largest page of /api/history/.
+MAX_HISTORY_PAGE = int(os.environ.get('MAX_HISTORY_PAGE', 100))
+# Dataset retention, enforced by a background 'sweep' job queued at most every RETENTION_SWEEP_INTERVAL
+# seconds after uploads (and by idle `run_jobs` workers): keep at most RETENTION_MAX_DATASETS datasets,
+# none older than RETENTION_MAX_AGE_DAYS, and at most RETENTION_MAX_BYTES of stored CSV. 0 disables a limit.
+RETENTION_MAX_DATASETS = int(os.environ.get('RETENTION_MAX_DATASETS', 5))
+RETENTION_MAX_AGE_DAYS = int(os.environ.get('RETENTION_MAX_AGE_DAYS', 0))
+RETENTION_MAX_BYTES = int(os.environ.get('RETENTION_MAX_BYTES', 0))
+RETENTION_SWEEP_INTERVAL = int(os.environ.get('RETENTION_SWEEP_INTERVAL', 60))
+# A queued or running sweep with no progress for this many seconds is treated as lost and replaced.
+RETENTION_SWEEP_STALE = int(os.environ.get('RETENTION_SWEEP_STALE', 3600))
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 500))
+# Username that receives datasets uploaded before datasets had owners (the first superuser when empty).
+LEGACY_DATASET_OWNER = os.environ.get('LEGACY_DATASET_OWNER', '')
 
 CORS_ALLOW_ALL_ORIGINS = os.environ.get('CORS_ALLOW_ALL_ORIGINS', 'True').lower() in ('1', 'true', 'yes')
 
@@ -0,0 +1,88 @@
+'''Compare CSV parser engines on a synthetic dataset: parse time, throughput, peak RSS and chunk memory.
+
+    python -m benchmarks.bench_parse --rows 1000000 --types 500 --dirty 0.01 --output parse.json
+
+"legacy" is the untyped parse ingest used before api/parsing.py (pd.read_csv with type inference, then
+pd.to_numeric per column); the others are read_chunks() per engine and float dtype. "ingest" rows run the
+full ingest_csv pass (parse + summary) with that engine.
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks.suite import Measure  # sets up Django
+
+import pandas as pd
+from django.test.utils import override_settings
+
+from api.ingest import ingest_csv
+from api.parsing import available_engines, read_chunks
+from api.summary import NUMERIC_COLUMNS
+from benchmarks.synth import write_csv
+
+
+def legacy_chunks(src, chunk_rows, float_dtype=None):
+    for df in pd.read_csv(src, chunksize=chunk_rows):
+        for col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        yield df
+
+
+def parse(path, chunks):
+    rows, chunk_bytes = 0, 0
+    with open(path, 'rb') as fh:
+        for df in chunks(fh):
+            rows += len(df)
+            chunk_bytes = max(chunk_bytes, int(df.memory_usage(deep=True).sum()))
+    return rows, chunk_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--types', type=int, default=8)
+    parser.add_argument('--dirty', type=float, default=0.0)
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_csv(os.path.join(tmp, 'bench.csv'), args.rows, n_types=args.types, dirty_fraction=args.dirty)
+        size = os.path.getsize(path)
+        cases = [('legacy', 'float64', lambda fh, d: legacy_chunks(fh, args.chunk_rows))]
+        for engine in available_engines():
+            for dtype in ('float64', 'float32'):
+                cases.append((engine, dtype, lambda fh, d, e=engine: read_chunks(fh, args.chunk_rows, e, d)))
+        for name, dtype, chunks in cases:
+            with Measure() as m:
+                rows, chunk_bytes = parse(path, lambda fh: chunks(fh, dtype))
+            results.append({'case': 'parse', 'engine': name, 'float_dtype': dtype, 'rows': rows,
+                            'seconds': round(m.seconds, 4), 'rows_per_s': round(rows / m.seconds),
+                            'mb_per_s': round(size / 1e6 / m.seconds, 1), 'peak_rss_mb': round(m.peak_mb, 1),
+                            'chunk_mb': round(chunk_bytes / 1e6, 2)})
+        for engine in available_engines():
+            with override_settings(CSV_ENGINE=engine, INGEST_CHUNK_ROWS=args.chunk_rows), open(path, 'rb') as fh, \
+                    Measure() as m:
+                acc = ingest_csv(fh)
+            results.append({'case': 'ingest', 'engine': engine, 'float_dtype': 'float64', 'rows': acc.total,
+                            'seconds': round(m.seconds, 4), 'rows_per_s': round(acc.total / m.seconds),
+                            'mb_per_s': round(size / 1e6 / m.seconds, 1), 'peak_rss_mb': round(m.peak_mb, 1),
+                            'chunk_mb': None})
+
+    legacy = results[0]['seconds']
+    print(f'rows={args.rows} types={args.types} dirty={args.dirty} csv_mb={size / 1e6:.1f}')
+    for r in results:
+        chunk = f"{r['chunk_mb']:8.2f}MB/chunk" if r['chunk_mb'] is not None else ''
+        print(f"{r['case']:7} {r['engine']:8} {r['float_dtype']:8} {r['seconds']:8.3f}s {r['mb_per_s']:8.1f}MB/s "
+              f"{legacy / r['seconds']:5.1f}x {r['peak_rss_mb']:8.1f}MB rss {chunk}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'rows': args.rows, 'types': args.types, 'dirty': args.dirty, 'results': results}, fh, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
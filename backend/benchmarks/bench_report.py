@@ -0,0 +1,62 @@
+'''Render a PDF report over a large synthetic dataset and enforce a time and memory budget.
+
+    python -m benchmarks.bench_report --rows 1000000 --budget-seconds 10 --budget-mb 256
+'''
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+import django
+django.setup()
+
+from api.columnar import ColumnarDataset, build_sidecar
+from api.reports import render_report
+from api.summary import SummaryAccumulator
+from benchmarks.synth import equipment_frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--types', type=int, default=8)
+    parser.add_argument('--budget-seconds', type=float, default=10.0)
+    parser.add_argument('--budget-mb', type=float, default=256.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'bench.csv')
+        df = equipment_frame(args.rows, n_types=args.types)
+        build_sidecar(csv_path, [df], numeric_columns=['Flowrate', 'Pressure', 'Temperature'])
+        inst = SimpleNamespace(id=0, name='bench.csv', uploaded_at=datetime.datetime.now(datetime.timezone.utc),
+                               summary_json=SummaryAccumulator().update(df).result())
+        del df
+        ds = ColumnarDataset(csv_path + '.cols')
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        pdf = render_report(inst, ds)
+        elapsed = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    print(f'rows={args.rows} types={args.types} pdf_bytes={len(pdf)} seconds={elapsed:.3f} peak_mb={peak_mb:.1f}')
+    failed = []
+    if elapsed > args.budget_seconds:
+        failed.append(f'time {elapsed:.2f}s > {args.budget_seconds}s')
+    if peak_mb > args.budget_mb:
+        failed.append(f'memory {peak_mb:.1f}MB > {args.budget_mb}MB')
+    if failed:
+        print('FAIL: ' + ', '.join(failed))
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
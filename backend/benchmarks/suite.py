@@ -0,0 +1,235 @@
+'''Benchmark ingest, summary, anomaly, history and PDF paths over synthetic CSVs and compare against a baseline.
+
+    python -m benchmarks.suite --sizes 1000,100000,1000000 --types 8,500 --output bench.json
+    python -m benchmarks.suite --sizes 1000,10000,100000 --update-baseline
+
+Every case is measured for wall time, peak RSS while it runs and throughput (rows/s, MB/s of CSV). Results
+are written as JSON; when a baseline file exists each case is compared with the same case in it, and the
+run exits non-zero if any case got slower or grew its peak RSS beyond the tolerances.
+'''
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+import django
+django.setup()
+
+import pandas as pd
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.anomalies import detect_anomalies
+from api.columnar import ColumnarDataset, ColumnarWriter, sidecar_dir
+from api.ingest import ingest_csv
+from api.reports import render_report
+from api.summary import NUMERIC_COLUMNS, compute_summary
+from benchmarks.synth import write_csv
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+_PAGE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_mb():
+    '''Current resident set size; falls back to the peak where /proc is unavailable.'''
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * _PAGE / 1e6
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+class Measure:
+    '''Wall time and peak RSS of a block; RSS is sampled from a background thread every interval seconds.'''
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self.seconds = 0.0
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = rss_mb()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        self._done.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+        return False
+
+
+def run_case(results, name, rows, types, csv_bytes, fn, repeat=1):
+    '''Run fn repeat times and record the fastest run, with the peak RSS over all runs and the most any run
+    added to the RSS it started with.'''
+    best, peak, growth, out = None, 0.0, 0.0, None
+    for _ in range(repeat):
+        with Measure() as m:
+            out = fn()
+        best = m.seconds if best is None else min(best, m.seconds)
+        peak, growth = max(peak, m.peak_mb), max(growth, m.peak_mb - m.start_mb)
+    results.append({'case': name, 'rows': rows, 'types': types, 'seconds': round(best, 4),
+                    'peak_rss_mb': round(peak, 1), 'rss_growth_mb': round(growth, 1), 'rows_per_s': round(rows / best) if best else None,
+                    'mb_per_s': round(csv_bytes / 1e6 / best, 2) if best else None})
+    print(f'{name:24} rows={rows:<9} types={types:<5} {best:9.3f}s {peak:9.1f}MB')
+    return out
+
+
+def internal_cases(results, csv_path, rows, types, repeat):
+    size = os.path.getsize(csv_path)
+    side = os.path.join(os.path.dirname(csv_path), f'internal_{rows}_{types}.csv')
+
+    def ingest():
+        writer = ColumnarWriter(sidecar_dir(side), numeric_columns=NUMERIC_COLUMNS)
+        with open(csv_path, 'rb') as src:
+            acc = ingest_csv(src, None, None, writer)
+        writer.close()
+        return acc
+    acc = run_case(results, 'ingest_csv', rows, types, size, ingest, repeat)
+    ds = ColumnarDataset(sidecar_dir(side))
+
+    df = pd.read_csv(csv_path)
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    run_case(results, 'compute_summary', rows, types, size, lambda: compute_summary(df), repeat)
+    del df
+    run_case(results, 'detect_anomalies', rows, types, size, lambda: detect_anomalies(ds), repeat)
+    inst = SimpleNamespace(id=0, name='bench.csv', uploaded_at=datetime.datetime.now(datetime.timezone.utc),
+                           summary_json=acc.result())
+    run_case(results, 'render_report', rows, types, size, lambda: render_report(inst, ds), repeat)
+
+
+def endpoint_cases(results, client, csv_path, rows, types, repeat):
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as fh:
+        body = fh.read()
+
+    def upload():
+        # A fresh name and trailing row each time, so the upload is never served as a duplicate.
+        upload.n += 1
+        data = body + f'Bench {upload.n},Pump,1,1,1\n'.encode('utf-8')
+        upload_file = io.BytesIO(data)
+        upload_file.name = f'b{upload.n}.csv'
+        res = client.post('/api/upload/', {'file': upload_file}, format='multipart')
+        assert res.status_code == 200, res.content[:200]
+        return res.json()['id']
+    upload.n = 0
+    pk = run_case(results, 'POST /api/upload/', rows, types, size, upload, repeat)
+    del body
+
+    def get(url):
+        res = client.get(url)
+        assert res.status_code == 200, url
+        return b''.join(res.streaming_content) if res.streaming else res.content
+    run_case(results, 'GET /api/summary/', rows, types, size, lambda: get(f'/api/summary/{pk}/'), repeat)
+    run_case(results, 'GET /api/history/', rows, types, size, lambda: get('/api/history/?limit=100'), repeat)
+    run_case(results, 'GET /api/generate_pdf/', rows, types, size, lambda: get(f'/api/generate_pdf/{pk}/'), 1)
+
+
+def compare(results, baseline, time_tolerance, rss_tolerance, min_seconds):
+    '''Regression messages for cases slower or larger than their baseline entry beyond the tolerances.'''
+    base = {(r['case'], r['rows'], r['types']): r for r in baseline.get('results', [])}
+    failures = []
+    for r in results:
+        b = base.get((r['case'], r['rows'], r['types']))
+        if b is None:
+            continue
+        label = f"{r['case']} rows={r['rows']} types={r['types']}"
+        if r['seconds'] > b['seconds'] * (1 + time_tolerance) and r['seconds'] - b['seconds'] > min_seconds:
+            failures.append(f"{label}: {r['seconds']:.3f}s vs baseline {b['seconds']:.3f}s")
+        if r['peak_rss_mb'] > b['peak_rss_mb'] * (1 + rss_tolerance):
+            failures.append(f"{label}: peak RSS {r['peak_rss_mb']:.1f}MB vs baseline {b['peak_rss_mb']:.1f}MB")
+    return failures
+
+
+def _ints(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=_ints, default=[1000, 10_000, 100_000, 1_000_000],
+                        help='comma-separated row counts (up to 10000000)')
+    parser.add_argument('--types', type=_ints, default=[8, 500], help='comma-separated Type cardinalities')
+    parser.add_argument('--dirty', type=float, default=0.01, help='fraction of unparseable numeric cells')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest is kept')
+    parser.add_argument('--endpoint-max-rows', type=int, default=1_000_000,
+                        help='largest size sent through the HTTP endpoints (the test client buffers the body)')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='write results to the baseline instead of comparing')
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help='allowed slowdown, 0.5 = 50%%')
+    parser.add_argument('--rss-tolerance', type=float, default=0.5, help='allowed peak RSS growth')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='ignore slowdowns smaller than this')
+    args = parser.parse_args(argv)
+
+    results = []
+    setup_test_environment()
+    test_db = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(MEDIA_ROOT=tmp, JOB_QUEUE_MODE='eager', PRERENDER_REPORTS=False,
+                                  RETENTION_MAX_DATASETS=0, RETENTION_SWEEP_INTERVAL=0, MAX_UPLOAD_SIZE=1 << 40,
+                                  DATA_UPLOAD_MAX_MEMORY_SIZE=None):
+            user = User.objects.create_user('bench', password='bench')
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+            for rows in args.sizes:
+                for types in args.types:
+                    csv_path = write_csv(os.path.join(tmp, f'bench_{rows}_{types}.csv'), rows, n_types=types,
+                                         dirty_fraction=args.dirty)
+                    internal_cases(results, csv_path, rows, types, args.repeat)
+                    if rows <= args.endpoint_max_rows:
+                        endpoint_cases(results, client, csv_path, rows, types, args.repeat)
+                    os.remove(csv_path)
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+        teardown_test_environment()
+
+    report = {'meta': {'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                       'python': platform.python_version(), 'platform': platform.platform(),
+                       'cpus': os.cpu_count(), 'dirty': args.dirty},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=1)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump(report, fh, indent=1)
+        print(f'baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print('no baseline to compare against')
+        return 0
+    with open(args.baseline) as fh:
+        failures = compare(results, json.load(fh), args.time_tolerance, args.rss_tolerance, args.min_seconds)
+    if failures:
+        print('REGRESSION:\n  ' + '\n  '.join(failures))
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
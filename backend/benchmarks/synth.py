@@ -0,0 +1,40 @@
+'''Synthetic equipment datasets for benchmarks.'''
+import numpy as np
+import pandas as pd
+
+BASE_TYPES = ['Pump', 'Valve', 'Compressor', 'HeatExchanger', 'Mixer', 'Reactor', 'Tank', 'Boiler']
+
+
+def equipment_frame(rows, n_types=8, dirty_fraction=0.0, seed=0, start=0):
+    '''DataFrame in the upload schema with rows rows and n_types distinct Type values.
+
+    dirty_fraction of the numeric cells are replaced by unparseable strings, as in real exports.
+    Equipment names are numbered from start, so frames built with different starts can be concatenated.'''
+    rng = np.random.default_rng(seed)
+    types = [BASE_TYPES[i] if i < len(BASE_TYPES) else f'Type{i}' for i in range(n_types)]
+    type_idx = rng.integers(0, n_types, rows)
+    centre = np.random.default_rng(n_types).uniform(1, 200, n_types)
+    df = pd.DataFrame({
+        'Equipment Name': pd.Series(np.arange(start, start + rows)).map('Unit {}'.format),
+        'Type': np.array(types, dtype=object)[type_idx],
+        'Flowrate': rng.normal(centre[type_idx], centre[type_idx] * 0.1),
+        'Pressure': rng.gamma(4.0, 0.6, rows),
+        'Temperature': rng.normal(70, 15, rows),
+    })
+    outliers = rng.random(rows) < 0.001
+    df.loc[outliers, 'Temperature'] += 200
+    if dirty_fraction:
+        for col in ('Flowrate', 'Pressure', 'Temperature'):
+            bad = rng.random(rows) < dirty_fraction
+            df[col] = df[col].astype(object)
+            df.loc[bad, col] = 'n/a'
+    return df
+
+
+def write_csv(path, rows, chunk_rows=1_000_000, seed=0, **kwargs):
+    '''Write a synthetic CSV chunk by chunk, so even 10M-row files are generated in bounded memory.'''
+    with open(path, 'w', newline='') as fh:
+        for i, start in enumerate(range(0, rows, chunk_rows)):
+            df = equipment_frame(min(chunk_rows, rows - start), seed=seed + i, start=start, **kwargs)
+            df.to_csv(fh, index=False, header=(start == 0))
+    return path
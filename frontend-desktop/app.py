@@ -5,32 +5,70 @@ Features:
  - Login / Signup (token auth)
  - Choose CSV and upload to Django REST API
  - Fetch history (last uploads)
- - Load CSV into a QTableWidget
- - Show charts: pie (type distribution) + bar (averages)
+ - Load CSV into a virtualized QTableView (sortable, filterable)
+ - Show charts: pie (type distribution) + bar (averages), and per-type trends across uploads
  - Download PDF report for a selected history item
  - Basic token persistence (~/.chemical_visualizer_token)
+ - All network calls run on a QThreadPool over one pooled requests.Session, with
+   progress and cancellation for uploads and downloads
 """
 
 import sys
 import os
 import json
 import io
+import gzip
+import hashlib
+import threading
+import time
+import shutil
+import uuid
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QFileDialog,
     QTextEdit, QLineEdit, QHBoxLayout, QListWidget, QListWidgetItem,
-    QSplitter, QTableWidget, QTableWidgetItem, QMessageBox, QSizePolicy,
-    QFrame
+    QSplitter, QTableView, QHeaderView, QMessageBox, QSizePolicy,
+    QFrame, QProgressBar, QComboBox
+)
+from PyQt5.QtCore import (
+    Qt, QSize, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
 )
-from PyQt5.QtCore import Qt, QSize
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 API_BASE = os.environ.get('API_BASE', 'http://127.0.0.1:8000/api/')
 TOKEN_STORE = os.path.expanduser('~/.chemical_visualizer_token')
+# Files above this size are sent with the resumable chunked protocol (/api/uploads/).
+CHUNKED_UPLOAD_THRESHOLD = int(os.environ.get('CHUNKED_UPLOAD_THRESHOLD', 8 * 1024 * 1024))
+CHUNK_RETRIES = 5
+# CSV files above this size are gzipped before upload; the server decompresses them while parsing.
+COMPRESS_UPLOAD_THRESHOLD = int(os.environ.get('COMPRESS_UPLOAD_THRESHOLD', 64 * 1024))
+# Compressed copies left behind by cancelled uploads (kept so they can resume) are removed after this long.
+UPLOAD_COPY_MAX_AGE = 7 * 24 * 3600
+UPLOAD_STATE = os.path.expanduser('~/.chemical_visualizer_uploads.json')
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(os.path.dirname(TOKEN_STORE), '.chemical_visualizer_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Cache reads update access times in memory; the index is written on put/evict and at most this often otherwise.
+CACHE_INDEX_SAVE_INTERVAL = 30
 REQUEST_TIMEOUT = 10 
+TREND_METRICS = ['Flowrate', 'Pressure', 'Temperature']
+# Datasets per trend chart, and type lines drawn next to the overall mean.
+TREND_LIMIT = 30
+TREND_MAX_TYPES = 6
+# (connect, read) timeout for uploads and downloads, which may wait on the server for a while.
+TRANSFER_TIMEOUT = (REQUEST_TIMEOUT, 600)
+
+# One keep-alive connection pool shared by every worker thread.
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+# Accept gzip (and zstd/br when urllib3 can decode them); responses are decompressed transparently.
+SESSION.headers.update(urllib3.util.make_headers(accept_encoding=True))
 
 
 def save_token_to_disk(token):
@@ -51,6 +89,63 @@ def load_token_from_disk():
     return None
 
 
+def load_upload_state():
+    try:
+        with open(UPLOAD_STATE) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_upload_state(state):
+    try:
+        with open(UPLOAD_STATE, 'w') as f:
+            json.dump(state, f)
+    except Exception:
+        pass
+
+
+def file_sha256(path, task=None):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            sha.update(block)
+            if task is not None:
+                task.check()
+    return sha.hexdigest()
+
+
+def compressed_upload(path, task=None):
+    """Path of a gzipped copy of the CSV at path, made once per file version under CACHE_DIR/uploads.
+
+    The copy is byte-for-byte reproducible (no timestamp in the header), so an interrupted chunked
+    upload of it can resume. Already compressed or small files are returned as they are. Copies older
+    than UPLOAD_COPY_MAX_AGE are pruned first."""
+    if path.lower().endswith(('.gz', '.zst')) or os.path.getsize(path) <= COMPRESS_UPLOAD_THRESHOLD:
+        return path
+    directory = os.path.join(CACHE_DIR, 'uploads')
+    os.makedirs(directory, exist_ok=True)
+    cutoff = time.time() - UPLOAD_COPY_MAX_AGE
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+    key = hashlib.sha1(f'{os.path.abspath(path)}|{os.path.getsize(path)}|{os.path.getmtime(path)}'.encode('utf-8'))
+    target = os.path.join(directory, f'{key.hexdigest()}-{os.path.basename(path)}.gz')
+    if not os.path.exists(target):
+        tmp = target + '.part'
+        with open(path, 'rb') as src, open(tmp, 'wb') as raw, \
+                gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0, compresslevel=6) as dst:
+            for block in iter(lambda: src.read(1024 * 1024), b''):
+                dst.write(block)
+                if task is not None:
+                    task.check()
+        os.replace(tmp, target)
+    return target
+
+
 def safe_json(resp):
     try:
         return resp.json()
@@ -58,6 +153,367 @@ def safe_json(resp):
         return None
 
 
+def token_from(resp):
+    j = safe_json(resp) or {}
+    return j.get('token') or j.get('auth_token') or j.get('key')
+
+
+def fetch_summary(pid, headers, etag=None):
+    """GET summary/<pid>/ -> (summary, ETag); summary is None on 304 (cached copy is current) or failure."""
+    if etag:
+        headers = dict(headers, **{'If-None-Match': etag})
+    r = SESSION.get(API_BASE + f'summary/{pid}/', headers=headers, timeout=REQUEST_TIMEOUT)
+    if r.status_code == 304:
+        return None, etag
+    if r.status_code != 200:
+        return None, None
+    j = safe_json(r) or {}
+    return j.get('summary') or j, r.headers.get('ETag')
+
+
+class Cancelled(Exception):
+    """Raised inside a worker once its task has been cancelled."""
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(object, object)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class NetworkTask(QRunnable):
+    """Runs fn(task) on a QThreadPool thread and reports back to the GUI thread through signals.
+
+    fn must not touch widgets. It may call task.progress(done, total), which also raises Cancelled once
+    cancel() has been called, so long transfers stop at the next chunk.
+    """
+
+    def __init__(self, label, fn):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.label = label
+        self.fn = fn
+        self.signals = TaskSignals()
+        self._cancel = threading.Event()
+        self._last_pct = -1
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def progress(self, done, total=None):
+        self.check()
+        pct = int(done * 100 / total) if total else None
+        if pct is None or pct != self._last_pct:
+            self._last_pct = pct
+            self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.fn(self)
+            self.check()
+        except Exception as e:
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(result)
+
+
+class MultipartBody:
+    """multipart/form-data request body streamed from disk, so uploads report progress and can be cancelled."""
+
+    def __init__(self, fields, files, task=None):
+        self.boundary = uuid.uuid4().hex
+        self.task = task
+        parts = []
+        for name, value in fields:
+            parts.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+        for name, path, content_type in files:
+            parts.append((f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                          f'filename="{os.path.basename(path)}"\r\nContent-Type: {content_type}\r\n\r\n').encode('utf-8'))
+            parts.append(path)
+            parts.append(b'\r\n')
+        parts.append(f'--{self.boundary}--\r\n'.encode('utf-8'))
+        self.length = sum(os.path.getsize(p) if isinstance(p, str) else len(p) for p in parts)
+        self.sent = 0
+        self._parts = iter(parts)
+        self._current = None
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        out, n = [], 0
+        while n < size:
+            if self._current is None:
+                part = next(self._parts, None)
+                if part is None:
+                    break
+                self._current = open(part, 'rb') if isinstance(part, str) else io.BytesIO(part)
+            data = self._current.read(size - n)
+            if not data:
+                self._current.close()
+                self._current = None
+                continue
+            out.append(data)
+            n += len(data)
+        self.sent += n
+        if self.task is not None:
+            self.task.progress(self.sent, self.length)
+        return b''.join(out)
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+class DatasetCache:
+    """On-disk LRU cache of dataset tables and summaries, shared by the worker threads.
+
+    Entries live in CACHE_DIR/<id>-<content hash>/ as a pickled DataFrame and a summary JSON. The
+    content hash makes an entry immutable, so a hit needs no network at all; entries without a hash
+    are revalidated with the stored ETag. index.json keeps sizes and last access times for eviction;
+    access times from hits are written with the next put or after CACHE_INDEX_SAVE_INTERVAL seconds.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            with open(os.path.join(directory, 'index.json')) as fh:
+                self.index = json.load(fh)
+        except Exception:
+            self.index = {}
+
+    @staticmethod
+    def key(pid, content_hash):
+        return f'{pid}-{(content_hash or "nohash")[:16]}'
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, 'index.json.tmp')
+        with open(tmp, 'w') as fh:
+            json.dump(self.index, fh)
+        os.replace(tmp, os.path.join(self.directory, 'index.json'))
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """Write access times recorded since the last save."""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _path(self, key, name):
+        return os.path.join(self.directory, key, name)
+
+    def _get(self, pid, content_hash, name, loader):
+        key = self.key(pid, content_hash)
+        with self._lock:
+            entry = self.index.get(key, {})
+            if name not in entry.get('files', {}) or not os.path.exists(self._path(key, name)):
+                return None, None
+            entry['atime'] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= CACHE_INDEX_SAVE_INTERVAL:
+                self._save_index()
+            etag = entry['files'][name]
+        try:
+            return loader(self._path(key, name)), etag
+        except Exception:
+            self.drop(pid, content_hash)
+            return None, None
+
+    def _put(self, pid, content_hash, name, writer, etag):
+        key = self.key(pid, content_hash)
+        os.makedirs(os.path.join(self.directory, key), exist_ok=True)
+        path = self._path(key, name)
+        writer(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            entry = self.index.setdefault(key, {'files': {}})
+            entry['files'][name] = etag
+            entry['atime'] = time.time()
+            entry['size'] = sum(os.path.getsize(self._path(key, n)) for n in entry['files'] if os.path.exists(self._path(key, n)))
+            self._evict(keep=key)
+            self._save_index()
+
+    def _evict(self, keep=None):
+        total = sum(e.get('size', 0) for e in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k].get('atime', 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.index.pop(key).get('size', 0)
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def drop(self, pid, content_hash):
+        key = self.key(pid, content_hash)
+        with self._lock:
+            self.index.pop(key, None)
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            self._save_index()
+
+    def get_frame(self, pid, content_hash):
+        """(DataFrame, ETag) or (None, None)."""
+        return self._get(pid, content_hash, 'frame.pkl', pd.read_pickle)
+
+    def put_frame(self, pid, content_hash, df, etag=None):
+        self._put(pid, content_hash, 'frame.pkl', df.to_pickle, etag)
+
+    def get_summary(self, pid, content_hash):
+        def load(path):
+            with open(path) as fh:
+                return json.load(fh)
+        return self._get(pid, content_hash, 'summary.json', load)
+
+    def put_summary(self, pid, content_hash, summary, etag=None):
+        def write(path):
+            with open(path, 'w') as fh:
+                json.dump(summary, fh)
+        self._put(pid, content_hash, 'summary.json', write, etag)
+
+
+def format_summary(summary):
+    lines = [f"Total rows: {summary.get('total', 'N/A')}",
+             'Averages: ' + json.dumps(summary.get('averages', {}), indent=2)]
+    by_type = summary.get('by_type') or {}
+    if by_type:
+        cols = list(summary.get('averages') or next(iter(by_type.values())))
+        lines.append('Per-type mean (count):')
+        lines.append('  ' + 'Type'.ljust(16) + ''.join(c.rjust(16) for c in cols))
+        for name, stats in sorted(by_type.items(), key=lambda kv: -summary.get('type_distribution', {}).get(kv[0], 0)):
+            cells = []
+            for c in cols:
+                s = stats.get(c) or {}
+                cells.append((f"{s['mean']:.2f} ({s['count']})" if s.get('mean') is not None else '-').rjust(16))
+            lines.append('  ' + str(name)[:16].ljust(16) + ''.join(cells))
+    return '\n'.join(lines)
+
+
+class DataFrameModel(QAbstractTableModel):
+    """Read-only table model over a DataFrame's column arrays.
+
+    The view only asks for visible cells, so formatting is lazy. Sorting and filtering compute an
+    index permutation with NumPy/pandas instead of moving rows around.
+    """
+
+    def __init__(self, df=None, parent=None):
+        super().__init__(parent)
+        self.set_frame(df if df is not None else pd.DataFrame())
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        self._headers = [str(c) for c in df.columns]
+        self._arrays = [df.iloc[:, i].to_numpy() for i in range(df.shape[1])]
+        self._numeric = [pd.api.types.is_numeric_dtype(df.dtypes.iloc[i]) for i in range(df.shape[1])]
+        self._lower = {}
+        self._rank = {}
+        self._filtered = np.arange(len(df))
+        self._view = self._filtered
+        self._sort = (-1, Qt.AscendingOrder)
+        self._filter = ''
+        self.endResetModel()
+
+    @property
+    def total_rows(self):
+        return len(self._arrays[0]) if self._arrays else 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._arrays)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self._arrays[index.column()][self._view[index.row()]]
+            return '' if pd.isna(value) else str(value)
+        if role == Qt.TextAlignmentRole and self._numeric[index.column()]:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._headers[section] if section < len(self._headers) else None
+        return str(int(self._view[section]) + 1) if section < len(self._view) else None
+
+    def _sort_key(self, column):
+        """float64 rank per row for a column, NaN for missing values (sorted last)."""
+        if column not in self._rank:
+            values = self._arrays[column]
+            if self._numeric[column]:
+                key = pd.to_numeric(values, errors='coerce').astype(np.float64)
+            else:
+                codes, _ = pd.factorize(values, sort=True)
+                key = codes.astype(np.float64)
+                key[codes < 0] = np.nan
+            self._rank[column] = key
+        return self._rank[column]
+
+    def _lowered(self, column):
+        if column not in self._lower:
+            values = pd.Series(self._arrays[column])
+            self._lower[column] = values.astype(str).str.lower().where(values.notna(), '')
+        return self._lower[column]
+
+    def _apply(self):
+        column, order = self._sort
+        rows = self._filtered
+        if column >= 0:
+            key = self._sort_key(column)[rows]
+            rows = rows[np.argsort(-key if order == Qt.DescendingOrder else key, kind='stable')]
+        self._view = rows
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self._sort = (column, order)
+        self._apply()
+        self.layoutChanged.emit()
+
+    def set_filter(self, text):
+        """Keep rows where any column contains text (case-insensitive)."""
+        text = (text or '').strip().lower()
+        if text == self._filter:
+            return
+        self.beginResetModel()
+        self._filter = text
+        if text and self._arrays:
+            mask = np.zeros(self.total_rows, dtype=bool)
+            for c in range(len(self._arrays)):
+                mask |= self._lowered(c).str.contains(text, regex=False).to_numpy()
+            self._filtered = np.flatnonzero(mask)
+        else:
+            self._filtered = np.arange(self.total_rows)
+        self._apply()
+        self.endResetModel()
+
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -67,6 +523,12 @@ class MainWindow(QWidget):
         self.token = load_token_from_disk()
         self.filepath = None
         self.history = []  
+        self.pdf_etags = {}
+        self.cache = DatasetCache()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(4)
+        self.tasks = set()
+        self._progress_task = None
 
         root = QVBoxLayout()
         header = QLabel('<h2>Chemical Equipment Visualizer</h2>')
@@ -95,9 +557,11 @@ class MainWindow(QWidget):
         self.btn_choose = QPushButton('Choose CSV'); self.btn_choose.clicked.connect(self.choose)
         self.lbl_chosen = QLabel('No file chosen')
         self.btn_upload = QPushButton('Upload to server'); self.btn_upload.clicked.connect(self.upload)
+        self.btn_upload_folder = QPushButton('Upload folder'); self.btn_upload_folder.clicked.connect(self.upload_folder)
         upload_row.addWidget(self.btn_choose)
         upload_row.addWidget(self.lbl_chosen)
         upload_row.addWidget(self.btn_upload)
+        upload_row.addWidget(self.btn_upload_folder)
         left_layout.addLayout(upload_row)
 
         summary_label = QLabel('<b>Summary</b>')
@@ -110,9 +574,21 @@ class MainWindow(QWidget):
         self.canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         left_layout.addWidget(self.canvas, 1)
 
-        table_label = QLabel('<b>CSV Table</b>')
-        left_layout.addWidget(table_label)
-        self.table = QTableWidget()
+        table_row = QHBoxLayout()
+        table_row.addWidget(QLabel('<b>CSV Table</b>'))
+        self.table_filter = QLineEdit(); self.table_filter.setPlaceholderText('Filter rows...')
+        self.table_filter.textChanged.connect(self.filter_table)
+        table_row.addWidget(self.table_filter)
+        self.lbl_table_rows = QLabel('')
+        table_row.addWidget(self.lbl_table_rows)
+        left_layout.addLayout(table_row)
+        self.table_model = DataFrameModel()
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(22)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         left_layout.addWidget(self.table, 2)
 
         left_frame.setLayout(left_layout)
@@ -130,6 +606,13 @@ class MainWindow(QWidget):
         btns_row.addWidget(self.btn_load_selected)
         btns_row.addWidget(self.btn_download_pdf)
         right_layout.addLayout(btns_row)
+        trend_row = QHBoxLayout()
+        self.cmb_trend_metric = QComboBox(); self.cmb_trend_metric.addItems(TREND_METRICS); self.cmb_trend_metric.setCurrentIndex(1)
+        self.btn_trends = QPushButton('Show trends'); self.btn_trends.clicked.connect(self.fetch_trends)
+        trend_row.addWidget(QLabel('Trend of'))
+        trend_row.addWidget(self.cmb_trend_metric, 1)
+        trend_row.addWidget(self.btn_trends)
+        right_layout.addLayout(trend_row)
         right_layout.addStretch()
         right_frame.setLayout(right_layout)
         right_frame.setMaximumWidth(380)
@@ -137,6 +620,15 @@ class MainWindow(QWidget):
 
         root.addWidget(splitter)
 
+        task_row = QHBoxLayout()
+        self.lbl_task = QLabel('')
+        self.progress = QProgressBar(); self.progress.setVisible(False)
+        self.btn_cancel = QPushButton('Cancel'); self.btn_cancel.clicked.connect(self.cancel_tasks); self.btn_cancel.setVisible(False)
+        task_row.addWidget(self.lbl_task)
+        task_row.addWidget(self.progress, 1)
+        task_row.addWidget(self.btn_cancel)
+        root.addLayout(task_row)
+
         # log area
         root.addWidget(QLabel('<b>Log</b>'))
         self.log = QTextEdit(); self.log.setReadOnly(True); self.log.setMaximumHeight(160)
@@ -168,75 +660,122 @@ class MainWindow(QWidget):
         ts = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%SZ')
         self.log.append(f'[{ts}] {s}')
 
+    def _auth(self):
+        return {'Authorization': f'Token {self.token}'} if self.token else {}
+
+    # === background tasks ===
+    def run_task(self, label, fn, on_done, on_error=None):
+        """Run fn(task) on the thread pool; on_done(result) / on_error(message) run on the GUI thread."""
+        task = NetworkTask(label, fn)
+        task.signals.finished.connect(lambda result: self._task_finished(task, on_done, result))
+        task.signals.failed.connect(lambda msg: self._task_failed(task, on_error, msg))
+        task.signals.cancelled.connect(lambda: self._task_cancelled(task))
+        task.signals.progress.connect(lambda done, total: self._task_progress(task, done, total))
+        self.tasks.add(task)
+        self._progress_task = task
+        self._update_task_ui()
+        self.pool.start(task)
+        return task
+
+    def _task_finished(self, task, on_done, result):
+        self.tasks.discard(task)
+        self._update_task_ui()
+        try:
+            on_done(result)
+        except Exception as e:
+            self.log_msg(f'{task.label} error: {e}')
+
+    def _task_failed(self, task, on_error, msg):
+        self.tasks.discard(task)
+        self._update_task_ui()
+        self.log_msg(f'{task.label} failed: {msg}')
+        if on_error is not None:
+            on_error(msg)
+        else:
+            QMessageBox.warning(self, f'{task.label} failed', msg)
+
+    def _task_cancelled(self, task):
+        self.tasks.discard(task)
+        self._update_task_ui()
+        self.log_msg(f'{task.label} cancelled.')
+
+    def _task_progress(self, task, done, total):
+        if task is not self._progress_task:
+            return
+        if total:
+            self.progress.setRange(0, 100)
+            self.progress.setValue(int(done * 100 / total))
+            self.progress.setFormat(f'{done / 1048576:.1f} / {total / 1048576:.1f} MB')
+        else:
+            self.progress.setRange(0, 0)
+
+    def _update_task_ui(self):
+        busy = bool(self.tasks)
+        labels = sorted({t.label for t in self.tasks})
+        self.lbl_task.setText(', '.join(labels) + '...' if busy else '')
+        self.progress.setVisible(busy)
+        self.btn_cancel.setVisible(busy)
+        if busy:
+            self.progress.setRange(0, 0)
+            self.progress.setFormat('')
+
+    def cancel_tasks(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+    def closeEvent(self, event):
+        self.cancel_tasks()
+        self.pool.waitForDone(3000)
+        self.cache.flush()
+        super().closeEvent(event)
+
+    # === auth ===
+    def _set_token(self, token, how):
+        self.token = token
+        save_token_to_disk(token)
+        self.log_msg(f'{how} OK. Token saved.')
+        self._update_auth_ui()
+        self.fetch_history()
+
     def login(self):
         user = self.username.text().strip(); pwd = self.password.text().strip()
         if not user or not pwd:
             QMessageBox.warning(self, 'Login', 'Enter username and password')
             return
-        try:
-            url = API_BASE + 'auth/api-token-auth/'
-            self.log_msg(f'POST {url} (form)')
-            res = requests.post(url, data={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
-            if res.status_code in (200, 201) and 'token' in res.text:
-                j = safe_json(res) or {}
-                token = j.get('token') or j.get('auth_token') or j.get('key')
-                if token:
-                    self.token = token
-                    save_token_to_disk(token)
-                    self.log_msg('Login OK. Token saved.')
-                    self._update_auth_ui()
-                    self.fetch_history()
-                    return
-            self.log_msg('Form login did not return token; trying JSON payload.')
-            res2 = requests.post(url, json={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
-            j = safe_json(res2) or {}
-            token = j.get('token') or j.get('auth_token') or j.get('key')
-            if token:
-                self.token = token
-                save_token_to_disk(token)
-                self.log_msg('Login OK (JSON). Token saved.')
-                self._update_auth_ui()
-                self.fetch_history()
-                return
-            self.log_msg(f'Login failed: status {res.status_code} / {res2.status_code} : {res.text} {res2.text}')
-            QMessageBox.warning(self, 'Login failed', f'Status: {res.status_code} / {res2.status_code}\n{res.text}\n{res2.text}')
-        except Exception as e:
-            self.log_msg('Login exception: ' + str(e))
-            QMessageBox.critical(self, 'Login error', str(e))
+        url = API_BASE + 'auth/api-token-auth/'
+        self.log_msg(f'POST {url} (form)')
+
+        def work(task):
+            res = SESSION.post(url, data={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
+            if res.status_code in (200, 201) and token_from(res):
+                return token_from(res)
+            task.check()
+            res2 = SESSION.post(url, json={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
+            if token_from(res2):
+                return token_from(res2)
+            raise RuntimeError(f'Status: {res.status_code} / {res2.status_code}\n{res.text}\n{res2.text}')
+
+        self.run_task('Login', work, lambda token: self._set_token(token, 'Login'))
 
     def signup(self):
         user = self.username.text().strip(); pwd = self.password.text().strip()
         if not user or not pwd:
             QMessageBox.warning(self, 'Signup', 'Enter username and password to sign up')
             return
-        try:
-            url = API_BASE + 'register/'
-            self.log_msg(f'POST {url} (form)')
-            res = requests.post(url, data={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
-            j = safe_json(res) or {}
-            token = j.get('token') or j.get('auth_token') or j.get('key')
-            if token:
-                self.token = token
-                save_token_to_disk(token)
-                self.log_msg('Signup OK (form). Token saved.')
-                self._update_auth_ui()
-                self.fetch_history()
-                return
-            res2 = requests.post(url, json={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
-            j2 = safe_json(res2) or {}
-            token2 = j2.get('token') or j2.get('auth_token') or j2.get('key')
-            if token2:
-                self.token = token2
-                save_token_to_disk(token2)
-                self.log_msg('Signup OK (json). Token saved.')
-                self._update_auth_ui()
-                self.fetch_history()
-                return
-            self.log_msg(f'Signup failed: {res.status_code} {res.text} {res2.status_code if "res2" in locals() else ""}')
-            QMessageBox.warning(self, 'Signup failed', f'{res.text}')
-        except Exception as e:
-            self.log_msg('Signup exception: ' + str(e))
-            QMessageBox.critical(self, 'Signup error', str(e))
+        url = API_BASE + 'register/'
+        self.log_msg(f'POST {url} (form)')
+
+        def work(task):
+            res = SESSION.post(url, data={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
+            if token_from(res):
+                return token_from(res)
+            task.check()
+            res2 = SESSION.post(url, json={'username': user, 'password': pwd}, timeout=REQUEST_TIMEOUT)
+            if token_from(res2):
+                return token_from(res2)
+            raise RuntimeError(f'{res.status_code} {res.text}')
+
+        self.run_task('Signup', work, lambda token: self._set_token(token, 'Signup'))
 
     def logout(self):
         self.token = None
@@ -249,12 +788,84 @@ class MainWindow(QWidget):
         self.log_msg('Logged out (token cleared).')
 
     def choose(self):
-        path, _ = QFileDialog.getOpenFileName(self, 'Open CSV', filter='CSV Files (*.csv)')
+        path, _ = QFileDialog.getOpenFileName(self, 'Open CSV', filter='CSV Files (*.csv *.csv.gz *.csv.zst)')
         if path:
             self.filepath = path
             self.lbl_chosen.setText(os.path.basename(path))
             self.log_msg(f'Chosen: {path}')
 
+    # === uploads ===
+    def _post_multipart(self, task, url, headers, fields, files):
+        body = MultipartBody(fields, files, task)
+        try:
+            headers = dict(headers, **{'Content-Type': body.content_type})
+            resp = SESSION.post(url, data=body, headers=headers, timeout=TRANSFER_TIMEOUT)
+        finally:
+            body.close()
+        return resp.status_code, safe_json(resp) or {}, resp.text[:1000]
+
+    def _chunked_upload(self, task, path, headers, name=None):
+        """Upload path in checksummed chunks, resuming an interrupted upload of the same file (worker thread)."""
+        size = os.path.getsize(path)
+        key = f'{os.path.abspath(path)}|{size}|{int(os.path.getmtime(path))}'
+        state = load_upload_state()
+        upload_id, received, chunk_size = state.get(key), 0, CHUNKED_UPLOAD_THRESHOLD
+        if upload_id:
+            r = SESSION.get(API_BASE + f'uploads/{upload_id}/', headers=headers, timeout=REQUEST_TIMEOUT)
+            j = safe_json(r) or {}
+            if r.status_code == 200 and j.get('status') == 'open':
+                received = j['received']
+            else:
+                upload_id = None
+        if not upload_id:
+            r = SESSION.post(API_BASE + 'uploads/', headers=headers, timeout=REQUEST_TIMEOUT,
+                             json={'name': name or os.path.basename(path), 'size': size, 'sha256': file_sha256(path, task)})
+            j = safe_json(r) or {}
+            if r.status_code != 201:
+                return r.status_code, j, r.text[:1000]
+            upload_id, chunk_size = j['upload_id'], j.get('chunk_size') or chunk_size
+            state[key] = upload_id
+            save_upload_state(state)
+        url = API_BASE + f'uploads/{upload_id}/'
+        task.progress(received, size)
+        with open(path, 'rb') as fh:
+            while received < size:
+                fh.seek(received)
+                chunk = fh.read(chunk_size)
+                chunk_headers = dict(headers, **{
+                    'Content-Type': 'application/octet-stream',
+                    'Content-Range': f'bytes {received}-{received + len(chunk) - 1}/{size}',
+                    'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()})
+                for attempt in range(CHUNK_RETRIES):
+                    try:
+                        r = SESSION.put(url, data=chunk, headers=chunk_headers, timeout=TRANSFER_TIMEOUT)
+                        if r.status_code < 500:
+                            break
+                    except requests.RequestException:
+                        if attempt == CHUNK_RETRIES - 1:
+                            raise
+                    task.check()
+                    time.sleep(2 ** attempt)
+                j = safe_json(r) or {}
+                if r.status_code not in (200, 409):
+                    return r.status_code, j, r.text[:1000]
+                received = j['received']
+                task.progress(received, size)
+        r = SESSION.post(url + 'commit/', data={'async': '1'}, headers=headers, timeout=REQUEST_TIMEOUT)
+        j = safe_json(r) or {}
+        if r.status_code != 202:
+            return r.status_code, j, r.text[:1000]
+        state.pop(key, None)
+        save_upload_state(state)
+        while True:
+            time.sleep(0.5)
+            task.check()
+            job = safe_json(SESSION.get(API_BASE + f"jobs/{j['job_id']}/", headers=headers, timeout=REQUEST_TIMEOUT)) or {}
+            if job.get('status') == 'done':
+                return 200, job.get('result') or {}, ''
+            if job.get('status') == 'failed':
+                return 400, {'error': job.get('error')}, job.get('error') or ''
+
     def upload(self):
         if not self.filepath:
             QMessageBox.warning(self, 'Upload', 'No file chosen')
@@ -262,20 +873,18 @@ class MainWindow(QWidget):
         if not self.token:
             QMessageBox.warning(self, 'Upload', 'Not logged in. Please login first.')
             return
-        try:
-            url = API_BASE + 'upload/'
-            headers = {'Authorization': f'Token {self.token}'}
-            self.log_msg(f'Uploading {self.filepath} -> {url}')
-            with open(self.filepath, 'rb') as fh:
-                files = {'file': (os.path.basename(self.filepath), fh, 'text/csv')}
-                resp = requests.post(url, files=files, data={'name': os.path.basename(self.filepath)}, headers=headers, timeout=REQUEST_TIMEOUT)
-            if resp.status_code in (200, 201):
-                j = safe_json(resp) or {}
-                summary = j.get('summary') or j.get('summary_json') or j.get('summary_json', {})
+        url = API_BASE + 'upload/'
+        path = self.filepath
+        headers = self._auth()
+        self.log_msg(f'Uploading {path} -> {url}')
+
+        def done(result):
+            status, j, text = result
+            if status in (200, 201):
+                summary = j.get('summary') or j.get('summary_json') or {}
                 self.log_msg('Upload OK. Server returned summary.')
                 try:
-                    pretty = json.dumps(summary, indent=2)
-                    self.summary_text.setPlainText(f"Total rows: {summary.get('total', 'N/A')}\nAverages: {pretty}")
+                    self.summary_text.setPlainText(format_summary(summary))
                 except Exception:
                     self.summary_text.setPlainText(str(summary))
                 # plot
@@ -283,30 +892,131 @@ class MainWindow(QWidget):
                     self.plot_summary(summary)
                 self.fetch_history()
             else:
-                self.log_msg('Upload failed: ' + resp.text[:1000])
-                QMessageBox.warning(self, 'Upload failed', f'{resp.status_code}\n{resp.text}')
-        except Exception as e:
-            self.log_msg('Upload exception: ' + str(e))
-            QMessageBox.critical(self, 'Upload error', str(e))
+                self.log_msg('Upload failed: ' + text)
+                QMessageBox.warning(self, 'Upload failed', f'{status}\n{text}')
+
+        def work(task):
+            packed = compressed_upload(path, task)
+            name = os.path.basename(path) + ('.gz' if packed != path else '')
+            try:
+                if os.path.getsize(packed) > CHUNKED_UPLOAD_THRESHOLD:
+                    result = self._chunked_upload(task, packed, headers, name)
+                else:
+                    mime = 'application/gzip' if name.lower().endswith('.gz') else 'text/csv'
+                    result = self._post_multipart(task, url, headers, [('name', name)], [('file', packed, mime)])
+            except Cancelled:
+                raise  # keep the compressed copy so the chunked upload can resume
+            except Exception:
+                if packed != path:
+                    os.remove(packed)
+                raise
+            if packed != path:
+                os.remove(packed)
+            return result
+
+        self.run_task('Upload', work, done)
+
+    def upload_folder(self):
+        if not self.token:
+            QMessageBox.warning(self, 'Upload', 'Not logged in. Please login first.')
+            return
+        folder = QFileDialog.getExistingDirectory(self, 'Choose folder of CSV files')
+        if not folder:
+            return
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(('.csv', '.csv.gz', '.csv.zst', '.zip')))
+        if not paths:
+            QMessageBox.warning(self, 'Upload', 'No CSV files in this folder')
+            return
+        url = API_BASE + 'upload_batch/'
+        headers = self._auth()
+        self.log_msg(f'Uploading {len(paths)} files from {folder} -> {url}')
+        mimes = {'.zip': 'application/zip', '.gz': 'application/gzip', '.zst': 'application/zstd'}
+        files = [('files', p, mimes.get(os.path.splitext(p)[1].lower(), 'text/csv')) for p in paths]
+
+        def done(result):
+            status, j, text = result
+            for r in j.get('results', []):
+                self.log_msg(f"{r['name']}: " + (r['error'] if 'error' in r else f"ok (ID {r['id']})"))
+            if status == 200 and j.get('combined'):
+                self.log_msg(f"Batch upload OK: {j.get('count')} ingested, {j.get('failed')} failed.")
+                self.summary_text.setPlainText(format_summary(j['combined']))
+                self.plot_summary(j['combined'])
+                self.fetch_history()
+            else:
+                self.log_msg('Batch upload failed: ' + text)
+                QMessageBox.warning(self, 'Upload failed', f"{status}\n{j.get('error') or text}")
 
+        self.run_task('Batch upload', lambda task: self._post_multipart(task, url, headers, [], files), done)
+
+    # === history ===
     def fetch_history(self):
         if not self.token:
             self.log_msg('Skipping history fetch: not authenticated.')
             return
-        try:
-            url = API_BASE + 'history/'
-            headers = {'Authorization': f'Token {self.token}'}
-            self.log_msg(f'GET {url}')
-            resp = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-            if resp.status_code == 200:
-                arr = safe_json(resp) or []
-                self.history = arr
-                self.populate_history_list()
-                self.log_msg(f'History fetched: {len(arr)} entries')
-            else:
-                self.log_msg('History fetch failed: ' + resp.text)
-        except Exception as e:
-            self.log_msg('History exception: ' + str(e))
+        url = API_BASE + 'history/'
+        headers = self._auth()
+        self.log_msg(f'GET {url}')
+
+        def work(task):
+            resp = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if resp.status_code != 200:
+                raise RuntimeError(resp.text[:1000])
+            return safe_json(resp) or []
+
+        def done(arr):
+            self.history = arr
+            self.populate_history_list()
+            self.log_msg(f'History fetched: {len(arr)} entries')
+
+        self.run_task('History fetch', work, done, on_error=lambda msg: None)
+
+    # === trends ===
+    def fetch_trends(self):
+        if not self.token:
+            self.log_msg('Skipping trends fetch: not authenticated.')
+            return
+        metric = self.cmb_trend_metric.currentText()
+        url = API_BASE + 'trends/'
+        params = {'metric': metric, 'by_type': 1, 'limit': TREND_LIMIT}
+        headers = self._auth()
+        self.log_msg(f'GET {url} metric={metric}')
+
+        def work(task):
+            resp = SESSION.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+            if resp.status_code != 200:
+                raise RuntimeError(resp.text[:1000])
+            return safe_json(resp) or {}
+
+        self.run_task('Trends fetch', work, lambda data: self.plot_trends(metric, data))
+
+    def plot_trends(self, metric, data):
+        """Line chart of the mean of metric per upload: all rows plus the types present in the most uploads."""
+        datasets = data.get('datasets') or []
+        series = data.get('series') or []
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        if not datasets:
+            ax.text(0.5, 0.5, 'No uploads to chart yet', ha='center', va='center')
+            ax.set_axis_off()
+            self.canvas.draw()
+            return
+        overall = [s for s in series if s.get('type') is None]
+        by_type = sorted((s for s in series if s.get('type') is not None),
+                         key=lambda s: -sum(v is not None for v in s['mean']))[:TREND_MAX_TYPES]
+        x = np.arange(len(datasets))
+        for s in overall + by_type:
+            y = np.array([np.nan if v is None else v for v in s['mean']], dtype=float)
+            ok = ~np.isnan(y)
+            ax.plot(x[ok], y[ok], marker='o', markersize=3, linewidth=2.5 if s.get('type') is None else 1.2,
+                    label=s.get('type') or 'All types')
+        step = max(1, len(datasets) // 8)
+        ax.set_xticks(x[::step])
+        ax.set_xticklabels([d.get('name', '')[:14] for d in datasets[::step]], fontsize=7)
+        ax.set_title(f'Mean {metric} across uploads')
+        ax.legend(fontsize=7)
+        self.figure.tight_layout()
+        self.canvas.draw()
+        self.log_msg(f'Trends plotted: {len(datasets)} uploads, {len(overall) + len(by_type)} series')
 
     def populate_history_list(self):
         self.lst_history.clear()
@@ -334,57 +1044,90 @@ class MainWindow(QWidget):
 
     def load_history_item(self, record):
         """
-        record: dict from history endpoint, should contain id and csv_url (or we fetch csv via server)
+        record: dict from history endpoint with id and content_hash; the table comes from the local
+        cache when possible, else from datasets/<id>/csv/ (or csv_url on older servers)
         """
         if not record:
             return
-        self.log_msg(f'Loading history item id={record.get("id")}')
+        pid, chash = record.get('id'), record.get('content_hash')
+        self.log_msg(f'Loading history item id={pid}')
  
-        csv_url = record.get('csv_url') or record.get('file') or None
-        headers = {'Authorization': f'Token {self.token}'} if self.token else {}
-        try:
-            if csv_url:
-              
-                if csv_url.startswith('/'):
-                    csv_url_full = csv_url if csv_url.startswith('http') else API_BASE.rstrip('/') + csv_url
-                else:
-                    csv_url_full = csv_url if csv_url.startswith('http') else API_BASE + csv_url
-                self.log_msg(f'GET CSV {csv_url_full}')
-                r = requests.get(csv_url_full, headers=headers, timeout=REQUEST_TIMEOUT)
-                if r.status_code == 200:
-                    df = pd.read_csv(io.StringIO(r.text))
-                    self.populate_table(df)
-                else:
-                    self.log_msg('CSV download failed, trying server summary endpoint...')
-                    self._load_from_summary(record)
-            else:
-                
-                self._load_from_summary(record)
-        except Exception as e:
-            self.log_msg('Load history exception: ' + str(e))
-            self._load_from_summary(record)
+        csv_url = API_BASE + f'datasets/{pid}/csv/' if pid is not None else record.get('csv_url') or record.get('file') or None
+        if csv_url and not csv_url.startswith('http'):
+            csv_url = API_BASE.rstrip('/') + csv_url if csv_url.startswith('/') else API_BASE + csv_url
+        headers = self._auth()
 
-    def _load_from_summary(self, record):
+        def work(task):
+            cached, etag = self.cache.get_frame(pid, chash) if pid is not None else (None, None)
+            if cached is not None and chash:
+                return 'cache', cached
+            if csv_url:
+                try:
+                    req_headers = dict(headers, **{'If-None-Match': etag}) if cached is not None and etag else headers
+                    r = SESSION.get(csv_url, headers=req_headers, stream=True, timeout=TRANSFER_TIMEOUT)
+                    if r.status_code == 304:
+                        return 'cache', cached
+                    if r.status_code == 200:
+                        # Content-Length (when sent) and raw.tell() count bytes on the wire, which
+                        # differ from the decoded bytes for a compressed response.
+                        total = int(r.headers.get('Content-Length') or 0) or None
+                        buf = io.BytesIO()
+                        for chunk in r.iter_content(chunk_size=256 * 1024):
+                            buf.write(chunk)
+                            task.progress(r.raw.tell(), total)
+                        buf.seek(0)
+                        df = pd.read_csv(buf)
+                        if pid is not None:
+                            self.cache.put_frame(pid, chash, df, r.headers.get('ETag'))
+                        return 'table', df
+                except Cancelled:
+                    raise
+                except Exception:
+                    pass
+                task.check()
+            if cached is not None:
+                return 'cache', cached
+            return 'summary', self._cached_summary(pid, chash, headers) if pid is not None else None
 
-        try:
-            pid = record.get('id')
-            if pid is None:
-                self.log_msg('No id for record')
+        def done(result):
+            kind, value = result
+            if kind == 'summary':
+                self.log_msg('CSV download failed, used server summary endpoint instead.')
+                self._show_summary(value)
                 return
-            url = API_BASE + f'summary/{pid}/' 
-            headers = {'Authorization': f'Token {self.token}'} if self.token else {}
-            self.log_msg(f'Trying {url}')
-            r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-            if r.status_code == 200:
-                j = safe_json(r) or {}
-                summary = j.get('summary') or j
-                self.plot_summary(summary)
-                self.summary_text.setPlainText(json.dumps(summary, indent=2))
-            else:
-                self.log_msg('Summary endpoint not available or failed.')
-        except Exception as e:
-            self.log_msg('Summary fetch exception: ' + str(e))
+            if kind == 'cache':
+                self.log_msg(f'Loaded dataset {pid} from local cache.')
+            self.populate_table(value)
+
+        self.run_task('Load history item', work, done)
 
+    def _cached_summary(self, pid, chash, headers):
+        """Summary from the local cache, revalidated with its ETag unless the content hash pins it (worker thread)."""
+        cached, etag = self.cache.get_summary(pid, chash)
+        if cached is not None and chash:
+            return cached
+        summary, new_etag = fetch_summary(pid, headers, etag if cached is not None else None)
+        if summary is None:
+            return cached
+        self.cache.put_summary(pid, chash, summary, new_etag)
+        return summary
+
+    def _load_from_summary(self, record):
+        pid = record.get('id')
+        if pid is None:
+            self.log_msg('No id for record')
+            return
+        headers = self._auth()
+        self.log_msg(f'Trying {API_BASE}summary/{pid}/')
+        self.run_task('Summary fetch', lambda task: self._cached_summary(pid, record.get('content_hash'), headers),
+                      self._show_summary)
+
+    def _show_summary(self, summary):
+        if summary is None:
+            self.log_msg('Summary endpoint not available or failed.')
+            return
+        self.plot_summary(summary)
+        self.summary_text.setPlainText(format_summary(summary))
 
     def plot_summary(self, summary):
 
@@ -424,23 +1167,66 @@ class MainWindow(QWidget):
 
     def populate_table(self, df: pd.DataFrame):
         try:
-            self.table.clear()
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            self.table_model.set_frame(df)
+            self.table_model.set_filter(self.table_filter.text())
+            self._update_table_count()
             rows, cols = df.shape
-            self.table.setRowCount(rows)
-            self.table.setColumnCount(cols)
-            self.table.setHorizontalHeaderLabels(list(df.columns.astype(str)))
-            for r in range(rows):
-                for c in range(cols):
-                    val = df.iat[r, c]
-                    item = QTableWidgetItem(str(val))
-                    self.table.setItem(r, c, item)
             self.log_msg(f'Table loaded: {rows} rows x {cols} cols')
         except Exception as e:
             self.log_msg('Populate table error: ' + str(e))
 
+    def filter_table(self, text):
+        self.table_model.set_filter(text)
+        self._update_table_count()
+
+    def _update_table_count(self):
+        shown, total = self.table_model.rowCount(), self.table_model.total_rows
+        self.lbl_table_rows.setText(f'{shown} of {total} rows' if shown != total else f'{total} rows')
+
     # === PDF download ===
+    def fetch_pdf(self, pid, on_saved):
+        """Download report_<pid>.pdf in the background, revalidating a previously saved copy with its ETag."""
+        fname = f'report_{pid}.pdf'
+        url = API_BASE + f'generate_pdf/{pid}/'
+        headers = self._auth()
+        etag = self.pdf_etags.get(pid)
+        if etag and os.path.exists(fname):
+            headers['If-None-Match'] = etag
+        self.log_msg(f'GET {url} (download PDF)')
+
+        def work(task):
+            r = SESSION.get(url, headers=headers, stream=True, timeout=TRANSFER_TIMEOUT)
+            if r.status_code == 304:
+                return 'unchanged', etag
+            if r.status_code != 200:
+                raise RuntimeError(f'{r.status_code} {r.text}')
+            total = int(r.headers.get('Content-Length') or 0) or None
+            tmp, done = fname + '.part', 0
+            try:
+                with open(tmp, 'wb') as fh:
+                    for chunk in r.iter_content(chunk_size=64 * 1024):
+                        fh.write(chunk)
+                        done += len(chunk)
+                        task.progress(done, total)
+                os.replace(tmp, fname)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            return 'saved', r.headers.get('ETag')
+
+        def done(result):
+            status, new_etag = result
+            if status == 'unchanged':
+                self.log_msg(f'PDF unchanged on server; using saved {fname}')
+            else:
+                if new_etag:
+                    self.pdf_etags[pid] = new_etag
+                self.log_msg(f'PDF saved as {fname}')
+            on_saved(fname)
+
+        return self.run_task('PDF download', work, done)
+
     def download_pdf_for_selected(self):
         item = self.lst_history.currentItem()
         if not item:
@@ -451,25 +1237,7 @@ class MainWindow(QWidget):
         if not pid:
             QMessageBox.warning(self, 'PDF', 'No id for selected record.')
             return
-        try:
-            url = API_BASE + f'generate_pdf/{pid}/'
-            headers = {'Authorization': f'Token {self.token}'} if self.token else {}
-            self.log_msg(f'GET {url} (download PDF)')
-            r = requests.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
-            if r.status_code == 200:
-                fname = f'report_{pid}.pdf'
-                with open(fname, 'wb') as fh:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            fh.write(chunk)
-                self.log_msg(f'PDF saved as {fname}')
-                QMessageBox.information(self, 'PDF Downloaded', f'Saved {fname}')
-            else:
-                self.log_msg(f'PDF request failed: {r.status_code} {r.text}')
-                QMessageBox.warning(self, 'PDF failed', f'{r.status_code} {r.text}')
-        except Exception as e:
-            self.log_msg('PDF download error: ' + str(e))
-            QMessageBox.critical(self, 'PDF error', str(e))
+        self.fetch_pdf(pid, lambda fname: QMessageBox.information(self, 'PDF Downloaded', f'Saved {fname}'))
 
     def download_pdf(self):
   
@@ -485,24 +1253,7 @@ class MainWindow(QWidget):
         if not pid:
             self.log_msg('Record missing id for PDF download.')
             return
-        url = API_BASE + f'generate_pdf/{pid}/'
-        headers = {'Authorization': f'Token {self.token}'} if self.token else {}
-        try:
-            r = requests.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
-            if r.status_code == 200:
-                fname = f'report_{pid}.pdf'
-                with open(fname, 'wb') as fh:
-                    for chunk in r.iter_content(8192):
-                        if chunk:
-                            fh.write(chunk)
-                self.log_msg(f'PDF saved as {fname}')
-                QMessageBox.information(self, 'Saved', fname)
-            else:
-                self.log_msg(f'PDF failed: {r.status_code} {r.text}')
-                QMessageBox.warning(self, 'PDF failed', f'{r.status_code} {r.text}')
-        except Exception as e:
-            self.log_msg('PDF exception: ' + str(e))
-            QMessageBox.critical(self, 'PDF error', str(e))
+        self.fetch_pdf(pid, lambda fname: QMessageBox.information(self, 'Saved', fname))
 def main():
     app = QApplication(sys.argv)
     w = MainWindow()
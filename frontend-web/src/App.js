@@ -8,22 +8,42 @@ import {
   CategoryScale,
   LinearScale,
   BarElement,
+  LineElement,
+  PointElement,
   Tooltip,
   Legend,
   Title,
 } from "chart.js";
 import ChartDataLabels from "chartjs-plugin-datalabels";
-import { Pie, Bar } from "react-chartjs-2";
+import { Pie, Bar, Line } from "react-chartjs-2";
 ChartJS.register(
   ArcElement,
   CategoryScale,
   LinearScale,
   BarElement,
+  LineElement,
+  PointElement,
   Tooltip,
   Legend,
   Title,
   ChartDataLabels
 );
+// CSV files above this size are gzipped in the browser before upload (where
+// CompressionStream is available); the server decompresses them while parsing.
+const COMPRESS_UPLOAD_THRESHOLD = 64 * 1024;
+
+async function compressForUpload(file) {
+  if (
+    typeof CompressionStream === "undefined" ||
+    file.size <= COMPRESS_UPLOAD_THRESHOLD ||
+    /\.(gz|zst)$/i.test(file.name)
+  )
+    return { blob: file, name: file.name };
+  const stream = file.stream().pipeThrough(new CompressionStream("gzip"));
+  const blob = await new Response(stream).blob();
+  return { blob, name: file.name + ".gz" };
+}
+
 function generateColors(n) {
   const palette = [
     "#4e79a7",
@@ -97,6 +117,23 @@ const barOptions = {
     y: { beginAtZero: true },
   },
 };
+const trendOptions = {
+  responsive: true,
+  maintainAspectRatio: false,
+  spanGaps: true,
+  plugins: {
+    legend: { position: "bottom", labels: { boxWidth: 12 } },
+    title: { display: false },
+    datalabels: { display: false },
+  },
+  scales: { x: { ticks: { maxRotation: 0, autoSkip: true } } },
+};
+const PAGE_SIZE = 100;
+const TREND_METRICS = ["Flowrate", "Pressure", "Temperature"];
+// Datasets per trend chart, and type lines drawn next to the overall mean.
+const TREND_LIMIT = 30;
+const TREND_MAX_TYPES = 6;
+
 function LoginRegister() {
   const { login, register } = useContext(AuthContext);
   const [isRegister, setIsRegister] = useState(false);
@@ -157,10 +194,29 @@ function LoginRegister() {
 }
 function UploadAndView() {
   const [file, setFile] = useState(null);
+  const [batchFiles, setBatchFiles] = useState([]);
+  const [batchResults, setBatchResults] = useState(null);
   const [summary, setSummary] = useState(null);
   const [history, setHistory] = useState([]);
-  const [tableRows, setTableRows] = useState([]);
+  const [table, setTable] = useState(null);
+  const [tableSort, setTableSort] = useState("");
+  const [typeFilter, setTypeFilter] = useState("");
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState(0);
+  const [trendMetric, setTrendMetric] = useState(TREND_METRICS[1]);
+  const [trends, setTrends] = useState(null);
+
+  const fetchTrends = async (metric = trendMetric) => {
+    try {
+      const r = await api.get("/trends/", {
+        params: { metric, by_type: 1, limit: TREND_LIMIT },
+      });
+      setTrends(r.data);
+    } catch (err) {
+      console.error("trends err", err);
+      setTrends(null);
+    }
+  };
 
   const fetchHistory = async () => {
     try {
@@ -175,47 +231,105 @@ function UploadAndView() {
 
   useEffect(() => {
     fetchHistory();
+    fetchTrends();
   }, []);
 
+  const waitForJob = async (jobId) => {
+    for (;;) {
+      const r = await api.get(`/jobs/${jobId}/`);
+      if (r.data.status === "done") return r.data;
+      if (r.data.status === "failed")
+        throw new Error(r.data.error || "Processing failed");
+      setProgress(Math.round((r.data.progress || 0) * 100));
+      await new Promise((resolve) => setTimeout(resolve, 500));
+    }
+  };
+
   const onUpload = async () => {
     if (!file) return alert("Choose a CSV file first");
     setLoading(true);
     try {
+      const { blob, name } = await compressForUpload(file);
       const form = new FormData();
-      form.append("file", file);
-      form.append("name", file.name);
+      form.append("file", blob, name);
+      form.append("name", name);
+      form.append("async", "1");
+      setProgress(0);
       const res = await api.post("/upload/", form, {
         headers: { "Content-Type": "multipart/form-data" },
       });
-      setSummary(res.data.summary || null);
+      const job = await waitForJob(res.data.job_id);
+      setSummary((job.result && job.result.summary) || null);
       await fetchHistory();
+      await fetchTrends();
       setLoading(false);
     } catch (err) {
       setLoading(false);
-      alert("Upload failed: " + (err?.response?.data?.detail || err?.message));
+      alert(
+        "Upload failed: " +
+          (err?.response?.data?.error || err?.response?.data?.detail || err?.message)
+      );
     }
   };
 
-  const loadCsvToTable = async (csvUrl) => {
-    const base = process.env.REACT_APP_API_BASE || "http://127.0.0.1:8000";
+  const onUploadBatch = async () => {
+    if (batchFiles.length === 0)
+      return alert("Choose a folder or several CSV / zip files first");
+    setLoading(true);
+    try {
+      const form = new FormData();
+      batchFiles.forEach((f) => form.append("files", f, f.name));
+      const res = await api.post("/upload_batch/", form, {
+        headers: { "Content-Type": "multipart/form-data" },
+      });
+      setBatchResults(res.data.results);
+      setSummary(res.data.combined);
+      await fetchHistory();
+      await fetchTrends();
+      setLoading(false);
+    } catch (err) {
+      setLoading(false);
+      setBatchResults(err?.response?.data?.results || null);
+      alert(
+        "Batch upload failed: " +
+          (err?.response?.data?.error || err?.response?.data?.detail || err?.message)
+      );
+    }
+  };
+
+  const loadRows = async (id, opts = {}) => {
+    const offset = opts.offset ?? 0;
+    const sort = opts.sort !== undefined ? opts.sort : tableSort;
+    const type = opts.type !== undefined ? opts.type : typeFilter;
     try {
-      const r = await fetch(base + csvUrl);
-      if (!r.ok) throw new Error("Cannot fetch CSV");
-      const text = await r.text();
-      const lines = text.trim().split("\n").map((l) => l.split(","));
-      const headers = lines[0].map((h) => h.trim());
-      const rows = lines.slice(1).map((cols) => {
-        const obj = {};
-        headers.forEach((h, idx) => (obj[h] = cols[idx]));
-        return obj;
+      const r = await api.get(`/datasets/${id}/rows/`, {
+        params: {
+          offset,
+          limit: PAGE_SIZE,
+          sort: sort || undefined,
+          type: type || undefined,
+        },
+      });
+      setTable({
+        id,
+        columns: r.data.columns,
+        rows: r.data.rows,
+        total: r.data.total,
+        offset: r.data.offset,
       });
-      setTableRows(rows);
+      setTableSort(sort);
+      setTypeFilter(type);
     } catch (err) {
-      console.error("load csv err", err);
-      setTableRows([]);
+      console.error("load rows err", err);
+      setTable(null);
     }
   };
 
+  const toggleSort = (col) => {
+    const next = tableSort === col ? `-${col}` : col;
+    loadRows(table.id, { sort: next });
+  };
+
   const downloadPdf = async (id) => {
     if (!id) return alert("No id provided");
     const base = process.env.REACT_APP_API_BASE || "http://127.0.0.1:8000";
@@ -271,18 +385,78 @@ function UploadAndView() {
       }
     : null;
 
+  // Overall mean plus the types present in the most datasets.
+  const trendSeries = trends
+    ? [
+        ...trends.series.filter((s) => s.type === null),
+        ...trends.series
+          .filter((s) => s.type !== null)
+          .sort(
+            (a, b) =>
+              b.mean.filter((v) => v !== null).length -
+              a.mean.filter((v) => v !== null).length
+          )
+          .slice(0, TREND_MAX_TYPES),
+      ]
+    : [];
+  const trendData =
+    trends && trends.datasets.length > 0
+      ? {
+          labels: trends.datasets.map(
+            (d) => `${d.name} (${new Date(d.uploaded_at).toLocaleDateString()})`
+          ),
+          datasets: trendSeries.map((s, i) => ({
+            label: s.type === null ? "All types" : s.type,
+            data: s.mean,
+            borderColor: generateColors(trendSeries.length)[i],
+            backgroundColor: generateColors(trendSeries.length)[i],
+            borderWidth: s.type === null ? 3 : 1.5,
+            pointRadius: 2,
+          })),
+        }
+      : null;
+
   return (
     <div className="app-body">
       <div className="panel upload-panel">
         <h3>Upload CSV</h3>
         <input
           type="file"
-          accept=".csv"
+          accept=".csv,.gz,.zst"
           onChange={(e) => setFile(e.target.files[0])}
         />
         <button onClick={onUpload} disabled={loading}>
-          {loading ? "Uploading..." : "Upload"}
+          {loading ? `Processing... ${progress}%` : "Upload"}
         </button>
+        <h4>Upload folder</h4>
+        <input
+          type="file"
+          multiple
+          webkitdirectory=""
+          onChange={(e) =>
+            setBatchFiles(
+              Array.from(e.target.files).filter((f) => /\.(csv|csv\.gz|csv\.zst|zip)$/i.test(f.name))
+            )
+          }
+        />
+        <input
+          type="file"
+          accept=".csv,.gz,.zst,.zip"
+          multiple
+          onChange={(e) => setBatchFiles(Array.from(e.target.files))}
+        />
+        <button onClick={onUploadBatch} disabled={loading}>
+          {loading ? "Processing..." : `Upload ${batchFiles.length} files`}
+        </button>
+        {batchResults && (
+          <ul className="batch-results">
+            {batchResults.map((r, i) => (
+              <li key={i}>
+                {r.name}: {r.error ? r.error : `ok (ID ${r.id})`}
+              </li>
+            ))}
+          </ul>
+        )}
       </div>
 
       <div className="panel history-panel">
@@ -295,12 +469,7 @@ function UploadAndView() {
               <small>({new Date(h.uploaded_at).toLocaleString()})</small>
             </div>
             <div className="history-actions">
-              <button
-                onClick={() => {
-                  if (h.csv_url) loadCsvToTable(h.csv_url);
-                  else alert("CSV URL missing");
-                }}
-              >
+              <button onClick={() => loadRows(h.id, { sort: "", type: "" })}>
                 Load CSV table
               </button>
               <button onClick={() => downloadPdf(h.id)}>Download PDF</button>
@@ -323,6 +492,41 @@ function UploadAndView() {
               </div>
             </div>
 
+            {summary.by_type && Object.keys(summary.by_type).length > 0 && (
+              <div className="summary-card">
+                <h4>Per-type statistics</h4>
+                <table className="by-type-table">
+                  <thead>
+                    <tr>
+                      <th>Type</th>
+                      {Object.keys(summary.averages || {}).map((col) => (
+                        <th key={col}>{col} mean ± std [p5–p95]</th>
+                      ))}
+                    </tr>
+                  </thead>
+                  <tbody>
+                    {Object.entries(summary.by_type).map(([type, stats]) => (
+                      <tr key={type}>
+                        <td>
+                          {type} ({(summary.type_distribution || {})[type] || 0})
+                        </td>
+                        {Object.keys(summary.averages || {}).map((col) => {
+                          const s = stats[col];
+                          return (
+                            <td key={col}>
+                              {s && s.mean != null
+                                ? `${s.mean.toFixed(2)} ± ${(s.std || 0).toFixed(2)} [${s.p5.toFixed(2)}–${s.p95.toFixed(2)}]`
+                                : "-"}
+                            </td>
+                          );
+                        })}
+                      </tr>
+                    ))}
+                  </tbody>
+                </table>
+              </div>
+            )}
+
             <div className="charts-row">
               <div className="chart-card">
                 <h4>Type distribution</h4>
@@ -352,31 +556,98 @@ function UploadAndView() {
         )}
       </div>
 
+      <div className="panel trends-panel">
+        <h3>Trends across uploads</h3>
+        <div className="table-controls">
+          <span>Mean</span>
+          <select
+            value={trendMetric}
+            onChange={(e) => {
+              setTrendMetric(e.target.value);
+              fetchTrends(e.target.value);
+            }}
+          >
+            {TREND_METRICS.map((m) => (
+              <option key={m} value={m}>
+                {m}
+              </option>
+            ))}
+          </select>
+          <span>by type, last {TREND_LIMIT} uploads</span>
+        </div>
+        <div className="chart-container">
+          {trendData ? (
+            <Line data={trendData} options={trendOptions} />
+          ) : (
+            <div>No uploads to chart yet.</div>
+          )}
+        </div>
+      </div>
+
       <div className="panel table-panel">
         <h3>CSV Table</h3>
-        {tableRows.length === 0 ? (
+        {!table ? (
           <div>No CSV loaded</div>
         ) : (
-          <div className="table-wrap">
-            <table>
-              <thead>
-                <tr>
-                  {Object.keys(tableRows[0]).map((h) => (
-                    <th key={h}>{h}</th>
-                  ))}
-                </tr>
-              </thead>
-              <tbody>
-                {tableRows.map((r, idx) => (
-                  <tr key={idx}>
-                    {Object.keys(r).map((k) => (
-                      <td key={k}>{r[k]}</td>
+          <>
+            <div className="table-controls">
+              <input
+                placeholder="Filter by Type"
+                value={typeFilter}
+                onChange={(e) => setTypeFilter(e.target.value)}
+                onKeyDown={(e) => {
+                  if (e.key === "Enter")
+                    loadRows(table.id, { type: e.target.value.trim() });
+                }}
+              />
+              <button
+                disabled={table.offset === 0}
+                onClick={() =>
+                  loadRows(table.id, {
+                    offset: Math.max(table.offset - PAGE_SIZE, 0),
+                  })
+                }
+              >
+                Prev
+              </button>
+              <span>
+                {table.total === 0
+                  ? "0 rows"
+                  : `${table.offset + 1}-${table.offset + table.rows.length} of ${table.total}`}
+              </span>
+              <button
+                disabled={table.offset + PAGE_SIZE >= table.total}
+                onClick={() =>
+                  loadRows(table.id, { offset: table.offset + PAGE_SIZE })
+                }
+              >
+                Next
+              </button>
+            </div>
+            <div className="table-wrap">
+              <table>
+                <thead>
+                  <tr>
+                    {table.columns.map((h) => (
+                      <th key={h} onClick={() => toggleSort(h)}>
+                        {h}
+                        {tableSort === h ? " ▲" : tableSort === `-${h}` ? " ▼" : ""}
+                      </th>
                     ))}
                   </tr>
-                ))}
-              </tbody>
-            </table>
-          </div>
+                </thead>
+                <tbody>
+                  {table.rows.map((r, idx) => (
+                    <tr key={table.offset + idx}>
+                      {r.map((v, c) => (
+                        <td key={c}>{v === null ? "" : String(v)}</td>
+                      ))}
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+          </>
         )}
       </div>
     </div>